@@ -0,0 +1,320 @@
+# backtest.py
+
+"""
+Backtest hors ligne : rejoue un historique du canal source dans le vrai CardPredictor.
+
+Les posts passent par le même chemin que le live (analyse unique, collecte
+INTER, vérification, décision de prédiction), mais l'état reste en mémoire :
+aucun appel réseau, aucune écriture de fichier, aucune sauvegarde par post.
+
+Usage :
+    python backtest.py historique.jsonl [--mode inter|static] [--top 8] [--offset 2]
+                       [--no-anti-consecutive] [--static-rules regles.json] [--json]
+
+Entrées acceptées :
+- JSONL : un objet par ligne, soit {"text": ..., "message_id": ..., "edited": bool},
+  soit une update Telegram brute (channel_post / edited_channel_post...) ;
+- export JSON de Telegram Desktop (result.json avec la liste "messages"),
+  décodé message par message sans charger le fichier entier.
+"""
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from datetime import datetime
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+
+from card_codec import build_rule_table
+from card_predictor import CardPredictor, TOP_RULES_PER_SUIT
+from inter_window import InterWindow
+from pattern_index import PatternIndex, relation_label
+from rule_stats import TriggerStats
+from storage import read_archive
+from message_parser import parse_message, is_numbering_reset
+
+# (message_id, texte, est un edit)
+Post = Tuple[Optional[int], str, bool]
+# Post suivi de sa date de publication (epoch, None si absente)
+Record = Tuple[Optional[int], str, bool, Optional[float]]
+
+# Début de la liste des messages d'un export, puis séparateurs entre deux messages
+_MESSAGES_RE = re.compile(r'"messages"\s*:\s*\[')
+_SEPARATOR_RE = re.compile(r'[\s,]*')
+
+# Horloge simulée : environ un jeu par minute sur le canal source
+GAME_SECONDS = 60
+
+
+def _export_text(value: Any) -> str:
+    """Texte d'un message d'export Telegram Desktop (chaîne ou liste d'entités)"""
+    if isinstance(value, str):
+        return value
+    return ''.join(part if isinstance(part, str) else part.get('text', '') for part in value or [])
+
+
+def _post_date(msg: Dict[str, Any]) -> Optional[float]:
+    """Date de publication en epoch : date_unixtime (export), date entière (update) ou ISO"""
+    value = msg.get('date_unixtime', msg.get('date'))
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _record_from_object(obj: Dict[str, Any]) -> Optional[Record]:
+    for key, is_edit in (('channel_post', False), ('message', False),
+                         ('edited_channel_post', True), ('edited_message', True)):
+        if key in obj:
+            msg = obj[key]
+            return msg.get('message_id'), msg.get('text') or msg.get('caption', ''), is_edit, _post_date(msg)
+    if 'text' in obj:
+        return (obj.get('message_id', obj.get('id')), _export_text(obj['text']), bool(obj.get('edited', False)),
+                _post_date(obj))
+    return None
+
+
+def iter_export_messages(f: IO[str], chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Messages d'un export Telegram Desktop (liste "messages" de result.json) lus
+    par morceaux : un message décodé à la fois, mémoire constante quelle que
+    soit la taille de l'export.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    while True:
+        match = _MESSAGES_RE.search(buf)
+        if match:
+            buf = buf[match.end():]
+            break
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        buf = buf[-64:] + chunk # la clé peut être coupée entre deux morceaux
+    pos = 0
+    while True:
+        pos = _SEPARATOR_RE.match(buf, pos).end()
+        if pos >= len(buf):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            msg, pos = decoder.raw_decode(buf, pos)
+        except ValueError:
+            # Message coupé en fin de morceau : on relit avec la suite
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield msg
+        if pos >= chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def read_records(path: str) -> Iterator[Record]:
+    """Lit un historique JSONL ou un export JSON de Telegram Desktop, en flux dans les deux cas"""
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == '{' and not path.endswith('.jsonl'):
+            for msg in iter_export_messages(f):
+                if msg.get('type', 'message') == 'message':
+                    # L'export ne contient que la version finale : on la rejoue comme un post
+                    yield msg.get('id'), _export_text(msg.get('text')), False, _post_date(msg)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = _record_from_object(json.loads(line))
+            if record is not None:
+                yield record
+
+
+def read_posts(path: str) -> Iterator[Post]:
+    """(message_id, texte, est un edit) de chaque post de l'historique (voir read_records)"""
+    for message_id, text, is_edit, _ in read_records(path):
+        yield message_id, text, is_edit
+
+
+def make_predictor(mode: str = 'inter', top: int = TOP_RULES_PER_SUIT, offset: int = 2,
+                   anti_consecutive: bool = True, static_rules: Optional[Dict[str, str]] = None,
+                   window: int = 2000, live_rules: bool = False, min_count: int = 1,
+                   auto_relation: bool = False, half_life: float = 0) -> CardPredictor:
+    """CardPredictor purement en mémoire, configuré pour le backtest"""
+    cp = CardPredictor(persist=False)
+    cp.inter_data = InterWindow(capacity=window)
+    cp.patterns = PatternIndex(cp.patterns.max_offset, capacity=window)
+    cp.auto_relation = auto_relation
+    cp.trigger_stats = TriggerStats(half_life=half_life * 60)
+    cp.is_inter_mode_active = mode == 'inter'
+    cp.top_rules_per_suit = top
+    cp.min_rule_count = min_count
+    cp.trigger_offset = offset
+    cp.anti_consecutive = anti_consecutive
+    cp.live_rules_refresh = live_rules
+    if static_rules is not None:
+        cp.static_rule_table = build_rule_table((card, suit, 0) for card, suit in static_rules.items())
+    return cp
+
+
+def seed_from_archive(cp: CardPredictor, archive: Dict[str, Any]):
+    """Part de la fenêtre INTER et des règles archivées lors d'un reset (ARCHIVE_ON_RESET)"""
+    cp.inter_data.load(archive.get('inter_data', []))
+    cp.smart_rules = archive.get('smart_rules', [])
+
+
+def new_cycle(cp: CardPredictor, keep_rules: bool = True):
+    """Nouveau cycle de numéros : les prédictions et l'historique N-2 ne sont plus valides"""
+    cp.replace_predictions({})
+    cp.collected_games = set()
+    cp.sequential_history = {}
+    cp.last_predicted_game_number = 0
+    if not keep_rules:
+        cp.inter_data.clear()
+        cp.patterns.clear()
+        cp.smart_rules = []
+        cp.active_relation = None
+
+
+def run_backtest(posts, cp: CardPredictor, analysis_every: int = 10, keep_rules: bool = True) -> Dict[str, Any]:
+    started = time.perf_counter()
+    stats = Counter()
+    won_by_offset = Counter()
+    by_suit: Dict[str, Counter] = {}
+    last_game = None
+    # Le temps avance d'un jeu à chaque nouveau post (décroissance des règles reproductible)
+    clock_start = time.time()
+    cp.clock = lambda: clock_start + stats['games'] * GAME_SECONDS
+    for message_id, text, is_edit in posts:
+        stats['posts'] += 1
+        game = parse_message(text)
+        if game.game_number:
+            if is_numbering_reset(last_game, game.game_number):
+                stats['cycles'] += 1
+                new_cycle(cp, keep_rules)
+            if not is_edit:
+                last_game = game.game_number
+                stats['games'] += 1
+                # Équivalent de l'analyse planifiée toutes les 10 minutes (~1 jeu par minute)
+                if analysis_every and stats['games'] % analysis_every == 0:
+                    cp.analyze_and_set_smart_rules()
+        res, decision = cp.ingest(game, not is_edit)
+        if res:
+            suit = cp.predictions[str(game.game_number - res['offset'])]['predicted_costume']
+            suit_stats = by_suit.setdefault(suit.replace('♥️', '❤️'), Counter())
+            suit_stats[res['status']] += 1
+            if res['status'] == 'won':
+                won_by_offset[res['offset']] += 1
+            else:
+                stats['lost'] += 1
+        if decision:
+            num, val, is_inter, trigger = decision
+            stats['predictions'] += 1
+            cp.record_prediction(num, val, is_inter, trigger, message_id or stats['predictions'], ki=0)
+    elapsed = time.perf_counter() - started
+    won = sum(won_by_offset.values())
+    finished = won + stats['lost']
+    return {
+        'posts': stats['posts'],
+        'games': stats['games'],
+        'cycles': stats['cycles'],
+        'predictions': stats['predictions'],
+        'won': won,
+        'lost': stats['lost'],
+        'pending': stats['predictions'] - finished,
+        'win_rate': round(won / finished * 100, 2) if finished else 0.0,
+        'won_by_offset': {str(k): won_by_offset[k] for k in sorted(won_by_offset)},
+        'by_suit': {suit: dict(c) for suit, c in sorted(by_suit.items())},
+        'relation': relation_label(cp.active_relation) if cp.active_relation else 'classique',
+        'relations': [
+            {'relation': relation_label(r['relation']), 'trials': r['trials'], 'rate': round(r['rate'] * 100, 2)}
+            for r in cp.patterns.performance()
+        ],
+        'elapsed_s': round(elapsed, 3),
+        'posts_per_s': round(stats['posts'] / elapsed) if elapsed > 0 else 0,
+    }
+
+
+def format_report(report: Dict[str, Any], settings: Dict[str, Any]) -> str:
+    offsets = '  '.join(f"✅{k}: {v}" for k, v in report['won_by_offset'].items()) or '-'
+    lines = [
+        f"📊 BACKTEST — {report['posts']} posts, {report['games']} jeux, {report['cycles']} changements de cycle "
+        f"({report['elapsed_s']} s, {report['posts_per_s']} posts/s)",
+        "⚙️ " + ', '.join(f"{k}={v}" for k, v in settings.items()),
+        f"📝 Prédictions : {report['predictions']} | ✅ {report['won']} | ❌ {report['lost']} | "
+        f"⏳ {report['pending']} | 📈 {report['win_rate']:.1f}%",
+        f"🎯 Gains par décalage : {offsets}",
+        f"🔗 Relation finale : {report['relation']}",
+    ]
+    for suit, counts in report['by_suit'].items():
+        lines.append(f"  {suit} : ✅ {counts.get('won', 0)}  ❌ {counts.get('lost', 0)}")
+    lines.append("🧪 Évaluation continue des relations :")
+    for row in report['relations']:
+        lines.append(f"  {row['relation']} : {row['rate']:.1f}% sur {row['trials']}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rejoue un historique du canal source dans CardPredictor")
+    parser.add_argument('path', help="historique JSONL ou export JSON de Telegram Desktop")
+    parser.add_argument('--mode', choices=('inter', 'static'), default='inter')
+    parser.add_argument('--top', type=int, default=TOP_RULES_PER_SUIT, help="règles INTER retenues par enseigne")
+    parser.add_argument('--min-count', type=int, default=1, help="occurrences minimales d'une règle INTER")
+    parser.add_argument('--offset', type=int, default=2, help="décalage déclencheur N-k -> jeu prédit N+k")
+    parser.add_argument('--no-anti-consecutive', action='store_true', help="désactive la règle anti-consécutif")
+    parser.add_argument('--static-rules', help="fichier JSON {carte: enseigne} remplaçant STATIC_RULES")
+    parser.add_argument('--window', type=int, default=2000, help="taille de la fenêtre INTER")
+    parser.add_argument('--analysis-every', type=int, default=10, help="jeux entre deux analyses INTER (0 = jamais)")
+    parser.add_argument('--auto-relation', action='store_true',
+                        help="l'analyse choisit la meilleure relation (décalage, carte/paire)")
+    parser.add_argument('--half-life', type=float, default=0,
+                        help="demi-vie des compteurs INTER en minutes de jeu (0 = pas de décroissance)")
+    parser.add_argument('--live-rules', action='store_true', help="reclasse les règles après chaque jeu collecté")
+    parser.add_argument('--reset-rules-on-cycle', action='store_true',
+                        help="vide aussi les données INTER quand la numérotation repart à zéro")
+    parser.add_argument('--seed-archive', help="archive .json.gz d'un reset : fenêtre INTER et règles de départ")
+    parser.add_argument('--json', action='store_true', help="sortie JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    static_rules = None
+    if args.static_rules:
+        with open(args.static_rules, 'r', encoding='utf-8') as f:
+            static_rules = json.load(f)
+    cp = make_predictor(args.mode, args.top, args.offset, not args.no_anti_consecutive, static_rules,
+                        args.window, args.live_rules, args.min_count, args.auto_relation,
+                        args.half_life)
+    if args.seed_archive:
+        seed_from_archive(cp, read_archive(args.seed_archive))
+    report = run_backtest(read_posts(args.path), cp, args.analysis_every, not args.reset_rules_on_cycle)
+    settings = {
+        'mode': args.mode, 'top': args.top, 'min_count': args.min_count, 'offset': args.offset,
+        'anti_consecutif': not args.no_anti_consecutive,
+        'regles_statiques': args.static_rules or 'défaut', 'fenetre': args.window,
+        'relation_auto': args.auto_relation, 'demi_vie': args.half_life,
+    }
+    if args.json:
+        print(json.dumps({'settings': settings, 'report': report}, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report, settings))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
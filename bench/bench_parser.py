@@ -0,0 +1,135 @@
+# bench/bench_parser.py
+
+"""
+Microbenchmark : analyse unique (message_parser) contre l'ancien chemin regex.
+
+L'ancien chemin reproduit ce que faisait handle_update pour un post du canal
+source : extract_game_number appelé trois fois (handle_update, should_predict,
+_verify_prediction_common), get_first_card_info pour la collecte, puis deux
+recherches du premier groupe avec normalisation des emojis.
+
+Usage :
+    python bench/bench_parser.py [messages.jsonl] [--rounds 5]
+
+Le fichier JSONL contient un objet par ligne avec une clé "text" (posts
+enregistrés). Sans fichier, un jeu de posts représentatifs est généré.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_parser import ParseCache, parse_message  # noqa: E402
+
+
+# --- Ancien chemin (copie du CardPredictor avant l'analyse unique) ---
+
+def legacy_extract_game_number(text):
+    text = text.upper()
+    m = re.search(r'(?:#|N|#N)(\d+)', text, re.IGNORECASE)
+    if m: return int(m.group(1))
+    m = re.search(r'🔵(\d+)🔵', text)
+    if m: return int(m.group(1))
+    return None
+
+
+def legacy_group_cards(text):
+    text = text.replace("❤️", "♥️").replace("❤️️", "♥️").replace(" ", "")
+    cards = re.findall(r'([AJQK\d]+(?:♠️|♥️|♦️|♣️|♠|❤️|♦|♣))', text)
+    return [c.replace("❤️", "♥️") for c in cards]
+
+
+def legacy_first_card_info(message):
+    match = re.search(r'\(([^)]*)\)', message)
+    content = match.group(1) if match else message
+    details = re.findall(r'(\d+|[AKQJ])(♠️|❤️|♦️|♣️)', content.replace("♥️", "❤️"), re.IGNORECASE)
+    if details:
+        v, c = details[0]
+        return f"{v.upper()}{c}", c
+    return None
+
+
+def legacy_pipeline(text):
+    game_num = legacy_extract_game_number(text)              # handle_update
+    legacy_first_card_info(text)                             # collect_inter_data
+    if '✅' in text or '❌' in text or '🔰' in text:
+        legacy_extract_game_number(text)                     # _verify_prediction_common
+        m = re.search(r'\d+\(([^)]+)\)', text)
+        legacy_group_cards(m.group(1)) if m else legacy_group_cards(text)[:3]
+    legacy_extract_game_number(text)                         # should_predict
+    m = re.search(r'\d+\(([^)]+)\)', text)
+    if m: legacy_group_cards(m.group(1))
+    return game_num
+
+
+# --- Jeu de posts ---
+
+VALUES = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+SUITS = ['♠️', '❤️', '♦️', '♣️', '♥️']
+
+
+def sample_messages(count, seed=42):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        game = 1000 + i
+        g1 = ''.join(rng.choice(VALUES) + rng.choice(SUITS) for _ in range(rng.randint(2, 3)))
+        g2 = ''.join(rng.choice(VALUES) + rng.choice(SUITS) for _ in range(rng.randint(2, 3)))
+        marker = rng.choice(['', '✅', '❌', '🔰', '⏰'])
+        messages.append(f"#N{game}. {marker}{rng.randint(0, 9)}({g1}) - {rng.randint(0, 9)}({g2}) #T{rng.randint(0, 18)}")
+    return messages
+
+
+def load_messages(path):
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                text = json.loads(line).get('text')
+                if text: messages.append(text)
+    return messages
+
+
+def timed(fn, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('messages', nargs='?', help='Fichier JSONL de posts enregistrés')
+    parser.add_argument('--count', type=int, default=20000, help='Nombre de posts générés sans fichier')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    messages = load_messages(args.messages) if args.messages else sample_messages(args.count)
+    n = len(messages)
+
+    # Vérification d'équivalence avant de mesurer
+    for text in messages:
+        assert parse_message(text).game_number == legacy_extract_game_number(text), text
+
+    legacy = timed(lambda: [legacy_pipeline(t) for t in messages], args.rounds)
+    single = timed(lambda: [parse_message(t) for t in messages], args.rounds)
+    cache = ParseCache(maxsize=n)
+    for i, t in enumerate(messages): cache.get(t, -1, i)
+    cached = timed(lambda: [cache.get(t, -1, i) for i, t in enumerate(messages)], args.rounds)
+
+    print(f"{n} posts, meilleur de {args.rounds} tours")
+    for label, elapsed in (('ancien chemin regex', legacy), ('analyse unique', single), ('cache LRU (édition)', cached)):
+        print(f"  {label:<22} {elapsed * 1e6 / n:8.2f} µs/post  (x{legacy / elapsed:.1f})")
+
+
+if __name__ == '__main__':
+    main()
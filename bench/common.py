@@ -0,0 +1,115 @@
+# bench/common.py
+
+"""
+Outils partagés par les benchmarks : percentiles, mémoire du processus,
+résultats JSON (avec contexte d'exécution) et comparaison avec un résultat
+précédent pour repérer les régressions.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Écart relatif au-delà duquel compare() signale une régression
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentile par rang le plus proche (valeurs non triées acceptées)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """p50 / p90 / p99 / max en millisecondes"""
+    return {
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p90_ms': round(percentile(seconds, 90) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'max_ms': round(max(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+
+def rss_bytes() -> int:
+    """Mémoire résidente actuelle (Linux : /proc, sinon pic via resource)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                             text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path: str, name: str, results: Dict[str, Any], settings: Dict[str, Any]):
+    payload = {
+        'benchmark': name,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': settings,
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"💾 Résultats écrits dans {path}")
+
+
+def _flatten(data: Any, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix[:-1]] = float(data)
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """
+    Compare chaque métrique numérique à un fichier de résultats précédent.
+    Les durées et tailles (*_ms, *_us, *_ns, *_s, *_bytes, *_mb) sont meilleures en baisse,
+    les débits (*_per_s) en hausse ; les simples comptages sont ignorés. Renvoie le nombre
+    de régressions au-delà du seuil.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = _flatten(json.load(f).get('results', {}))
+    current = _flatten(results)
+    regressions = 0
+    print(f"📐 Comparaison avec {baseline_path} (seuil {threshold:.0%})")
+    for key in sorted(current):
+        if key not in baseline or not baseline[key]:
+            continue
+        name = key.rsplit('.', 1)[-1]
+        if name.endswith('_per_s'):
+            lower_is_better = False
+        elif name.endswith(('_ms', '_us', '_ns', '_s', '_bytes', '_mb')):
+            lower_is_better = True
+        else:
+            continue
+        change = (current[key] - baseline[key]) / abs(baseline[key])
+        worse = change > threshold if lower_is_better else change < -threshold
+        regressions += worse
+        flag = '❌' if worse else ' '
+        print(f" {flag} {key:<48} {baseline[key]:>12.3f} -> {current[key]:>12.3f} ({change:+.1%})")
+    return regressions
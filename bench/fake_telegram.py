@@ -0,0 +1,167 @@
+# bench/fake_telegram.py
+
+"""
+Serveur local qui remplace l'API Bot de Telegram pour les benchmarks.
+
+Répond à sendMessage / editMessageText (et renvoie ok pour les autres
+méthodes) avec une latence configurable et une proportion de réponses 429
+(retry_after), pour mesurer le bot sans réseau ni rate-limit réel. Le bot
+s'y connecte via TELEGRAM_API_URL.
+
+getUpdates sert les updates déposées par push_updates() (offset, limit et
+long polling comme l'API réelle) pour tester le mode INGEST_MODE=polling.
+
+Usage autonome :
+    python bench/fake_telegram.py [--port 8081] [--latency-ms 50] [--rate-429 0.01]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional
+
+
+class FakeTelegram:
+    """API Bot de substitution (un thread par requête)"""
+
+    def __init__(self, latency: float = 0.0, rate_429: float = 0.0, retry_after: int = 1,
+                 seed: int = 0, port: int = 0):
+        self.latency = latency # secondes
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.port = port
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_message_id = 1
+        self._updates = [] # en attente de confirmation (offset)
+        self._updates_ready = threading.Condition(self._lock)
+        self.confirmed_offset = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # En-têtes et corps partent en deux écritures : sans TCP_NODELAY, Nagle + ACK retardé
+            # ajoutent ~40 ms à chaque réponse en keep-alive
+            disable_nagle_algorithm = True
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {} # multipart (sendDocument) : contenu ignoré
+                method = self.path.split('?', 1)[0].rsplit('/', 1)[-1]
+                code, payload = fake.handle(method, body if isinstance(body, dict) else {})
+                data = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_POST = do_GET = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-telegram', daemon=True).start()
+        return self.url
+
+    def stop(self):
+        with self._updates_ready:
+            self._updates_ready.notify_all()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def push_updates(self, updates: List[Dict[str, Any]]):
+        """Met des updates à disposition de getUpdates"""
+        with self._updates_ready:
+            self._updates.extend(updates)
+            self._updates_ready.notify_all()
+
+    def pending_updates(self) -> int:
+        with self._lock:
+            return len(self._updates)
+
+    def _get_updates(self, body: Dict[str, Any]):
+        offset = int(body.get('offset') or 0)
+        limit = max(1, min(100, int(body.get('limit') or 100)))
+        deadline = time.monotonic() + float(body.get('timeout') or 0)
+        with self._updates_ready:
+            if offset:
+                # Un offset confirme toutes les updates d'identifiant inférieur
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+                self.confirmed_offset = max(self.confirmed_offset, offset)
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._updates_ready.wait(remaining)
+            self.calls['getUpdates'] += 1
+            return 200, {'ok': True, 'result': self._updates[:limit]}
+
+    def handle(self, method: str, body: Dict[str, Any]):
+        if method == 'getUpdates':
+            return self._get_updates(body)
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            if method in ('sendMessage', 'editMessageText') and self._rng.random() < self.rate_429:
+                self.throttled += 1
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f"Too Many Requests: retry after {self.retry_after}",
+                             'parameters': {'retry_after': self.retry_after}}
+            if method == 'sendMessage':
+                message_id = self._next_message_id
+                self._next_message_id += 1
+                return 200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': body.get('chat_id')},
+                                                    'text': body.get('text', '')}}
+        if method == 'editMessageText':
+            return 200, {'ok': True, 'result': {'message_id': body.get('message_id'), 'text': body.get('text', '')}}
+        return 200, {'ok': True, 'result': True}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'calls': dict(self.calls), 'throttled': self.throttled}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API Telegram locale de substitution")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0, help="latence ajoutée à chaque réponse")
+    parser.add_argument('--rate-429', type=float, default=0, help="part des envois/éditions refusés en 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    fake = FakeTelegram(args.latency_ms / 1000, args.rate_429, args.retry_after, port=args.port)
+    url = fake.start()
+    print(f"🤖 API Telegram de substitution sur {url} (TELEGRAM_API_URL={url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(fake.stats(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        fake.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
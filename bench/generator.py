@@ -0,0 +1,119 @@
+# bench/generator.py
+
+"""
+Générateur de posts réalistes du canal source, sous forme d'updates Telegram.
+
+Chaque jeu est une main de baccara : deux groupes de 2 ou 3 cartes, points
+calculés (modulo 10) et total #T. Une partie des jeux est d'abord publiée en
+cours (⏰, groupes partiels) puis éditée en version finale (edited_channel_post,
+même message_id) avec ✅, ❌ ou 🔰. La numérotation repart à 1 après `wrap`
+jeux (nouvelle journée) et une fraction des updates est livrée deux fois
+(même update_id), comme le fait Telegram quand le webhook répond lentement.
+
+Usage :
+    python bench/generator.py sortie.jsonl [--games 5000] [--edit-ratio 0.5]
+                              [--duplicate-ratio 0.02] [--seed 1]
+
+La sortie JSONL se rejoue aussi avec backtest.py (qui ne filtre pas les updates
+en double : utiliser alors --duplicate-ratio 0).
+"""
+import sys
+import json
+import random
+import argparse
+from typing import Any, Dict, Iterator, List, Tuple
+
+VALUES = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
+SUITS = ('♠️', '♦️', '♣️')
+HEARTS = ('❤️', '♥️') # le canal source utilise les deux formes
+
+# Canal source fixé par CardPredictor
+SOURCE_CHAT_ID = -1002682552255
+
+
+def card_points(value: str) -> int:
+    if value == 'A':
+        return 1
+    if value in ('10', 'J', 'Q', 'K'):
+        return 0
+    return int(value)
+
+
+def draw_card(rng: random.Random) -> Tuple[str, str]:
+    value = rng.choice(VALUES)
+    suit = rng.choice(HEARTS) if rng.random() < 0.25 else rng.choice(SUITS)
+    return value, suit
+
+
+def deal(rng: random.Random) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Deux mains de 2 cartes, troisième carte tirée sous 6 points (règle simplifiée)"""
+    player = [draw_card(rng), draw_card(rng)]
+    banker = [draw_card(rng), draw_card(rng)]
+    if sum(card_points(v) for v, _ in player) % 10 < 6:
+        player.append(draw_card(rng))
+    if sum(card_points(v) for v, _ in banker) % 10 < 6:
+        banker.append(draw_card(rng))
+    return player, banker
+
+
+def format_game(game: int, player, banker, marker: str) -> str:
+    p1 = sum(card_points(v) for v, _ in player) % 10
+    p2 = sum(card_points(v) for v, _ in banker) % 10
+    g1 = ''.join(v + s for v, s in player)
+    g2 = ''.join(v + s for v, s in banker)
+    return f"#N{game}. {marker}{p1}({g1}) - {p2}({g2}) #T{p1 + p2}"
+
+
+def game_posts(game: int, rng: random.Random, edit_ratio: float) -> List[Tuple[str, bool]]:
+    """Posts d'un jeu : (texte, est un edit), éventuellement un ⏰ puis sa version finale"""
+    player, banker = deal(rng)
+    marker = rng.choices(('✅', '❌', '🔰'), weights=(6, 3, 1))[0]
+    final = format_game(game, player, banker, marker)
+    if rng.random() < edit_ratio:
+        return [(format_game(game, player[:2], banker[:2], '⏰'), False), (final, True)]
+    return [(final, False)]
+
+
+def generate_updates(games: int, seed: int = 1, edit_ratio: float = 0.5, duplicate_ratio: float = 0.02,
+                     chat_id: int = SOURCE_CHAT_ID, start: int = 1, wrap: int = 1440) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    update_id, message_id = 100000, 1
+    for i in range(games):
+        game = (start - 1 + i) % wrap + 1
+        for text, is_edit in game_posts(game, rng, edit_ratio):
+            update_id += 1
+            key = 'edited_channel_post' if is_edit else 'channel_post'
+            update = {
+                'update_id': update_id,
+                key: {'message_id': message_id, 'chat': {'id': chat_id, 'type': 'channel'},
+                      'date': 1700000000 + i * 60, 'text': text},
+            }
+            yield update
+            if rng.random() < duplicate_ratio:
+                yield update
+        message_id += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des updates réalistes du canal source (JSONL)")
+    parser.add_argument('output', help="fichier JSONL de sortie ('-' = sortie standard)")
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--edit-ratio', type=float, default=0.5, help="part des jeux publiés ⏰ puis édités")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.02, help="part des updates livrées deux fois")
+    parser.add_argument('--wrap', type=int, default=1440, help="jeux par cycle de numérotation")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        for update in generate_updates(args.games, args.seed, args.edit_ratio, args.duplicate_ratio,
+                                       wrap=args.wrap):
+            out.write(json.dumps(update, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# bench/micro.py
+
+"""
+Microbenchmarks du prédicteur, étape par étape : collect_inter_data,
+should_predict, _verify_prediction_common et _save_all_data (journal JSON
+et SQLite), sur des posts du générateur déjà analysés.
+
+Chaque étape est mesurée appel par appel (µs : moyenne, p50, p99) sur un état
+préparé hors chronométrage, pour qu'une régression se voie sur la bonne étape.
+
+Usage :
+    python bench/micro.py [--games 5000] [--rounds 3] [--only collect,save]
+                          [--output resultats.json] [--compare precedent.json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from typing import Callable, Dict, List
+
+from common import percentile, write_results, compare
+from generator import generate_updates
+
+from card_predictor import CardPredictor  # noqa: E402
+from message_parser import parse_message  # noqa: E402
+
+BENCHMARKS = ('collect', 'should_predict', 'verify', 'save')
+
+
+def final_games(games: int, seed: int):
+    """Versions finales des jeux (dernier texte de chaque message), analysées une fois"""
+    texts = {}
+    for update in generate_updates(games, seed, duplicate_ratio=0):
+        post = update.get('channel_post') or update.get('edited_channel_post')
+        texts[post['message_id']] = post['text']
+    return [parse_message(t) for t in texts.values()]
+
+
+def summarize(samples: List[int]) -> Dict[str, float]:
+    """Durées en ns -> µs"""
+    return {
+        'ops': len(samples),
+        'mean_us': round(sum(samples) / len(samples) / 1000, 3) if samples else 0.0,
+        'p50_us': round(percentile(samples, 50) / 1000, 3),
+        'p99_us': round(percentile(samples, 99) / 1000, 3),
+    }
+
+
+def measure(rounds: int, prepare: Callable, step: Callable, games) -> Dict[str, float]:
+    """Meilleur tour (moyenne la plus basse) ; prepare() reconstruit l'état hors chronométrage"""
+    best = None
+    clock = time.perf_counter_ns
+    for _ in range(rounds):
+        state = prepare()
+        samples = []
+        for game in games:
+            t0 = clock()
+            step(state, game)
+            samples.append(clock() - t0)
+        summary = summarize(samples)
+        if best is None or summary['mean_us'] < best['mean_us']:
+            best = summary
+    return best
+
+
+def trained_predictor(games) -> CardPredictor:
+    cp = CardPredictor(persist=False)
+    for game in games:
+        cp.collect_inter_data(game.game_number, game)
+    cp.analyze_and_set_smart_rules()
+    return cp
+
+
+def bench_collect(games, rounds):
+    return measure(rounds, lambda: CardPredictor(persist=False),
+                   lambda cp, g: cp.collect_inter_data(g.game_number, g), games)
+
+
+def bench_should_predict(games, rounds):
+    cp = trained_predictor(games)
+    return measure(rounds, lambda: cp, lambda cp, g: cp.should_predict(g), games)
+
+
+def bench_verify(games, rounds):
+    cp = trained_predictor(games)
+    checked = [g for g in games if g.has_completion or g.has_shield]
+
+    def prepare():
+        # Une prédiction en attente par jeu : chaque post vérifie réellement quelque chose
+        cp.replace_predictions({
+            str(g.game_number): {'game_num': g.game_number, 'predicted_costume': '♠️', 'message_id': i + 1,
+                                 'timestamp': 0, 'status': 'pending', 'ki_base': 0}
+            for i, g in enumerate(checked)
+        })
+        return cp
+    return measure(rounds, prepare, lambda cp, g: cp._verify_prediction_common(g), checked)
+
+
+def bench_save(games, rounds, backend: str):
+    """Coût d'une sauvegarde delta après la collecte d'un jeu (collecte hors chronométrage)"""
+    workdir = tempfile.mkdtemp(prefix=f'bench-save-{backend}-')
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    os.environ['STORAGE_BACKEND'] = backend
+    try:
+        best = None
+        for _ in range(rounds):
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            cp = CardPredictor()
+            save = cp._save_all_data
+            cp._save_all_data = lambda *args, **kwargs: None
+            samples = []
+            for game in games:
+                cp.collect_inter_data(game.game_number, game)
+                t0 = time.perf_counter_ns()
+                save()
+                samples.append(time.perf_counter_ns() - t0)
+            t0 = time.perf_counter_ns()
+            save(force_snapshot=True)
+            snapshot_us = round((time.perf_counter_ns() - t0) / 1000, 3)
+            summary = dict(summarize(samples), snapshot_us=snapshot_us)
+            if best is None or summary['mean_us'] < best['mean_us']:
+                best = summary
+        return best
+    finally:
+        os.environ.pop('STORAGE_BACKEND', None)
+        os.chdir(previous_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks du prédicteur")
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', help=f"sous-ensemble séparé par des virgules parmi {','.join(BENCHMARKS)}")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--compare', help="résultats précédents à comparer")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    selected = args.only.split(',') if args.only else BENCHMARKS
+    games = final_games(args.games, args.seed)
+    results = {}
+    if 'collect' in selected:
+        results['collect_inter_data'] = bench_collect(games, args.rounds)
+    if 'should_predict' in selected:
+        results['should_predict'] = bench_should_predict(games, args.rounds)
+    if 'verify' in selected:
+        results['verify_prediction_common'] = bench_verify(games, args.rounds)
+    if 'save' in selected:
+        results['save_all_data_json'] = bench_save(games, args.rounds, 'json')
+        results['save_all_data_sqlite'] = bench_save(games, args.rounds, 'sqlite')
+
+    print(f"{len(games)} jeux, meilleur de {args.rounds} tours")
+    for name, r in results.items():
+        extra = f"  snapshot {r['snapshot_us']:.0f} µs" if 'snapshot_us' in r else ''
+        print(f"  {name:<26} {r['mean_us']:9.2f} µs/appel  p50 {r['p50_us']:8.2f}  p99 {r['p99_us']:9.2f}{extra}")
+    settings = {'games': args.games, 'rounds': args.rounds, 'seed': args.seed}
+    if args.output:
+        write_results(args.output, 'micro', results, settings)
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
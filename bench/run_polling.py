@@ -0,0 +1,114 @@
+# bench/run_polling.py
+
+"""
+Mesure le rattrapage d'un retard en mode INGEST_MODE=polling : les updates
+sont déposées d'un coup dans l'API Telegram locale (comme après une mise en
+veille), puis le bot les draine par getUpdates.
+
+Rapporte le débit de rattrapage, la taille des lots, le nombre de sauvegardes
+et de prédictions. Avec la même entrée, run_webhook.py donne la référence d'un
+appel webhook (et d'une sauvegarde) par update.
+
+Usage :
+    python bench/run_polling.py [--games 2000] [--limit 100] [--latency-ms 20]
+                                [--input updates.jsonl] [--output resultats.json]
+                                [--compare precedent.json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+from common import rss_bytes, write_results, compare
+from fake_telegram import FakeTelegram
+from generator import generate_updates
+from run_webhook import load_updates, wait_idle
+
+
+def run(args) -> dict:
+    fake = FakeTelegram(args.latency_ms / 1000, args.rate_429, args.retry_after)
+    url = fake.start()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench-polling-')
+    os.environ.update(TELEGRAM_API_URL=url, BOT_TOKEN='123456:bench', WEBHOOK_URL='', ASYNC_WEBHOOK='false',
+                      INGEST_MODE='polling', POLL_LIMIT=str(args.limit), POLL_TIMEOUT='1',
+                      OUTBOUND_GLOBAL_RATE=str(args.global_rate), OUTBOUND_CHAT_RATE=str(args.chat_rate),
+                      OUTBOUND_CHAT_BURST=str(max(5.0, args.chat_rate)))
+    os.environ.pop('ADMIN_ID', None)
+    os.chdir(workdir)
+    # Le bot installe sa journalisation (INFO) à l'import : seuls les avertissements restent visibles
+    logging.disable(logging.INFO)
+    import main # import après la configuration : le bot lit l'environnement au chargement
+    import metrics
+    poller = main.poller
+    predictor = main.telegram_bot.handlers.card_predictor
+    updates = load_updates(args.input) if args.input else list(
+        generate_updates(args.games, args.seed, args.edit_ratio, args.duplicate_ratio,
+                         chat_id=predictor.target_channel_id))
+
+    saves_before = metrics.STAGE_SECONDS.count('persist')
+    rss_ready = rss_bytes()
+    started = time.perf_counter()
+    fake.push_updates(updates)
+    deadline = time.monotonic() + args.max_seconds
+    while poller.updates < len(updates) and time.monotonic() < deadline:
+        time.sleep(0.005)
+    drained = time.perf_counter() - started
+    wait_idle(main)
+    elapsed = time.perf_counter() - started
+    poller.stop(timeout=5)
+    fake.stop()
+
+    stats = poller.stats()
+    results = {
+        'updates': len(updates),
+        'drained_updates': stats['updates'],
+        'batches': stats['batches'],
+        'max_batch': stats['max_batch'],
+        'throughput': {
+            'drain_updates_per_s': round(stats['updates'] / drained, 1) if drained else 0.0,
+            'processed_updates_per_s': round(stats['updates'] / elapsed, 1) if elapsed else 0.0,
+        },
+        'saves': metrics.STAGE_SECONDS.count('persist') - saves_before,
+        'memory': {'run_growth_mb': round((rss_bytes() - rss_ready) / 2 ** 20, 2)},
+        'elapsed_s': round(elapsed, 3),
+        'telegram': fake.stats(),
+        'predictor': {'inter_pairs': len(predictor.inter_data), 'predictions': len(predictor.predictions)},
+        'dedup': main.telegram_bot.handlers.dedup.stats(),
+    }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du rattrapage en mode polling (getUpdates)")
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--edit-ratio', type=float, default=0.5)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0, help="getUpdates ne relivre pas : 0 par défaut")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--input', help="updates JSONL enregistrées ou générées (remplace le générateur)")
+    parser.add_argument('--limit', type=int, default=100, help="updates par getUpdates (1..100)")
+    parser.add_argument('--latency-ms', type=float, default=0, help="latence de l'API Telegram simulée")
+    parser.add_argument('--rate-429', type=float, default=0, help="part des envois refusés en 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--chat-rate', type=float, default=1000, help="envois/s par chat (production : 1)")
+    parser.add_argument('--global-rate', type=float, default=1000, help="envois/s tous chats (production : 25)")
+    parser.add_argument('--max-seconds', type=float, default=600, help="abandon si le retard n'est pas drainé")
+    parser.add_argument('--workdir', help="dossier de l'état du bot (défaut : dossier temporaire)")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--compare', help="résultats précédents à comparer")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    settings = {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        write_results(args.output, 'polling', results, settings)
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# bench/run_startup.py
+
+"""
+Mesure le démarrage à froid du bot : un processus `python main.py` neuf par
+essai, sur un état persisté réaliste (une journée de jeux rejouée : fenêtre
+INTER, historique, règles, prédictions) et l'API Telegram locale avec une
+latence réglable (setWebhook, getMe).
+
+Rapporte pour chaque essai (médiane et pire cas) :
+- first_response : lancement -> première réponse 200 sur / (le serveur HTTP accepte les requêtes) ;
+- ready : lancement -> /health en 200 (webhook enregistré, scheduler démarré, état chargé) ;
+et, dans ce processus, la taille du snapshot d'état et le temps de son chargement.
+
+Usage :
+    python bench/run_startup.py [--runs 5] [--games 1440] [--latency-ms 300]
+                                [--backend json|sqlite] [--output resultats.json]
+                                [--compare precedent.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from statistics import median
+
+from common import ROOT, write_results, compare
+from fake_telegram import FakeTelegram
+from generator import generate_updates
+
+
+def prepare_state(workdir: str, games: int, seed: int) -> dict:
+    """Rejoue une journée de jeux dans un CardPredictor persisté puis écrit un snapshot"""
+    from backtest import run_backtest, _record_from_object
+    from card_predictor import CardPredictor
+    from storage import open_store
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        cp = CardPredictor()
+        posts = (_record_from_object(u)[:3] for u in generate_updates(games, seed, 0.5, 0.0))
+        cp._defer_saves = True
+        run_backtest(posts, cp)
+        cp._defer_saves = False
+        cp._save_all_data(force_snapshot=True)
+        files = {name: os.path.getsize(name) for name in sorted(os.listdir('.')) if os.path.isfile(name)}
+        started = time.perf_counter()
+        runs = 20
+        for _ in range(runs):
+            open_store().load()
+        load_ms = (time.perf_counter() - started) / runs * 1000
+        return {
+            'inter_pairs': len(cp.inter_data),
+            'predictions': len(cp.predictions),
+            'files': files,
+            'state_bytes': sum(files.values()),
+            'state_load_ms': round(load_ms, 3),
+        }
+    finally:
+        os.chdir(cwd)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def start_once(workdir: str, env: dict, timeout: float) -> dict:
+    """Un démarrage : temps jusqu'à la première réponse HTTP puis jusqu'à /health en 200"""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')], cwd=workdir,
+                            env=dict(env, PORT=str(port)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first = ready = None
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and proc.poll() is None:
+            if first is None:
+                if _status(base + '/') == 200:
+                    first = time.perf_counter() - started
+            elif _status(base + '/health') == 200:
+                ready = time.perf_counter() - started
+                break
+            time.sleep(0.005)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {'first_response_s': first, 'ready_s': ready}
+
+
+def run(args) -> dict:
+    fake = FakeTelegram(args.latency_ms / 1000)
+    url = fake.start()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ, TELEGRAM_API_URL=url, BOT_TOKEN='123456:bench', WEBHOOK_URL='https://bench.invalid',
+               STORAGE_BACKEND=args.backend, HEALTH_TELEGRAM_TTL='60', PYTHONDONTWRITEBYTECODE='1')
+    env.pop('ADMIN_ID', None)
+    env.pop('REPLIT_DOMAINS', None)
+    os.environ.update(STORAGE_BACKEND=args.backend)
+    logging.disable(logging.WARNING)
+    state = prepare_state(workdir, args.games, args.seed)
+
+    samples = [start_once(workdir, env, args.timeout) for _ in range(args.runs)]
+    fake.stop()
+    failed = sum(1 for s in samples if s['ready_s'] is None)
+    ok = [s for s in samples if s['ready_s'] is not None]
+
+    def summary(key):
+        values = [s[key] for s in ok]
+        if not values:
+            return {}
+        return {'median_ms': round(median(values) * 1000, 1), 'max_ms': round(max(values) * 1000, 1)}
+
+    return {
+        'runs': args.runs,
+        'failed': failed,
+        'first_response': summary('first_response_s'),
+        'ready': summary('ready_s'),
+        'state': state,
+        'telegram': fake.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid de main.py")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--games', type=int, default=1440, help="jeux rejoués pour construire l'état persisté")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=300, help="latence de l'API Telegram simulée")
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--timeout', type=float, default=60, help="abandon d'un essai (secondes)")
+    parser.add_argument('--workdir', help="dossier de l'état du bot (défaut : dossier temporaire)")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--compare', help="résultats précédents à comparer")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    settings = {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        write_results(args.output, 'startup', results, settings)
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 1 if results['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# bench/run_webhook.py
+
+"""
+Charge le endpoint /webhook de main.app avec des updates réalistes et mesure
+latence (p50/p99), débit et croissance mémoire.
+
+Le bot tourne dans ce processus (client de test Flask), branché sur l'API
+Telegram locale de bench/fake_telegram.py ; l'état est écrit dans un dossier
+temporaire. Les limites de débit sortant sont relevées par défaut (--chat-rate,
+--global-rate) pour mesurer le bot plutôt que la politique de Telegram ; les
+429 simulés restent respectés. En mode --async, la latence mesurée est celle de l'accusé de
+réception et le débit inclut l'attente de la file de traitement.
+
+Usage :
+    python bench/run_webhook.py [--games 2000] [--latency-ms 20] [--rate-429 0.01]
+                                [--async] [--input updates.jsonl] [--chat-rate 1000]
+                                [--output resultats.json] [--compare precedent.json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+from common import latency_summary, rss_bytes, write_results, compare
+from fake_telegram import FakeTelegram
+from generator import generate_updates
+
+
+def load_updates(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def wait_idle(main, timeout: float = 120.0):
+    """Attend que la file asynchrone et les envois sortants soient vidés"""
+    if main.update_queue:
+        main.update_queue.join()
+    dispatcher = main.telegram_bot.dispatcher
+    deadline = time.monotonic() + timeout
+    while dispatcher.depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def run(args) -> dict:
+    fake = FakeTelegram(args.latency_ms / 1000, args.rate_429, args.retry_after)
+    url = fake.start()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench-webhook-')
+    os.environ.update(TELEGRAM_API_URL=url, BOT_TOKEN='123456:bench', WEBHOOK_URL='',
+                      ASYNC_WEBHOOK='true' if args.use_async else 'false',
+                      # Débit sortant : on mesure le bot, pas la politique de Telegram (sauf --chat-rate 1)
+                      OUTBOUND_GLOBAL_RATE=str(args.global_rate), OUTBOUND_CHAT_RATE=str(args.chat_rate),
+                      OUTBOUND_CHAT_BURST=str(max(5.0, args.chat_rate)))
+    os.environ.pop('ADMIN_ID', None)
+    os.chdir(workdir)
+    # Le bot installe sa journalisation (INFO) à l'import : seuls les avertissements restent visibles
+    logging.disable(logging.INFO)
+    rss_start = rss_bytes()
+    import main # import après la configuration : le bot lit l'environnement au chargement
+    client = main.app.test_client()
+    handlers = main.telegram_bot.handlers
+    predictor = handlers.card_predictor
+    updates = load_updates(args.input) if args.input else list(
+        generate_updates(args.games, args.seed, args.edit_ratio, args.duplicate_ratio,
+                         chat_id=predictor.target_channel_id))
+
+    rss_ready = rss_bytes()
+    latencies, statuses = [], {}
+    rss_samples = []
+    games = 0
+    started = time.perf_counter()
+    for i, update in enumerate(updates):
+        # Analyse INTER planifiée (toutes les 10 min en production), hors mesure de latence
+        if args.analysis_every and 'channel_post' in update:
+            games += 1
+            if games % args.analysis_every == 0:
+                handlers.actor.call(predictor.analyze_and_set_smart_rules)
+        t0 = time.perf_counter()
+        response = client.post('/webhook', json=update)
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if i % 500 == 0:
+            rss_samples.append(rss_bytes())
+    acked = time.perf_counter() - started
+    wait_idle(main)
+    elapsed = time.perf_counter() - started
+    rss_end = rss_bytes()
+    fake.stop()
+
+    results = {
+        'updates': len(updates),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'webhook_latency': latency_summary(latencies),
+        'throughput': {
+            'acked_updates_per_s': round(len(updates) / acked, 1) if acked else 0.0,
+            'processed_updates_per_s': round(len(updates) / elapsed, 1) if elapsed else 0.0,
+        },
+        'memory': {
+            'import_growth_mb': round((rss_ready - rss_start) / 2 ** 20, 2),
+            'run_growth_mb': round((rss_end - rss_ready) / 2 ** 20, 2),
+            'peak_sample_mb': round(max(rss_samples + [rss_end]) / 2 ** 20, 2),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'telegram': fake.stats(),
+        'predictor': {'inter_pairs': len(predictor.inter_data), 'predictions': len(predictor.predictions)},
+        'dedup': handlers.dedup.stats(),
+    }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline /webhook")
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--edit-ratio', type=float, default=0.5)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--input', help="updates JSONL enregistrées ou générées (remplace le générateur)")
+    parser.add_argument('--latency-ms', type=float, default=0, help="latence de l'API Telegram simulée")
+    parser.add_argument('--rate-429', type=float, default=0, help="part des envois refusés en 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--chat-rate', type=float, default=1000, help="envois/s par chat (production : 1)")
+    parser.add_argument('--global-rate', type=float, default=1000, help="envois/s tous chats (production : 25)")
+    parser.add_argument('--analysis-every', type=int, default=10, help="jeux entre deux analyses INTER (0 = jamais)")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="ASYNC_WEBHOOK=true")
+    parser.add_argument('--workdir', help="dossier de l'état du bot (défaut : dossier temporaire)")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--compare', help="résultats précédents à comparer")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    settings = {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        write_results(args.output, 'webhook', results, settings)
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
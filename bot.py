@@ -11,10 +11,11 @@ from typing import Dict, Any, Optional
 
 # Importation des classes de logique métier
 from handlers import TelegramHandlers
+from telegram_client import TelegramClient
+from outbound import OutboundDispatcher
 from card_predictor import CardPredictor 
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 class TelegramBot:
     """
@@ -24,11 +25,14 @@ class TelegramBot:
 
     def __init__(self, token: str):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        # Client HTTP unique (pool keep-alive) partagé avec les handlers
+        self.client = TelegramClient(token)
+        self.dispatcher = OutboundDispatcher(self.client)
+        self.base_url = self.client.base_url
         self.deployment_file_path = "papamaman.zip" 
         
         # Initialize advanced handlers
-        self.handlers = TelegramHandlers(token)
+        self.handlers = TelegramHandlers(token, client=self.client, dispatcher=self.dispatcher)
         
         if not self.handlers.card_predictor:
             logger.error("🚨 Le moteur de prédiction n'a pas pu être initialisé.")
@@ -37,25 +41,27 @@ class TelegramBot:
     def handle_update(self, update: Dict[str, Any]) -> None:
         """Handle incoming Telegram update with advanced features for webhook mode"""
         try:
-            # Log de haut niveau pour les différents types d'updates
+            # Log de haut niveau pour les différents types d'updates (limité en répétitions, voir logging_setup)
             if 'message' in update or 'channel_post' in update:
-                logger.info(f"🔄 Bot traite message normal/post canal via webhook")
+                logger.info("🔄 Bot traite message normal/post canal via webhook")
             elif 'edited_message' in update or 'edited_channel_post' in update:
-                logger.info(f"🔄 Bot traite message édité/post édité via webhook")
+                logger.info("🔄 Bot traite message édité/post édité via webhook")
             elif 'my_chat_member' in update:
-                 logger.info(f"🔄 Bot traite événement d'adhésion au chat (my_chat_member)")
+                 logger.info("🔄 Bot traite événement d'adhésion au chat (my_chat_member)")
             elif 'callback_query' in update:
-                 logger.info(f"🔄 Bot traite clic de bouton (callback_query)")
+                 logger.info("🔄 Bot traite clic de bouton (callback_query)")
 
-            logger.debug(f"Received update: {json.dumps(update, indent=2)}")
+            # Sérialisation du payload seulement si DEBUG est actif
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received update: %s", json.dumps(update, indent=2))
 
             # Délégation du traitement complet aux handlers
             self.handlers.handle_update(update)
             
-            logger.info(f"✅ Update traité avec succès via webhook")
+            logger.info("✅ Update traité avec succès via webhook")
 
         except Exception as e:
-            logger.error(f"❌ Error handling update via webhook: {e}")
+            logger.error("❌ Error handling update via webhook: %s", e)
 
     # --- Méthodes API Directes (Pour setWebhook et autres) ---
 
@@ -67,8 +73,6 @@ class TelegramBot:
     def send_document(self, chat_id: int, file_path: str) -> bool:
         """Send document file to user (Méthode incluse pour respecter le schéma)"""
         try:
-            url = f"{self.base_url}/sendDocument"
-
             if not os.path.exists(file_path):
                 logger.error(f"File not found for sending: {file_path}")
                 return False
@@ -82,7 +86,7 @@ class TelegramBot:
                     'caption': '📦 Deployment Package for render.com'
                 }
 
-                response = requests.post(url, data=data, files=files, timeout=60)
+                response = self.client.post('sendDocument', data=data, files=files, timeout=60)
                 return response.json().get('ok', False)
         except Exception as e:
             logger.error(f"Error sending document: {e}")
@@ -91,14 +95,13 @@ class TelegramBot:
     def set_webhook(self, webhook_url: str) -> bool:
         """Set webhook URL for the bot"""
         try:
-            url = f"{self.base_url}/setWebhook"
             # MISE À JOUR CRITIQUE: Inclure 'callback_query' et 'my_chat_member'
             data = {
                 'url': webhook_url,
                 'allowed_updates': ['message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query', 'my_chat_member']
             }
 
-            response = requests.post(url, json=data, timeout=10)
+            response = self.client.post('setWebhook', json=data, timeout=10)
             result = response.json()
             if result.get('ok'):
                 logger.info(f"Webhook set successfully: {webhook_url}")
@@ -117,8 +120,7 @@ class TelegramBot:
     def get_bot_info(self) -> Dict[str, Any]:
         """Get bot information"""
         try:
-            url = f"{self.base_url}/getMe"
-            response = requests.get(url, timeout=30)
+            response = self.client.get('getMe', timeout=30)
             result = response.json()
             return result.get('result', {}) if result.get('ok') else {}
         except Exception as e:
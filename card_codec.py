@@ -0,0 +1,74 @@
+# card_codec.py
+
+"""
+Encodage des cartes et enseignes en petits entiers.
+
+Enseigne : 0..3 (♠️, ♥️, ♦️, ♣️). Valeur : 0..12 (A, 2..10, J, Q, K).
+Carte : valeur * 4 + enseigne, soit 0..51. Toutes les variantes d'emoji
+(❤️, ♥️, ❤, ♥, avec ou sans sélecteur de variante) donnent le même code.
+"""
+from typing import Optional, Iterable, List, Tuple
+
+SUITS = ('♠️', '♥️', '♦️', '♣️')
+VALUES = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
+NUM_SUITS = len(SUITS)
+NUM_CARDS = len(VALUES) * NUM_SUITS
+
+_SUIT_CHARS = {'♠': 0, '♥': 1, '❤': 1, '♦': 2, '♣': 3}
+_VALUE_INDEX = {v: i for i, v in enumerate(VALUES)}
+_VARIATION_SELECTOR = '️'
+
+_card_cache = {}
+
+# Table de règles : pour chaque code carte, (rang, code enseigne prédite) ou None
+RuleTable = List[Optional[Tuple[int, int]]]
+
+
+def suit_code(suit: str) -> Optional[int]:
+    """Code 0..3 d'une enseigne, quelle que soit sa variante d'emoji"""
+    if not suit:
+        return None
+    return _SUIT_CHARS.get(suit.rstrip(_VARIATION_SELECTOR)[-1:])
+
+
+def encode_card(card: str) -> Optional[int]:
+    """Code 0..51 d'une carte ('10♥️', 'K❤️', 'A♠'...), None si illisible"""
+    code = _card_cache.get(card, -1)
+    if code != -1:
+        return code
+    stripped = card.replace(' ', '').rstrip(_VARIATION_SELECTOR)
+    suit = _SUIT_CHARS.get(stripped[-1:])
+    value = _VALUE_INDEX.get(stripped[:-1].upper())
+    code = None if suit is None or value is None else value * NUM_SUITS + suit
+    if len(_card_cache) < 4096:
+        _card_cache[card] = code
+    return code
+
+
+def decode_suit(code: int) -> str:
+    return SUITS[code]
+
+
+def decode_card(code: int) -> str:
+    """Forme canonique d'une carte (cœur en ♥️)"""
+    return f"{VALUES[code // NUM_SUITS]}{SUITS[code % NUM_SUITS]}"
+
+
+def card_suit_code(code: int) -> int:
+    return code % NUM_SUITS
+
+
+def build_rule_table(entries: Iterable[Tuple[str, str, int]]) -> RuleTable:
+    """
+    Compile des règles (carte déclencheur, enseigne prédite, rang) en table
+    indexée par code carte. Pour une même carte, le meilleur rang est gardé.
+    """
+    table: RuleTable = [None] * NUM_CARDS
+    for trigger, predict, rank in entries:
+        card, suit = encode_card(trigger), suit_code(predict)
+        if card is None or suit is None:
+            continue
+        current = table[card]
+        if current is None or rank < current[0]:
+            table[card] = (rank, suit)
+    return table
@@ -1,13 +1,25 @@
 # card_predictor.py
 
-import re
 import json
+import heapq
 import logging
 import time
 import os
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional, Any
-from collections import Counter, defaultdict
+from types import MappingProxyType
+from typing import Dict, List, Tuple, Optional, Any, FrozenSet, Mapping, NamedTuple
+from collections import defaultdict
+
+from config import Config, TOP_RULES_PER_SUIT
+from metrics import observe_stage, PREDICTIONS_SENT, PREDICTIONS_RESOLVED
+from storage import JournalStore, PersistError, open_store, empty_state
+from rule_stats import TriggerStats, format_count
+from pattern_index import PatternIndex, pair_key, relation_label
+from inter_window import InterWindow, Row
+from card_codec import RuleTable, build_rule_table, decode_suit, decode_card, suit_code, encode_card
+from message_parser import (
+    ParsedGame, ParseCache, CARD_DETAIL_RE, extract_game_number, group_cards, first_card_info
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +30,97 @@ STATIC_RULES = {
     'A♣️': '♦️', '2♣️': '♠️', '3♣️': '❤️', '4♣️': '♣️'
 }
 
+# Les règles statiques ont toutes le même rang : la première carte du groupe l'emporte
+STATIC_RULE_TABLE = build_rule_table((card, suit, 0) for card, suit in STATIC_RULES.items())
+
+
+class PredictorSnapshot(NamedTuple):
+    """Vue immuable de l'état, publiée par l'écrivain unique pour les chemins de lecture"""
+    version: int
+    target_channel_id: Any
+    prediction_channel_id: Any
+    is_inter_mode_active: bool
+    auto_prediction_enabled: bool
+    inter_count: int
+    smart_rules: Tuple[Mapping[str, Any], ...]
+    collected_by_suit: Mapping[str, Tuple[Tuple[str, int], ...]] # enseigne résultat -> (déclencheur, nombre)
+    recent_predictions: Tuple[Tuple[str, Mapping[str, Any]], ...] # 5 dernières par timestamp
+    relation: Optional[Tuple[int, str]] # relation choisie automatiquement (None = 1re carte N-k classique)
+    won: int
+    lost: int
+    pending: int
+    pending_keys: FrozenSet[str] # prédictions en attente (un rafraîchissement du ki n'édite qu'elles)
+
+
+def format_session_report(snap: PredictorSnapshot, stats: Optional[Dict[str, int]] = None) -> str:
+    """Bilan depuis l'instantané, ou depuis les agrégats du stockage (voir report_stats)"""
+    won, lost = (stats['won'], stats['lost']) if stats else (snap.won, snap.lost)
+    total = won + lost
+    rate = (won / total * 100) if total > 0 else 0
+    return (f"📊 **BILAN 24h/24**\n\n📝 Total prédictions : {total}\n✅ Gagnés : {won}\n❌ Perdus : {lost}\n📈 Taux : {rate:.1f}%")
+
+
+def format_inter_status(snap: PredictorSnapshot):
+    is_active = snap.is_inter_mode_active
+    message = f"🧠 **MODE INTER - {'✅ ACTIF' if is_active else '❌ INACTIF'}**\n\n"
+    message += f"📊 {len(snap.smart_rules)} règles créées ({snap.inter_count} jeux analysés):\n"
+    if snap.relation:
+        message += f"🔗 Relation retenue : {relation_label(snap.relation)}\n"
+    message += "\n"
+    rules_by_suit = defaultdict(list)
+    for rule in snap.smart_rules: rules_by_suit[rule['predict']].append(rule)
+    for suit in ['♠️', '♥️', '♦️', '♣️']:
+        suit_display = suit.replace("♥️", "❤️")
+        message += f"Pour prédire {suit_display}:\n"
+        actual_suit = suit if suit in rules_by_suit else suit.replace("❤️", "♥️")
+        if actual_suit in rules_by_suit:
+            for r in rules_by_suit[actual_suit][:8]:
+                trigger_display = r['trigger'].replace("♥️", "❤️")
+                message += f"  • {trigger_display} ({format_count(r['count'])}x)\n"
+        message += "\n"
+    kb = {'inline_keyboard': [[{'text': '🔄 Actualiser Analyse', 'callback_data': 'inter_apply'}]]}
+    return message, kb
+
+
+def compile_smart_rules(smart_rules: List[Dict[str, Any]], top: int = TOP_RULES_PER_SUIT,
+                        min_count: int = 1) -> RuleTable:
+    """Compile les règles INTER (Top 8 par enseigne) en table carte -> (rang, enseigne)"""
+    ranks = defaultdict(int)
+    entries = []
+    for rule in smart_rules:
+        if rule['count'] < min_count: continue
+        rank = ranks[rule['predict']]
+        ranks[rule['predict']] += 1
+        if rank < top:
+            entries.append((rule['trigger'], rule['predict'], rank))
+    return build_rule_table(entries)
+
+
+def compile_pair_rules(smart_rules: List[Dict[str, Any]], top: int = TOP_RULES_PER_SUIT,
+                       min_count: int = 1) -> Dict[int, Tuple[int, int]]:
+    """Compile les règles de paires ("A♠️+3♦️") en table clé de paire -> (rang, enseigne)"""
+    ranks = defaultdict(int)
+    table = {}
+    for rule in smart_rules:
+        if rule['count'] < min_count: continue
+        rank = ranks[rule['predict']]
+        ranks[rule['predict']] += 1
+        cards = [encode_card(c) for c in rule['trigger'].split('+')]
+        suit = suit_code(rule['predict'])
+        if rank < top and len(cards) == 2 and None not in cards and suit is not None:
+            table.setdefault(pair_key(*cards), (rank, suit))
+    return table
+
+
 class CardPredictor:
-    def __init__(self, telegram_message_sender=None):
+    def __init__(self, telegram_message_sender=None, persist: bool = True, read_only: bool = False,
+                 config: Optional[Config] = None):
         self.telegram_message_sender = telegram_message_sender
+        # Réglages des règles et de la fenêtre (variables d'environnement, voir config.Config)
+        settings = config or Config.predictor()
         self.predictions = {}
-        self.inter_data = []
+        # Fenêtre bornée des paires INTER (nombre de paires / âge max en minutes, 0 = illimité)
+        self.inter_data = InterWindow(capacity=settings.INTER_WINDOW_SIZE, max_age=settings.INTER_WINDOW_MAX_AGE * 60)
         self.smart_rules = []
         self.collected_games = set()
         self.sequential_history = {} # Nouveau : historique séquentiel (N-2 -> N)
@@ -35,91 +133,254 @@ class CardPredictor:
         self.last_prediction_time = 0.0
         self.prediction_cooldown = 120
         self._last_trigger_used = None
+        self._prediction_in_flight = None # Prédiction décidée dont l'envoi n'est pas encore enregistré
         self.ef_interval = 0 # Intervalle en minutes pour la commande /ef
         self.last_ef_time = 0
-        self._load_all_data()
+        self.parse_cache = ParseCache()
+        self._rule_table: RuleTable = build_rule_table(())
+        self._rule_table_source = None # Liste smart_rules ayant servi à compiler la table
+        # Compteurs déclencheur -> enseigne tenus à jour par collect_inter_data
+        # RULE_HALF_LIFE (minutes) : les compteurs décroissent au lieu d'attendre un reset
+        self.trigger_stats = TriggerStats(half_life=settings.RULE_HALF_LIFE * 60)
+        self.clock = time.time # horloge des paires INTER et de la décroissance (simulée par le backtest)
+        self._stats_generation = None # Génération de inter_data reflétée par trigger_stats
+        # Index des prédictions en attente (clés de self.predictions), tenu à chaque modification
+        self._pending_keys = set()
+        # Rafraîchir les règles INTER à chaque jeu collecté (coût constant grâce aux compteurs)
+        self.live_rules_refresh = settings.LIVE_RULES
+        # Réglages des règles (voir sweep.py ; modifiables par le backtest)
+        self.trigger_offset = settings.TRIGGER_OFFSET # déclencheur N-2 -> jeu prédit N+2
+        self.top_rules_per_suit = settings.TOP_RULES_PER_SUIT
+        self.min_rule_count = settings.MIN_RULE_COUNT # occurrences minimales d'une règle INTER
+        self.anti_consecutive = True
+        self.static_rule_table = STATIC_RULE_TABLE
+        # Index multi-relations (N-1..N-k, 1re carte / toute carte / paire) compté en une passe
+        self.patterns = PatternIndex(
+            max_offset=settings.PATTERN_MAX_OFFSET,
+            capacity=self.inter_data.capacity or 2000
+        )
+        # Choix automatique de la meilleure relation par l'analyse INTER (sinon relation classique)
+        self.auto_relation = settings.AUTO_RELATION
+        self.min_relation_trials = settings.MIN_RELATION_TRIALS
+        self.active_relation: Optional[Tuple[int, str]] = None
+        self._pair_table: Dict[int, Tuple[int, int]] = {}
+        # Dernière prédiction terminée (numéro, enseigne), pour la règle anti-consécutif
+        self._last_finished = None
+        self._last_finished_source = None # dict predictions pour lequel le cache est valide
+        # Appelé après chaque reset avec (ancien état, motif), ex. archivage pour le backtest
+        self.on_reset = None
+        # ingest_batch : sauvegardes regroupées en une seule à la fin du lot
+        self._defer_saves = False
+        self._save_deferred = False
+        self._resync = False # dernière sauvegarde en échec : la suivante écrit un snapshot complet
+        # persist=False : état uniquement en mémoire, aucune lecture ni écriture de fichier
+        # read_only=True : état relu sans jamais écrire (worker pas encore leader, voir reload_state)
+        self.read_only = read_only
+        self._store = open_store(inter_limit=self.inter_data.capacity, read_only=read_only) if persist else None
+        self._persisted = empty_state() # Miroir du dernier état écrit (pour calculer les deltas)
+        self._persisted_inter_ref = (None, 0)
+        self._persisted_rules_ref = None
+        self.state_loaded = self._store is None # faux tant que l'état persisté n'a pas été relu (voir /health)
+        if self._store:
+            self._load_all_data()
         # S'assurer que les IDs sont bien ceux demandés même après chargement
         self.target_channel_id = -1002682552255
         self.prediction_channel_id = -1003554569009
         self._save_all_data()
 
-    def reset_all_data(self):
-        """Efface toutes les données de prédiction et réinitialise l'état"""
-        files_to_clear = [
-            'predictions.json', 'inter_data.json', 'smart_rules.json',
-            'collected_games.json', 'inter_mode_status.json', 'sequential_history.json'
-        ]
-        for file in files_to_clear:
-            if os.path.exists(file):
-                try:
-                    os.remove(file)
-                except: pass
-        
-        self.predictions = {}
-        self.inter_data = []
+    def reset_state(self, reason: str = 'reset', activate_inter: bool = False) -> Dict[str, Any]:
+        """
+        Remplace d'un coup l'état appris et les prédictions par un état vide (sur l'écrivain
+        unique) : une seule sauvegarde delta, aucun rechargement. Renvoie l'ancien état.
+        """
+        old = self._export_state()
+        self.replace_predictions({})
+        self.inter_data.clear()
+        self.patterns.clear()
         self.smart_rules = []
+        self.active_relation = None
         self.collected_games = set()
+        self.sequential_history = {}
         self.last_prediction_time = 0
         self.last_predicted_game_number = 0
-        self.is_inter_mode_active = True
+        if activate_inter: self.is_inter_mode_active = True
         self._save_all_data()
-        logger.info("♻️ Toutes les données ont été réinitialisées.")
+        logger.info(f"♻️ État du prédicteur réinitialisé ({reason})")
+        if self.on_reset:
+            try:
+                self.on_reset(old, reason)
+            except Exception as e:
+                logger.error(f"❌ Erreur après reset ({reason}): {e}")
+        return old
+
+    def reset_all_data(self):
+        """Efface toutes les données de prédiction et réinitialise l'état"""
+        self.reset_state('global', activate_inter=True)
 
     def _load_all_data(self):
         try:
-            if os.path.exists('predictions.json'):
-                with open('predictions.json', 'r') as f: self.predictions = json.load(f)
-            if os.path.exists('inter_data.json'):
-                with open('inter_data.json', 'r') as f: self.inter_data = json.load(f)
-            if os.path.exists('smart_rules.json'):
-                with open('smart_rules.json', 'r') as f: self.smart_rules = json.load(f)
-            if os.path.exists('sequential_history.json'):
-                with open('sequential_history.json', 'r') as f: self.sequential_history = {int(k): v for k, v in json.load(f).items()}
-            if os.path.exists('inter_mode_status.json'):
-                with open('inter_mode_status.json', 'r') as f:
-                    data = json.load(f)
-                    self.is_inter_mode_active = data.get('active', True)
-                    self.ef_interval = data.get('ef_interval', 0)
-                    self.last_ef_time = data.get('last_ef_time', 0)
+            state = self._store.load()
+            legacy_journal = JournalStore(read_only=True)
+            if state is None and not isinstance(self._store, JournalStore) and legacy_journal.exists():
+                # Passage au backend SQLite : import du journal + snapshot JSON existants
+                state = legacy_journal.load()
+                if not self.read_only:
+                    self._store.write_snapshot(state)
+                    logger.info("📦 État JSON migré vers SQLite")
+            if state is None:
+                # Premier démarrage avec le journal : migration des anciens fichiers JSON
+                self._load_legacy_files()
+                self._remember_persisted(self._export_state())
+                if not self.read_only:
+                    self._store.write_snapshot(self._export_state())
+                self.state_loaded = True
+                return
+            self._import_state(state)
+            self._remember_persisted(state)
+            self.state_loaded = True
         except Exception as e:
             logger.error(f"Error loading data: {e}")
 
-    def _save_all_data(self):
+    def reload_state(self):
+        """Relit l'état persisté (nouveau leader en mode multi-workers) ; le prédicteur écrit ensuite"""
+        if self._store is not None:
+            # Stockage rouvert en écriture : numéro de séquence du journal repris là où l'ancien leader l'a laissé
+            self.read_only = False
+            self._store = open_store(inter_limit=self.inter_data.capacity)
+            self._load_all_data()
+        self.target_channel_id = -1002682552255
+        self.prediction_channel_id = -1003554569009
+        self._save_all_data()
+        logger.info("🔁 État du prédicteur rechargé depuis le stockage")
+
+    def _load_legacy_files(self):
+        if os.path.exists('predictions.json'):
+            with open('predictions.json', 'r') as f: self.replace_predictions(json.load(f))
+        if os.path.exists('inter_data.json'):
+            with open('inter_data.json', 'r') as f: self.inter_data.load(json.load(f))
+        if os.path.exists('smart_rules.json'):
+            with open('smart_rules.json', 'r') as f: self.smart_rules = json.load(f)
+        if os.path.exists('sequential_history.json'):
+            with open('sequential_history.json', 'r') as f: self.sequential_history = {int(k): v for k, v in json.load(f).items()}
+        if os.path.exists('inter_mode_status.json'):
+            with open('inter_mode_status.json', 'r') as f:
+                data = json.load(f)
+                self.is_inter_mode_active = data.get('active', True)
+                self.ef_interval = data.get('ef_interval', 0)
+                self.last_ef_time = data.get('last_ef_time', 0)
+
+    def _export_state(self) -> Dict[str, Any]:
+        return {
+            'predictions': self.predictions,
+            'inter_data': self.inter_data.rows(),
+            'smart_rules': self.smart_rules,
+            'sequential_history': {str(k): v for k, v in self.sequential_history.items()},
+            'settings': {
+                'active': self.is_inter_mode_active,
+                'ef_interval': self.ef_interval,
+                'last_ef_time': self.last_ef_time,
+                'relation': list(self.active_relation) if self.active_relation else None
+            },
+            'config_ids': {
+                'target_channel_id': self.target_channel_id,
+                'prediction_channel_id': self.prediction_channel_id
+            }
+        }
+
+    def _import_state(self, state: Dict[str, Any]):
+        self.replace_predictions(state.get('predictions', {}))
+        self.inter_data.load(state.get('inter_data', []))
+        self.inter_data.evict_expired()
+        self.smart_rules = state.get('smart_rules', [])
+        self.sequential_history = {int(k): v for k, v in state.get('sequential_history', {}).items()}
+        settings = state.get('settings', {})
+        self.is_inter_mode_active = settings.get('active', True)
+        self.ef_interval = settings.get('ef_interval', 0)
+        self.last_ef_time = settings.get('last_ef_time', 0)
+        relation = settings.get('relation')
+        self.active_relation = tuple(relation) if relation else None
+
+    def _remember_persisted(self, state: Dict[str, Any]):
+        self._persisted = {
+            'predictions': {k: dict(v) for k, v in state['predictions'].items()},
+            'sequential_history': {k: dict(v) for k, v in state['sequential_history'].items()},
+            'settings': dict(state['settings']),
+            'config_ids': dict(state['config_ids']),
+        }
+        self._persisted_inter_ref = (self.inter_data.generation, self.inter_data.appended)
+        self._persisted_rules_ref = self.smart_rules
+
+    def _diff_dict_section(self, name: str, current: Dict[str, Any], ops: list):
+        persisted = self._persisted[name]
+        for key, value in current.items():
+            if persisted.get(key) != value:
+                ops.append(['set', name, key, value])
+                persisted[key] = dict(value)
+        for key in [k for k in persisted if k not in current]:
+            ops.append(['del', name, key])
+            del persisted[key]
+
+    def _collect_changes(self) -> list:
+        """Calcule les deltas depuis la dernière sauvegarde (comparaisons en mémoire uniquement)"""
+        ops = []
+        self._diff_dict_section('predictions', self.predictions, ops)
+        self._diff_dict_section('sequential_history', {str(k): v for k, v in self.sequential_history.items()}, ops)
+        # inter_data est en ajout seul (le rejeu réapplique l'éviction), sauf correction ou reset
+        inter = self.inter_data
+        generation, appended = self._persisted_inter_ref
+        if inter.generation == generation:
+            if inter.appended > appended:
+                ops.append(['append', 'inter_data', inter.tail(inter.appended - appended)])
+        else:
+            ops.append(['replace', 'inter_data', inter.rows()])
+        self._persisted_inter_ref = (inter.generation, inter.appended)
+        if self.smart_rules is not self._persisted_rules_ref:
+            ops.append(['replace', 'smart_rules', self.smart_rules])
+            self._persisted_rules_ref = self.smart_rules
+        exported = self._export_state()
+        for name in ('settings', 'config_ids'):
+            if exported[name] != self._persisted[name]:
+                ops.append(['replace', name, exported[name]])
+                self._persisted[name] = exported[name]
+        return ops
+
+    def _save_all_data(self, force_snapshot: bool = False, strict: bool = False):
+        """Sauvegarde delta ; strict=True lève l'échec au lieu de seulement le journaliser"""
+        if self._store is None or self.read_only: return
+        if self._defer_saves:
+            # Le delta est calculé sur l'état final du lot : une seule écriture suffit
+            self._save_deferred = True
+            return
+        started = time.perf_counter()
         try:
-            with open('predictions.json', 'w') as f: json.dump(self.predictions, f)
-            with open('inter_data.json', 'w') as f: json.dump(self.inter_data, f)
-            with open('smart_rules.json', 'w') as f: json.dump(self.smart_rules, f)
-            with open('sequential_history.json', 'w') as f: json.dump(self.sequential_history, f)
-            with open('inter_mode_status.json', 'w') as f: 
-                json.dump({
-                    'active': self.is_inter_mode_active,
-                    'ef_interval': self.ef_interval,
-                    'last_ef_time': self.last_ef_time
-                }, f)
-            with open('config_ids.json', 'w') as f:
-                json.dump({
-                    'target_channel_id': self.target_channel_id,
-                    'prediction_channel_id': self.prediction_channel_id
-                }, f)
+            self._store.append(self._collect_changes())
+            if force_snapshot or self._resync or self._store.needs_compaction():
+                self._store.write_snapshot(self._export_state())
+            self._resync = False
         except Exception as e:
+            # Le miroir a déjà absorbé le delta perdu : la prochaine sauvegarde réécrit tout
+            self._resync = True
             logger.error(f"Error saving data: {e}")
+            if strict:
+                raise
+        finally:
+            observe_stage('persist', started)
+
+    def parse(self, text: str, chat_id=None, message_id=None) -> ParsedGame:
+        """Analyse (ou relit depuis le cache) un post du canal source"""
+        return self.parse_cache.get(text, chat_id, message_id)
+
+    def _as_parsed(self, message) -> ParsedGame:
+        return message if isinstance(message, ParsedGame) else self.parse(message)
 
     def extract_game_number(self, text: str) -> Optional[int]:
-        text = text.upper()
-        m = re.search(r'(?:#|N|#N)(\d+)', text, re.IGNORECASE)
-        if m: return int(m.group(1))
-        m = re.search(r'🔵(\d+)🔵', text)
-        if m: return int(m.group(1))
-        return None
+        return extract_game_number(text)
 
     def get_all_cards_in_first_group(self, text: str) -> List[str]:
-        text = text.replace("❤️", "♥️").replace("❤️️", "♥️").replace(" ", "")
-        cards = re.findall(r'([AJQK\d]+(?:♠️|♥️|♦️|♣️|♠|❤️|♦|♣))', text)
-        return [self.normalize_card(c) for c in cards]
+        return list(group_cards(text))
 
     def extract_card_details(self, content: str) -> List[Tuple[str, str]]:
-        normalized_content = content.replace("♥️", "❤️")
-        return re.findall(r'(\d+|[AKQJ])(♠️|❤️|♦️|♣️)', normalized_content, re.IGNORECASE)
+        return CARD_DETAIL_RE.findall(content.replace("♥️", "❤️"))
 
     def normalize_card(self, card_str: str) -> str:
         return card_str.replace("❤️", "♥️")
@@ -128,136 +389,188 @@ class CardPredictor:
         if self.ef_interval > 0:
             now = time.time()
             if now - self.last_ef_time >= (self.ef_interval * 60):
-                self.predictions = {}
-                self.inter_data = []
-                self.smart_rules = []
-                self.collected_games = set()
-                self.sequential_history = {}
                 self.last_ef_time = now
-                self._save_all_data()
+                self.reset_state('ef')
                 logger.info(f"♻️ Reset automatique /ef ({self.ef_interval} min) effectué.")
 
-    def collect_inter_data(self, game_number: int, message: str):
-        info = self.get_first_card_info(message)
+    def collect_inter_data(self, game_number: int, message):
+        game = self._as_parsed(message)
+        info = game.first_card
         if not info: return
-        full_card, suit = info
-        trigger_card_normalized = self.normalize_card(full_card)
-        result_suit_normalized = suit.replace("❤️", "♥️")
+        # Même passe : toutes les relations de l'index (l'index ignore lui-même un jeu inchangé)
+        self.patterns.observe(game_number, game.first_group_codes, suit_code(info[1]), game.first_group_suits)
+        trigger_card_normalized, result_suit_normalized = info
         if game_number in self.collected_games:
             existing_data = self.sequential_history.get(game_number)
             if existing_data and existing_data.get('carte') == trigger_card_normalized: return
-            self.inter_data = [e for e in self.inter_data if e.get('numero_resultat') != game_number]
+            # Correction : on retire l'ancienne paire ; les compteurs seront recalculés depuis la
+            # fenêtre (un retrait au milieu fausserait leur ordre d'arrivée, qui départage les égalités)
+            self.inter_data.remove_result(game_number)
         self.sequential_history[game_number] = {'carte': trigger_card_normalized, 'date': datetime.now().isoformat()}
         self.collected_games.add(game_number)
-        n_minus_2 = game_number - 2
-        trigger_entry = self.sequential_history.get(n_minus_2)
+        trigger_game = game_number - self.trigger_offset
+        trigger_entry = self.sequential_history.get(trigger_game)
+        stats = self._sync_trigger_stats()
+        now = int(self.clock())
+        self._uncount_rows(self.inter_data.evict_expired(now))
         if trigger_entry:
             trigger_card = trigger_entry['carte']
-            self.inter_data.append({
-                'numero_resultat': game_number,
-                'declencheur': trigger_card, 
-                'numero_declencheur': n_minus_2,
-                'result_suit': result_suit_normalized, 
-                'date': datetime.now().isoformat()
-            })
+            card, suit = encode_card(trigger_card), suit_code(result_suit_normalized)
+            if card is not None and suit is not None:
+                self._uncount_rows(self.inter_data.add(game_number, trigger_game, card, suit, now))
+                stats.add(decode_card(card), decode_suit(suit), now)
+                if self.live_rules_refresh:
+                    self._refresh_smart_rules()
         limit = game_number - 50
         self.sequential_history = {k:v for k,v in self.sequential_history.items() if k >= limit}
         self.collected_games = {g for g in self.collected_games if g >= limit}
         self._save_all_data()
 
     def get_first_card_info(self, message: str) -> Optional[Tuple[str, str]]:
-        match = re.search(r'\(([^)]*)\)', message)
-        content = match.group(1) if match else message
-        details = self.extract_card_details(content)
-        if details:
-            v, c = details[0]
-            return f"{v.upper()}{c}", c 
-        return None
+        return first_card_info(message)
+
+    def _sync_trigger_stats(self) -> TriggerStats:
+        """Recalcule les compteurs si inter_data a été rechargé ou vidé hors de collect_inter_data"""
+        if self._stats_generation != self.inter_data.generation:
+            self.trigger_stats.rebuild(self.inter_data)
+            self._stats_generation = self.inter_data.generation
+        return self.trigger_stats
+
+    def _uncount_rows(self, rows: List[Row]):
+        """Retire des compteurs les paires évincées de la fenêtre"""
+        for row in rows:
+            self.trigger_stats.remove(decode_card(row[2]), decode_suit(row[3]), row[4])
+
+    def _refresh_smart_rules(self):
+        """Classement des règles lu depuis les compteurs vivants (sans relire inter_data)"""
+        relation = self.patterns.best_relation(self.min_relation_trials) if self.auto_relation else None
+        if relation is None and self.auto_relation and self.active_relation:
+            # Index encore froid (redémarrage) : on garde la relation et les règles persistées
+            self._inter_rule_table()
+            return
+        if relation is None:
+            new_rules = self._sync_trigger_stats().ranked_rules(self.clock())
+        else:
+            new_rules = self.patterns.ranked_rules(relation)
+        if relation != self.active_relation:
+            logger.info(f"🔗 Relation INTER : {relation_label(relation) if relation else 'classique'}")
+            self.active_relation = relation
+            self._rule_table_source = None
+        # On garde la même liste si rien n'a changé : ni recompilation ni écriture
+        if new_rules != self.smart_rules:
+            self.smart_rules = new_rules
+        self._inter_rule_table()
 
     def analyze_and_set_smart_rules(self, chat_id=None, force_activate=False):
         if len(self.inter_data) < 1: return
-        trigger_patterns = defaultdict(Counter)
-        for entry in self.inter_data:
-            trigger_patterns[entry['declencheur']][entry['result_suit']] += 1
-        new_rules = []
-        for trigger, results in trigger_patterns.items():
-            suit, count = results.most_common(1)[0]
-            if count >= 1:
-                new_rules.append({'trigger': trigger, 'predict': suit, 'count': count, 'total': sum(results.values())})
-        new_rules.sort(key=lambda x: x['count'], reverse=True)
-        self.smart_rules = new_rules
+        self._refresh_smart_rules()
         if force_activate: self.is_inter_mode_active = True
         self._save_all_data()
 
-    def should_predict(self, text: str):
+    def should_predict(self, message):
         if not self.auto_prediction_enabled: return False, None, None, False
-        game_num = self.extract_game_number(text)
+        game = self._as_parsed(message)
+        game_num = game.game_number
         if not game_num: return False, None, None, False
+        # Relation choisie par l'analyse : son décalage remplace trigger_offset
+        relation = self.active_relation if self.is_inter_mode_active else None
+        offset = relation[0] if relation else self.trigger_offset
         if self.last_predicted_game_number > 0:
-            target_game = game_num + 2
+            target_game = game_num + offset
             gap = target_game - self.last_predicted_game_number
             if gap < 3: return False, None, None, False
-        for p in self.predictions.values():
-            if p.get('status') == 'pending': return False, None, None, False
+        if self.pending_predictions() or self._prediction_in_flight: return False, None, None, False
         
-        first_group_match = re.search(r'\d+\(([^)]+)\)', text)
-        if not first_group_match: return False, None, None, False
-        cards_to_check = self.get_all_cards_in_first_group(first_group_match.group(1))
+        cards_to_check = game.first_group_cards
         if not cards_to_check: return False, None, None, False
         
-        prediction, is_inter, trigger_used = None, False, None
-        
         # Récupération de la dernière prédiction terminée pour vérifier le costume consécutif
-        last_finished_suit = None
-        sorted_preds = sorted(
-            [p for p in self.predictions.values() if p.get('status') in ['won', 'lost']], 
-            key=lambda x: int(x.get('game_num', 0)), 
-            reverse=True
-        )
-        if sorted_preds:
-            last_finished_suit = sorted_preds[0].get('predicted_costume')
-
-        # Séparation stricte des modes
-        if self.is_inter_mode_active:
-            if self.smart_rules:
-                rules_by_suit = defaultdict(list)
-                for rule in self.smart_rules: rules_by_suit[rule['predict']].append(rule)
-                # On regarde toutes les cartes du premier groupe
-                found_rules = []
-                for card in cards_to_check:
-                    card_clean = card.replace("❤️", "♥️")
-                    for suit, rules in rules_by_suit.items():
-                        # REGLE ANTI-CONSECUTIF : On ignore si c'est le même costume que le dernier gagné/perdu
-                        if suit == last_finished_suit:
-                            continue
-
-                        # On compare aux 8 meilleurs tops (règles intelligentes)
-                        for rank, r in enumerate(rules[:8]):
-                            if card_clean == r['trigger']:
-                                found_rules.append({'rank': rank, 'suit': suit, 'trigger': card_clean})
-                
-                if found_rules:
-                    # On prend la règle qui a le meilleur rang (plus proche du Top 1)
-                    found_rules.sort(key=lambda x: x['rank'])
-                    best = found_rules[0]
-                    prediction, trigger_used, is_inter = best['suit'], best['trigger'], True
+        last_finished_suit = self._last_finished_suit() if self.anti_consecutive else None
+
+        # Séparation stricte des modes : table INTER ou table statique, même format
+        is_inter = self.is_inter_mode_active
+        table = self._inter_rule_table() if is_inter else self.static_rule_table
+        # REGLE ANTI-CONSECUTIF : on ignore le costume du dernier gagné/perdu
+        excluded = suit_code(last_finished_suit) if last_finished_suit else None
+        best_rank, best_suit, best_index = None, None, None
+        if relation and relation[1] == 'pair':
+            best_suit, trigger_used = self._best_pair_rule(game, excluded)
         else:
-            # Mode statique uniquement si INTER est inactif
-            # On prend la première carte du groupe qui a une règle statique
-            for card in cards_to_check:
-                card_name = card.replace("♥️", "❤️")
-                if card_name in STATIC_RULES:
-                    candidate_suit = STATIC_RULES[card_name].replace("❤️", "♥️")
-                    # REGLE ANTI-CONSECUTIF
-                    if candidate_suit != last_finished_suit:
-                        prediction, trigger_used, is_inter = candidate_suit, card, False
-                        break
+            for index, code in enumerate(game.first_group_codes):
+                if code is None: continue
+                entry = table[code]
+                if entry is None or entry[1] == excluded: continue
+                # On garde le meilleur rang (plus proche du Top 1), la première carte à égalité
+                if best_rank is None or entry[0] < best_rank:
+                    best_rank, best_suit, best_index = entry[0], entry[1], index
+            trigger_used = cards_to_check[best_index] if best_index is not None else None
+        prediction = decode_suit(best_suit) if best_suit is not None else None
         
         if prediction:
             self._last_trigger_used = trigger_used
-            return True, game_num + 2, prediction, is_inter
+            return True, game_num + offset, prediction, is_inter
         return False, None, None, False
 
+    def _best_pair_rule(self, game: ParsedGame, excluded: Optional[int]) -> Tuple[Optional[int], Optional[str]]:
+        """Meilleure règle de paire du premier groupe : (enseigne, déclencheur "c1+c2")"""
+        self._inter_rule_table()
+        codes, cards = game.first_group_codes, game.first_group_cards
+        best = None
+        for i, a in enumerate(codes):
+            if a is None: continue
+            for j in range(i + 1, len(codes)):
+                b = codes[j]
+                if b is None or b == a: continue
+                entry = self._pair_table.get(pair_key(a, b))
+                if entry is None or entry[1] == excluded: continue
+                if best is None or entry[0] < best[0]:
+                    best = (entry[0], entry[1], f"{cards[i]}+{cards[j]}")
+        return (best[1], best[2]) if best else (None, None)
+
+    def _last_finished_suit(self) -> Optional[str]:
+        """Enseigne de la prédiction gagnée/perdue au plus grand numéro (cache tenu par la vérification)"""
+        if self._last_finished_source is not self.predictions:
+            self._last_finished = None
+            for p in self.predictions.values():
+                if p.get('status') in ('won', 'lost'):
+                    num = int(p.get('game_num', 0))
+                    if self._last_finished is None or num > self._last_finished[0]:
+                        self._last_finished = (num, p.get('predicted_costume'))
+            self._last_finished_source = self.predictions
+        return self._last_finished[1] if self._last_finished else None
+
+    def replace_predictions(self, predictions: Dict[str, Dict[str, Any]]):
+        """Remplace toutes les prédictions (chargement, reset, nouveau cycle) et réindexe les attentes"""
+        self.predictions = predictions
+        self._pending_keys = {k for k, p in predictions.items() if p.get('status') == 'pending'}
+        self._last_finished_source = None
+
+    def add_prediction(self, game_num: int, data: Dict[str, Any]):
+        """Enregistre une prédiction envoyée et met l'index à jour"""
+        key = str(game_num)
+        if key in self.predictions:
+            self._last_finished_source = None # une prédiction terminée peut être remplacée
+        self.predictions[key] = data
+        if data.get('status') == 'pending':
+            self._pending_keys.add(key)
+        else:
+            self._pending_keys.discard(key)
+
+    def pending_predictions(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Prédictions en attente, sans parcourir tout l'historique"""
+        return [(key, self.predictions[key]) for key in self._pending_keys]
+
+    def _inter_rule_table(self) -> RuleTable:
+        """Table compilée des règles INTER (recompilée si smart_rules a été remplacé)"""
+        if self._rule_table_source is not self.smart_rules:
+            if self.active_relation and self.active_relation[1] == 'pair':
+                self._pair_table = compile_pair_rules(self.smart_rules, self.top_rules_per_suit, self.min_rule_count)
+                self._rule_table = build_rule_table(())
+            else:
+                self._rule_table = compile_smart_rules(self.smart_rules, self.top_rules_per_suit, self.min_rule_count)
+            self._rule_table_source = self.smart_rules
+        return self._rule_table
+
     def prepare_prediction_text(self, game_num: int, suit: str, ki: int = 0, show_ki: bool = False) -> str:
         # On supprime l'entité HTML invisible qui cause l'Erreur 400
         suit_display = suit.replace("❤️", "❤️").replace("♠️", "♠️").replace("♦️", "♦️").replace("♣️", "♣️")
@@ -269,41 +582,23 @@ class CardPredictor:
                 f"💧 Догон 2 Игры!! (🔰+1Риск)")
         return text
 
-    def has_completion_indicators(self, text: str) -> bool:
-        return '✅' in text or '❌' in text
+    def has_completion_indicators(self, message) -> bool:
+        return self._as_parsed(message).has_completion
 
-    def _verify_prediction_common(self, text: str) -> Dict:
-        game_num = self.extract_game_number(text)
+    def _verify_prediction_common(self, message) -> Dict:
+        game = self._as_parsed(message)
+        game_num = game.game_number
         if not game_num: return {}
-        first_group_match = re.search(r'\d+\(([^)]+)\)', text)
-        if not first_group_match:
-            cards = self.get_all_cards_in_first_group(text)
-            first_group_cards = cards[:3] if cards else []
-        else:
-            first_group_cards = self.get_all_cards_in_first_group(first_group_match.group(1))
         target_game = None
         for offset in [0, 1, 2]:
-            check_num = game_num - offset
-            if str(check_num) in self.predictions:
-                pred = self.predictions[str(check_num)]
-                if pred.get('status') == 'pending':
-                    target_game = str(check_num)
-                    break
+            check_num = str(game_num - offset)
+            if check_num in self._pending_keys:
+                target_game = check_num
+                break
         if not target_game: return {}
         pred = self.predictions[target_game]
         predicted_suit = pred['predicted_costume']
-        found_in_group = False
-        for card in first_group_cards:
-            suit = ""
-            for s in ['♠️', '♥️', '♦️', '♣️', '♠', '❤️', '♦', '♣']:
-                if s in card:
-                    suit = s
-                    break
-            if not suit: suit = card[-1]
-            if suit in ["❤️", "❤️️"]: suit = "♥️"
-            if suit == predicted_suit:
-                found_in_group = True
-                break
+        found_in_group = predicted_suit in game.first_group_suits
         offset = game_num - int(target_game)
         
         if found_in_group:
@@ -322,6 +617,12 @@ class CardPredictor:
             else: return {}
             
         pred['status'] = status
+        PREDICTIONS_RESOLVED.inc(1, status)
+        self._pending_keys.discard(target_game)
+        if self._last_finished_source is self.predictions:
+            num = int(pred.get('game_num', 0))
+            if self._last_finished is None or num >= self._last_finished[0]:
+                self._last_finished = (num, predicted_suit)
         self._save_all_data()
         ki_final = pred.get('ki_base', 0) + offset
         
@@ -339,32 +640,165 @@ class CardPredictor:
             'message_id_to_edit': pred['message_id'], 
             'new_message': new_text,
             'offset': offset,
+            'status': status,
             'ki_final': ki_final
         }
 
     def get_session_report_preview(self) -> str:
-        finished_preds = [p for p in self.predictions.values() if p.get('status') in ['won', 'lost']]
-        total = len(finished_preds)
-        won = sum(1 for p in finished_preds if p.get('status') == 'won')
-        lost = sum(1 for p in finished_preds if p.get('status') == 'lost')
-        rate = (won / total * 100) if total > 0 else 0
-        return (f"📊 **BILAN 24h/24**\n\n📝 Total prédictions : {total}\n✅ Gagnés : {won}\n❌ Perdus : {lost}\n📈 Taux : {rate:.1f}%")
+        return format_session_report(self.snapshot(), self.report_stats())
+
+    def report_stats(self, window: float = 24 * 3600) -> Optional[Dict[str, int]]:
+        """Agrégats SQL du bilan sur la fenêtre (historique archivé inclus) ; None avec le backend JSON ou sans stockage"""
+        if self._store is None: return None # persist=False : le bilan reprend les compteurs en mémoire
+        try:
+            return self._store.prediction_stats(since=time.time() - window)
+        except Exception as e:
+            logger.error(f"Error computing report stats: {e}")
+            return None
 
     def get_inter_status(self):
-        is_active = self.is_inter_mode_active
-        total_collected = len(self.inter_data)
-        message = f"🧠 **MODE INTER - {'✅ ACTIF' if is_active else '❌ INACTIF'}**\n\n"
-        message += f"📊 {len(self.smart_rules)} règles créées ({total_collected} jeux analysés):\n\n"
-        rules_by_suit = defaultdict(list)
-        for rule in self.smart_rules: rules_by_suit[rule['predict']].append(rule)
-        for suit in ['♠️', '♥️', '♦️', '♣️']:
-            suit_display = suit.replace("♥️", "❤️")
-            message += f"Pour prédire {suit_display}:\n"
-            actual_suit = suit if suit in rules_by_suit else suit.replace("❤️", "♥️")
-            if actual_suit in rules_by_suit:
-                for r in rules_by_suit[actual_suit][:8]:
-                    trigger_display = r['trigger'].replace("♥️", "❤️")
-                    message += f"  • {trigger_display} ({r['count']}x)\n"
-            message += "\n"
-        kb = {'inline_keyboard': [[{'text': '🔄 Actualiser Analyse', 'callback_data': 'inter_apply'}]]}
-        return message, kb
+        return format_inter_status(self.snapshot())
+
+    def snapshot(self, version: int = 0) -> PredictorSnapshot:
+        """Construit une vue immuable de l'état (à appeler depuis l'écrivain)"""
+        won = lost = pending = 0
+        for p in self.predictions.values():
+            status = p.get('status')
+            if status == 'won': won += 1
+            elif status == 'lost': lost += 1
+            elif status == 'pending': pending += 1
+        recent = heapq.nlargest(5, self.predictions.items(), key=lambda x: x[1].get('timestamp', 0))
+        collected = defaultdict(list)
+        for trigger, results in self._sync_trigger_stats().current_counts(self.clock()).items():
+            for suit, count in results.items():
+                collected[suit.replace('♥️', '❤️')].append((trigger, count))
+        return PredictorSnapshot(
+            version=version,
+            target_channel_id=self.target_channel_id,
+            prediction_channel_id=self.prediction_channel_id,
+            is_inter_mode_active=self.is_inter_mode_active,
+            auto_prediction_enabled=self.auto_prediction_enabled,
+            inter_count=len(self.inter_data),
+            smart_rules=tuple(MappingProxyType(dict(r)) for r in self.smart_rules),
+            collected_by_suit=MappingProxyType({
+                suit: tuple(sorted(items, key=lambda x: x[1], reverse=True)) for suit, items in collected.items()
+            }),
+            recent_predictions=tuple((k, MappingProxyType(dict(p))) for k, p in recent),
+            relation=self.active_relation,
+            won=won, lost=lost, pending=pending,
+            pending_keys=frozenset(self._pending_keys),
+        )
+
+    # --- Commandes de mutation (exécutées par l'écrivain unique, voir predictor_actor) ---
+
+    def ingest(self, game: ParsedGame, allow_prediction: bool = True):
+        """
+        Traite un post du canal source : reset /ef, collecte, vérification et décision
+        de prédiction. Renvoie (édition de vérification, décision) ; les envois Telegram
+        se font hors de l'écrivain, puis record_prediction() enregistre le résultat.
+        """
+        self.check_ef_reset()
+        clock = time.perf_counter
+        if game.game_number:
+            started = clock()
+            self.collect_inter_data(game.game_number, game)
+            observe_stage('collect', started)
+        res = {}
+        if game.has_completion or game.has_shield:
+            started = clock()
+            res = self._verify_prediction_common(game)
+            observe_stage('verify', started)
+        decision = None
+        if allow_prediction:
+            started = clock()
+            ok, num, val, is_inter = self.should_predict(game)
+            if ok and num and val:
+                # Réservation : aucune autre prédiction tant que l'envoi n'est pas enregistré
+                self._prediction_in_flight = num
+                decision = (num, val, is_inter, self._last_trigger_used or '?')
+            observe_stage('predict', started)
+        return res, decision
+
+    def ingest_batch(self, games: List[Tuple[ParsedGame, bool]]) -> List[Optional[Tuple[Dict, Any]]]:
+        """
+        ingest() de chaque (jeu, prédiction autorisée), dans l'ordre, avec une seule sauvegarde.
+        Un jeu en échec donne None sans arrêter le lot ; une sauvegarde en échec lève PersistError
+        (avec les résultats du lot, pour que les éditions de vérification partent quand même).
+        """
+        results = []
+        self._defer_saves = True
+        try:
+            for game, allow_prediction in games:
+                try:
+                    results.append(self.ingest(game, allow_prediction))
+                except Exception as e:
+                    logger.error(f"❌ Jeu {game.game_number} du lot en échec: {e}")
+                    results.append(None)
+        finally:
+            self._defer_saves = False
+        # Resynchronisation en attente : le lot relivré ne change peut-être rien, l'état doit quand même être écrit
+        if self._save_deferred or self._resync:
+            self._save_deferred = False
+            try:
+                self._save_all_data(strict=True)
+            except Exception as e:
+                raise PersistError(f"sauvegarde du lot impossible: {e}", results) from e
+        return results
+
+    def record_prediction(self, num: int, val: str, is_inter: bool, trigger: str,
+                          message_id: Optional[int], ki: int):
+        """Enregistre la prédiction envoyée (ou libère la réservation si l'envoi a échoué)"""
+        self._prediction_in_flight = None
+        if not message_id: return
+        PREDICTIONS_SENT.inc()
+        self.add_prediction(num, {
+            'game_num': num,
+            'predicted_costume': val, 'predicted_from_trigger': trigger,
+            'message_id': message_id, 'timestamp': time.time(), 'status': 'pending', 'is_inter': is_inter,
+            'ki_base': ki
+        })
+        self.last_predicted_game_number = num
+        self.last_prediction_time = time.time()
+        self._save_all_data()
+
+    def apply_ki_updates(self, updated: Dict[str, int], removed: List[str]) -> bool:
+        """
+        Applique les résultats du rafraîchissement du ki ; ne persiste que si quelque chose a changé.
+        Une prédiction vérifiée entre-temps n'est ni mise à jour ni supprimée (son message
+        non éditable ne dit rien de son résultat, qui reste dans l'historique et le bilan).
+        """
+        changed = False
+        for key, ki in updated.items():
+            pred = self.predictions.get(key)
+            if key in self._pending_keys and pred.get('last_updated_ki') != ki:
+                pred['last_updated_ki'] = ki
+                changed = True
+        for key in removed:
+            if key in self._pending_keys:
+                del self.predictions[key]
+                self._pending_keys.discard(key)
+                changed = True
+        if changed:
+            self._save_all_data()
+        return changed
+
+    def set_inter_mode(self, active: bool):
+        self.is_inter_mode_active = active
+        self._save_all_data()
+
+    def set_ef_interval(self, minutes: int):
+        self.ef_interval = minutes
+        self.last_ef_time = time.time()
+        self._save_all_data()
+
+    def set_channel(self, kind: str, chat_id: int):
+        if kind == 'source':
+            self.target_channel_id = chat_id
+        else:
+            self.prediction_channel_id = chat_id
+        self._save_all_data()
+
+    def toggle_auto_prediction(self) -> bool:
+        self.auto_prediction_enabled = not self.auto_prediction_enabled
+        self._save_all_data()
+        return self.auto_prediction_enabled
@@ -0,0 +1,173 @@
+# cluster.py
+
+"""
+Mode multi-workers (gunicorn --workers N) : boîte de réception partagée + élection du leader.
+
+Chaque worker reçoit des webhooks, mais l'état du prédicteur n'a qu'un seul
+écrivain : tous les workers déposent les updates dans une boîte de réception
+SQLite (WAL) partagée et répondent 200 tout de suite. Un seul processus, le
+leader, détient un verrou fichier (flock) ; lui seul vide la boîte dans l'ordre
+d'arrivée et fait tourner le scheduler. Si le leader meurt, le système libère
+son verrou : un autre worker le prend, recharge l'état persisté et reprend les
+updates non acquittées.
+"""
+import os
+import json
+import time
+import fcntl
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INBOX_FILE = 'inbox.db'
+LEADER_LOCK_FILE = 'leader.lock'
+
+
+class LeaderLease:
+    """Verrou fichier exclusif et non bloquant : le détenteur est le leader"""
+
+    def __init__(self, path: str = LEADER_LOCK_FILE):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SharedInbox:
+    """File FIFO d'updates Telegram partagée entre processus (SQLite WAL)"""
+
+    def __init__(self, path: str = INBOX_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS inbox ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, received REAL NOT NULL)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, update: Dict[str, Any]):
+        with self._conn() as conn:
+            conn.execute('INSERT INTO inbox (payload, received) VALUES (?, ?)',
+                         (json.dumps(update, ensure_ascii=False), time.time()))
+
+    def peek(self, limit: int = 50) -> List[Tuple[int, Dict[str, Any]]]:
+        rows = self._conn().execute('SELECT id, payload FROM inbox ORDER BY id LIMIT ?', (limit,)).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, row_id: int):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM inbox WHERE id = ?', (row_id,))
+
+    def depth(self) -> int:
+        return self._conn().execute('SELECT COUNT(*) FROM inbox').fetchone()[0]
+
+
+class ClusterCoordinator:
+    """Élection périodique du leader ; le leader vide la boîte de réception"""
+
+    def __init__(self, inbox: SharedInbox, lease: LeaderLease, handler: Callable[[Dict[str, Any]], Any],
+                 on_promote: Optional[Callable[[], Any]] = None,
+                 poll_interval: float = 0.05, election_interval: float = 2.0):
+        self.inbox = inbox
+        self.lease = lease
+        self.handler = handler
+        self.on_promote = on_promote
+        self.poll_interval = poll_interval
+        self.election_interval = election_interval
+        self.processed = 0
+        self.errors = 0
+        self.promoted_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cluster-coordinator', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.lease.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.lease.is_leader:
+                if not self.lease.try_acquire():
+                    self._stop.wait(self.election_interval)
+                    continue
+                self.promoted_at = time.time()
+                logger.info(f"👑 Worker {os.getpid()} élu leader (scheduler + traitement des updates)")
+                if self.on_promote:
+                    try:
+                        self.on_promote()
+                    except Exception as e:
+                        logger.error(f"❌ Erreur lors de la prise de leadership: {e}")
+            if not self._drain():
+                self._stop.wait(self.poll_interval)
+
+    def _drain(self) -> bool:
+        """Traite les updates en attente ; False si la boîte était vide"""
+        try:
+            batch = self.inbox.peek()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Lecture de la boîte de réception impossible: {e}")
+            return False
+        for row_id, update in batch:
+            try:
+                self.handler(update)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Erreur traitement update {update.get('update_id')}: {e}")
+            # Acquittement après traitement : un crash du leader laisse l'update au suivant
+            self.inbox.ack(row_id)
+        return bool(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'is_leader': self.lease.is_leader,
+            'promoted_at': self.promoted_at,
+            'inbox_depth': self.inbox.depth(),
+            'processed': self.processed,
+            'errors': self.errors,
+        }
@@ -7,7 +7,6 @@ import os
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 # --- IDS DE CANAUX PAR DÉFAUT (Supprimés, les vrais IDs sont maintenant dans config.json) ---
 DEFAULT_TARGET_CHANNEL_ID = None 
@@ -18,6 +17,9 @@ CALLBACK_SOURCE = "config_source"
 CALLBACK_PREDICTION = "config_prediction"
 CALLBACK_CANCEL = "config_cancel"
 
+# --- RÈGLES INTER PAR DÉFAUT ---
+TOP_RULES_PER_SUIT = 8 # règles gardées par enseigne (le "Top 8")
+
 class Config:
     """Configuration class for bot settings"""
     
@@ -39,9 +41,62 @@ class Config:
         # Mode Debug
         self.DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
         
+        # Webhook asynchrone : réponse 200 immédiate, traitement par un worker dédié
+        self.ASYNC_WEBHOOK = os.getenv('ASYNC_WEBHOOK', 'False').lower() == 'true'
+        self.UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE') or 1000)
+        
+        # Mode multi-workers gunicorn : boîte de réception partagée + leader unique pour le scheduler
+        self.MULTI_WORKER = os.getenv('MULTI_WORKER', 'False').lower() == 'true'
+        self.INBOX_PATH = os.getenv('INBOX_PATH') or 'inbox.db'
+        self.LEADER_LOCK_PATH = os.getenv('LEADER_LOCK_PATH') or 'leader.lock'
+        
+        # Ki dynamique : ne pas éditer un message déjà visé par une édition de vérification en file
+        self.KI_SKIP_IF_VERIFYING = os.getenv('KI_SKIP_IF_VERIFYING', 'True').lower() == 'true'
+        
+        # Ingestion : 'webhook' (défaut) ou 'polling' (getUpdates par lots, voir poller.py)
+        self.INGEST_MODE = (os.getenv('INGEST_MODE') or 'webhook').lower()
+        self.POLL_LIMIT = min(100, int(os.getenv('POLL_LIMIT') or 100))
+        self.POLL_TIMEOUT = int(os.getenv('POLL_TIMEOUT') or 30)
+        
+        # /health : durée de validité (secondes) du dernier getMe, pour ne pas solliciter Telegram à chaque sonde
+        self.HEALTH_TELEGRAM_TTL = float(os.getenv('HEALTH_TELEGRAM_TTL') or 60)
+        
+        # Réglages du prédicteur (règles INTER, fenêtre, relations)
+        self._load_predictor_settings()
+        
         # Validation finale
         self._validate_config()
     
+    @classmethod
+    def predictor(cls) -> 'Config':
+        """Réglages du prédicteur seuls, sans token ni webhook (backtest, import, benchmarks)"""
+        config = cls.__new__(cls)
+        config._load_predictor_settings()
+        return config
+    
+    def _load_predictor_settings(self) -> None:
+        """Réglages lus par CardPredictor (modifiables ensuite par le backtest et le sweep)"""
+        # Fenêtre INTER : paires gardées (tampon circulaire) et âge max en minutes (0 = sans limite)
+        self.INTER_WINDOW_SIZE = int(os.getenv('INTER_WINDOW_SIZE') or 2000)
+        self.INTER_WINDOW_MAX_AGE = float(os.getenv('INTER_WINDOW_MAX_AGE') or 0)
+        
+        # Demi-vie (minutes) des compteurs déclencheur -> enseigne ; 0 = comptes entiers et reset global planifié
+        self.RULE_HALF_LIFE = float(os.getenv('RULE_HALF_LIFE') or 0)
+        
+        # Reclasser les règles INTER à chaque jeu collecté au lieu de l'analyse des 10 minutes
+        self.LIVE_RULES = os.getenv('LIVE_RULES', 'False').lower() == 'true'
+        
+        # Règles : déclencheur N-k -> jeu prédit N+k, règles par enseigne, occurrences minimales d'une règle
+        self.TRIGGER_OFFSET = int(os.getenv('TRIGGER_OFFSET') or 2)
+        self.TOP_RULES_PER_SUIT = int(os.getenv('TOP_RULES_PER_SUIT') or TOP_RULES_PER_SUIT)
+        self.MIN_RULE_COUNT = int(os.getenv('MIN_RULE_COUNT') or 1)
+        
+        # Index des relations : plus grand décalage compté, choix automatique de la meilleure relation
+        # et prédictions notées qu'une relation doit avoir avant d'être choisie
+        self.PATTERN_MAX_OFFSET = int(os.getenv('PATTERN_MAX_OFFSET') or 3)
+        self.AUTO_RELATION = os.getenv('AUTO_RELATION', 'False').lower() == 'true'
+        self.MIN_RELATION_TRIALS = int(os.getenv('MIN_RELATION_TRIALS') or 100)
+    
     def _get_bot_token(self) -> str:
         """Récupère et valide le token du bot depuis les variables d'environnement."""
         token = os.getenv('TELEGRAM_BOT_TOKEN') or os.getenv('BOT_TOKEN')
@@ -95,7 +150,10 @@ class Config:
             f"  PORT: {self.PORT},\n"
             f"  TARGET_CHANNEL_ID: {self.TARGET_CHANNEL_ID},\n"
             f"  PREDICTION_CHANNEL_ID: {self.PREDICTION_CHANNEL_ID},\n"
-            f"  DEBUG: {self.DEBUG}\n"
+            f"  DEBUG: {self.DEBUG},\n"
+            f"  ASYNC_WEBHOOK: {self.ASYNC_WEBHOOK},\n"
+            f"  MULTI_WORKER: {self.MULTI_WORKER},\n"
+            f"  INGEST_MODE: {self.INGEST_MODE}\n"
             f")"
 )
         
@@ -0,0 +1,154 @@
+# dedup.py
+
+"""
+Traitement idempotent des updates Telegram.
+
+Quand le webhook est lent, Telegram renvoie la même update (même update_id) et
+le canal source republie le même post sous forme d'edited_channel_post. Deux
+index bornés et expirant dans le temps évitent de refaire le travail :
+- update_id déjà vus : l'update est ignorée avant toute analyse ;
+- par (chat_id, message_id) : hash du texte (copie exacte ignorée avant analyse)
+  puis empreinte des champs de l'analyse lus par le prédicteur (numéro de jeu,
+  1re carte, cartes et enseignes du premier groupe, marqueurs ✅/🔰) : un edit
+  qui ne change rien d'utile s'arrête là, sans collecte, vérification ni sauvegarde.
+
+Les contrôles ne font que lire : une update ou un post n'est enregistré
+(mark_update, mark_post) qu'une fois traité, pour qu'un traitement en échec
+puisse être relivré et refait.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ExpiringIndex:
+    """Dictionnaire LRU borné en taille, dont les entrées expirent après ttl secondes"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, now: float) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if now - item[0] > self.ttl:
+            del self._items[key]
+            return None
+        return item[1]
+
+    def put(self, key: Hashable, value: Any, now: float):
+        self._items[key] = (now, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        # Purge des plus anciennes entrées expirées (en tête, ordre d'insertion)
+        while self._items:
+            oldest = next(iter(self._items.values()))
+            if now - oldest[0] <= self.ttl:
+                break
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def game_fingerprint(game) -> Tuple:
+    """Champs d'un ParsedGame lus par le prédicteur (tous sauf le texte brut)"""
+    return (game.game_number, game.first_card, game.first_group_cards, game.first_group_codes,
+            game.first_group_suits, game.has_completion, game.has_shield)
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class UpdateDeduplicator:
+    """Filtre les updates et posts déjà traités ; compte le travail évité"""
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        maxsize = maxsize or int(os.getenv('DEDUP_SIZE') or 10000)
+        ttl = ttl or float(os.getenv('DEDUP_TTL') or 3600)
+        self._updates = ExpiringIndex(maxsize, ttl)
+        self._posts = ExpiringIndex(maxsize, ttl)
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.duplicate_updates = 0
+        self.duplicate_posts = 0
+        self.unchanged_edits = 0
+
+    def is_duplicate_update(self, update_id: Optional[int]) -> bool:
+        """True si cet update_id a déjà été traité (livraison répétée par Telegram)"""
+        now = time.time()
+        with self._lock:
+            self.updates += 1
+            if update_id is None:
+                return False
+            if self._updates.get(update_id, now) is not None:
+                self.duplicate_updates += 1
+                return True
+            return False
+
+    def mark_update(self, update_id: Optional[int]):
+        """Enregistre une update traitée"""
+        if update_id is None:
+            return
+        with self._lock:
+            self._updates.put(update_id, True, time.time())
+
+    def is_duplicate_post(self, chat_id: Any, message_id: Any, text: str) -> bool:
+        """True si ce message a déjà été traité avec exactement le même texte"""
+        if message_id is None:
+            return False
+        digest = text_digest(text)
+        now = time.time()
+        with self._lock:
+            previous = self._posts.get((chat_id, message_id), now)
+            if previous is not None and previous[0] == digest:
+                self.duplicate_posts += 1
+                return True
+            return False
+
+    def is_unchanged_game(self, chat_id: Any, message_id: Any, game) -> bool:
+        """True si l'edit ne change aucun champ utile au prédicteur"""
+        if message_id is None:
+            return False
+        fingerprint = game_fingerprint(game)
+        now = time.time()
+        with self._lock:
+            previous = self._posts.get((chat_id, message_id), now)
+            if previous is not None and previous[1] == fingerprint:
+                self.unchanged_edits += 1
+                return True
+            return False
+
+    def mark_post(self, chat_id: Any, message_id: Any, game):
+        """Enregistre le texte et l'empreinte d'un post traité (game : son ParsedGame)"""
+        if message_id is None:
+            return
+        value = (text_digest(game.text), game_fingerprint(game))
+        with self._lock:
+            self._posts.put((chat_id, message_id), value, time.time())
+
+    def count_batch_duplicate(self, post: bool = False):
+        """Copie d'une update (ou d'un post) plus haut dans le lot en cours, pas encore marquée traitée"""
+        with self._lock:
+            if post:
+                self.duplicate_posts += 1
+            else:
+                self.duplicate_updates += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'updates': self.updates,
+            'duplicate_updates': self.duplicate_updates,
+            'duplicate_posts': self.duplicate_posts,
+            'unchanged_edits': self.unchanged_edits,
+            'skipped': self.duplicate_updates + self.duplicate_posts + self.unchanged_edits,
+            'tracked_updates': len(self._updates),
+            'tracked_posts': len(self._posts),
+        }
@@ -1,19 +1,31 @@
 # handlers.py
 
+import os
 import logging
 import time
 import json
+import html
+import threading
 from collections import defaultdict
-from typing import Dict, Any, Optional
-import requests
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime
+from concurrent.futures import Future
+
+from telegram_client import TelegramClient
+from outbound import OutboundDispatcher, EditSuperseded, PRIORITY_NORMAL, PRIORITY_VERIFY
+from dedup import UpdateDeduplicator, game_fingerprint
+from message_parser import order_by_game
+from predictor_actor import PredictorActor
+from storage import PersistError, write_archive
+from metrics import observe_stage, UPDATE_SECONDS
+from rule_stats import format_count
+from tracing import TRACER
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 # Importation Robuste
 try:
-    from card_predictor import CardPredictor
+    from card_predictor import CardPredictor, format_session_report, format_inter_status
 except ImportError:
     logger.error("❌ IMPOSSIBLE D'IMPORTER CARDPREDICTOR")
     CardPredictor = None
@@ -69,14 +81,46 @@ HELP_MESSAGE = """
 """
 
 class TelegramHandlers:
-    def __init__(self, bot_token: str):
+    def __init__(self, bot_token: str, client: Optional[TelegramClient] = None,
+                 dispatcher: Optional[OutboundDispatcher] = None):
         self.bot_token = bot_token
-        self.base_url = f"https://api.telegram.org/bot{bot_token}"
+        self.client = client or TelegramClient(bot_token)
+        # Envois/éditions de messages : limités en débit et rejoués sur 429
+        self.dispatcher = dispatcher or OutboundDispatcher(self.client)
+        self.base_url = self.client.base_url
+        # Updates rejouées par Telegram et edits sans effet : ignorés avant tout traitement
+        self.dedup = UpdateDeduplicator()
         
         if CardPredictor:
-            self.card_predictor = CardPredictor(telegram_message_sender=self.send_message)
+            # Multi-workers : état relu en lecture seule ; seul le leader écrit (voir main.on_leader_promoted)
+            multi_worker = os.getenv('MULTI_WORKER', 'false').lower() == 'true'
+            self.card_predictor = CardPredictor(telegram_message_sender=self.send_message, read_only=multi_worker)
+            # Toutes les mutations du prédicteur passent par cet écrivain unique
+            self.actor = PredictorActor(self.card_predictor)
+            # ARCHIVE_ON_RESET : l'état remplacé par un reset est archivé (gzip) pour le backtest
+            if os.getenv('ARCHIVE_ON_RESET', 'false').lower() == 'true':
+                self.card_predictor.on_reset = self._archive_reset_state
         else:
             self.card_predictor = None
+            self.actor = None
+
+    def state(self):
+        """Dernier instantané immuable du prédicteur (lecture sans blocage)"""
+        return self.actor.snapshot()
+
+    def reset_predictor(self, reason: str = 'reset', activate_inter: bool = False):
+        """Reset du prédicteur vivant, exécuté sur l'écrivain unique"""
+        return self.actor.call(self.card_predictor.reset_state, reason, activate_inter)
+
+    def _archive_reset_state(self, state: Dict[str, Any], reason: str):
+        """Écrit l'archive hors de l'écrivain unique (le reset ne touche que la mémoire)"""
+        def _write():
+            try:
+                path = write_archive(state, reason)
+                logger.info(f"🗄️ État archivé avant reset : {path}")
+            except Exception as e:
+                logger.error(f"❌ Archivage avant reset impossible: {e}")
+        threading.Thread(target=_write, name='reset-archive', daemon=True).start()
 
     def _check_rate_limit(self, user_id):
         now = time.time()
@@ -84,7 +128,8 @@ class TelegramHandlers:
         user_message_counts[user_id].append(now)
         return len(user_message_counts[user_id]) <= 30
 
-    def send_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False, reply_markup: Optional[Dict] = None) -> Optional[int]:
+    def send_message_async(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False, reply_markup: Optional[Dict] = None, priority: int = PRIORITY_NORMAL, guard: Optional[Callable[[], bool]] = None) -> Optional[Future]:
+        """Met l'envoi/édition en file sans attendre ; le Future reçoit la réponse Telegram (guard : voir OutboundDispatcher.submit)"""
         if not chat_id or not text: return None
         
         method = 'editMessageText' if (message_id or edit) else 'sendMessage'
@@ -94,12 +139,23 @@ class TelegramHandlers:
         if reply_markup: 
             payload['reply_markup'] = json.dumps(reply_markup) if isinstance(reply_markup, dict) else reply_markup
 
+        return self.dispatcher.submit(method, payload, priority=priority, guard=guard)
+
+    def is_pending(self, game_num: str) -> bool:
+        """Prédiction toujours en attente dans le dernier instantané (garde des rafraîchissements du ki)"""
+        return game_num in self.state().pending_keys
+
+    def send_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False, reply_markup: Optional[Dict] = None, priority: int = PRIORITY_NORMAL) -> Optional[int]:
         try:
-            r = requests.post(f"{self.base_url}/{method}", json=payload, timeout=10)
+            future = self.send_message_async(chat_id, text, parse_mode, message_id, edit, reply_markup, priority)
+            if future is None: return None
+            r = future.result(timeout=120)
             if r.status_code == 200:
                 return r.json().get('result', {}).get('message_id')
             else:
                 logger.error(f"Erreur Telegram {r.status_code}: {r.text}")
+        except EditSuperseded as e:
+            logger.info(f"✏️ {e}")
         except Exception as e:
             logger.error(f"Exception envoi message: {e}")
         return None
@@ -112,13 +168,12 @@ class TelegramHandlers:
             # Nettoyage des anciens fichiers zip avant création
             os.system("rm -f *.zip")
             # Création du nouveau zip en incluant uniquement les fichiers nécessaires au déploiement
-            os.system(f"zip -r {zip_filename} bot.py card_predictor.py config.py handlers.py main.py requirements.txt render.yaml replit.md config_ids.json inter_mode_status.json smart_rules.json predictions.json inter_data.json sequential_history.json")
+            os.system(f"zip -r {zip_filename} bot.py card_predictor.py config.py handlers.py main.py requirements.txt render.yaml replit.md config_ids.json inter_mode_status.json smart_rules.json predictions.json inter_data.json sequential_history.json state_snapshot.bin state_snapshot.json state_journal.jsonl state.db")
             
             if not os.path.exists(zip_filename):
                 self.send_message(chat_id, f"❌ Erreur lors de la création de {zip_filename}")
                 return
                 
-            url = f"{self.base_url}/sendDocument"
             with open(zip_filename, 'rb') as f:
                 files = {'document': (zip_filename, f, 'application/zip')}
                 data = {
@@ -126,7 +181,7 @@ class TelegramHandlers:
                     'caption': f'📦 **{zip_filename} - Version Corrigée Finale**\n\n✅ Correction Erreur 400 (Parsing HTML supprimé)\n✅ Ki dynamique invisible amélioré\n✅ Tous les fichiers de données inclus\n✅ Prêt pour Render.com',
                     'parse_mode': 'Markdown'
                 }
-                response = requests.post(url, data=data, files=files, timeout=60)
+                response = self.client.post('sendDocument', data=data, files=files, timeout=60)
             
             if response.json().get('ok'):
                 self.send_message(chat_id, f"✅ **{zip_filename} envoyé avec succès!**")
@@ -140,27 +195,19 @@ class TelegramHandlers:
         if not self.card_predictor: 
             self.send_message(chat_id, "❌ Le moteur de prédiction n'est pas chargé.")
             return
-        is_active = self.card_predictor.is_inter_mode_active
-        total_collected = len(self.card_predictor.inter_data)
+        snap = self.state()
+        is_active = snap.is_inter_mode_active
+        total_collected = snap.inter_count
         message = "🧠 **ETAT DU MODE INTELLIGENT**\n\n"
         message += f"Actif : {'✅ OUI' if is_active else '❌ NON'}\n"
         message += f"Données collectées : {total_collected}\n\n"
-        if self.card_predictor.inter_data:
-            from collections import defaultdict
-            by_result_suit = defaultdict(list)
-            for entry in self.card_predictor.inter_data:
-                result_suit = entry.get('result_suit', '?')
-                trigger = entry.get('declencheur', '?').replace("♥️", "❤️")
-                by_result_suit[result_suit].append(trigger)
+        if total_collected:
             message += "📊 **TOUS LES DÉCLENCHEURS COLLECTÉS:**\n\n"
             for suit in ['♠️', '❤️', '♦️', '♣️']:
-                if suit in by_result_suit:
-                    triggers = by_result_suit[suit]
+                if suit in snap.collected_by_suit:
                     message += f"**Pour enseigne {suit}:**\n"
-                    from collections import Counter
-                    trigger_counts = Counter(triggers)
-                    for trigger, count in trigger_counts.most_common():
-                        message += f"  • {trigger} ({count}x)\n"
+                    for trigger, count in snap.collected_by_suit[suit]:
+                        message += f"  • {trigger.replace('♥️', '❤️')} ({format_count(count)}x)\n"
                     message += "\n"
         else:
             message += "⚠️ **Aucune donnée collectée.**\n"
@@ -188,7 +235,7 @@ class TelegramHandlers:
             self.send_message(chat_id, "❌ Le moteur de prédiction n'est pas chargé.")
             return
         try:
-            msg = self.card_predictor.get_session_report_preview()
+            msg = format_session_report(self.state(), self.card_predictor.report_stats())
             keyboard = {'inline_keyboard': [
                 [{'text': '✅ Envoyer au canal', 'callback_data': 'send_bilan_confirm'},
                  {'text': '❌ Annuler', 'callback_data': 'config_cancel'}]
@@ -203,14 +250,7 @@ class TelegramHandlers:
             self.send_message(chat_id, "❌ Le moteur de prédiction n'est pas chargé.")
             return
         try:
-            cp = self.card_predictor
-            cp.predictions = {}
-            cp.inter_data = []
-            cp.smart_rules = []
-            cp.collected_games = set()
-            cp.sequential_history = {}
-            cp.deleted_tops = []
-            cp._save_all_data()
+            self.reset_predictor('manual')
             self.send_message(chat_id, "✅ RÉINITIALISATION COMPLÈTE EFFECTUÉE")
         except Exception as e:
             logger.error(f"Erreur /reset : {e}")
@@ -221,14 +261,13 @@ class TelegramHandlers:
             self.send_message(chat_id, "❌ Le moteur de prédiction n'est pas chargé.")
             return
         try:
-            cp = self.card_predictor
+            snap = self.state()
             message = "🔒 **ÉTAT ET INFORMATIQUE SECRET DU BOT**\n\n"
             
             # Afficher les dernières prédictions avec leurs déclencheurs
-            if cp.predictions:
+            if snap.recent_predictions:
                 message += "📊 **Les 5 dernières prédictions envoyées**\n"
-                sorted_preds = sorted(cp.predictions.items(), key=lambda x: x[1].get('timestamp', 0), reverse=True)
-                for game_num, data in sorted_preds[:5]:
+                for game_num, data in snap.recent_predictions:
                     trigger = data.get('predicted_from_trigger', '?')
                     suit = data.get('predicted_costume', '?')
                     status = data.get('status', 'pending')
@@ -238,13 +277,13 @@ class TelegramHandlers:
             else:
                 message += "ℹ️ Aucune prédiction récente.\n"
             
-            message += f"\n\n🧠 Mode INTER: {'✅ ACTIF' if cp.is_inter_mode_active else '❌ INACTIF'}\n"
-            message += f"\n📈 Donnees collectees: {len(cp.inter_data)} jeux\n"
+            message += f"\n\n🧠 Mode INTER: {'✅ ACTIF' if snap.is_inter_mode_active else '❌ INACTIF'}\n"
+            message += f"\n📈 Donnees collectees: {snap.inter_count} jeux\n"
             message += "📋 Regles UTILISER INTELLIGENT :\n\n"
             
             # Afficher les règles intelligentes regroupées par enseigne
             rules_by_suit = defaultdict(list)
-            for rule in cp.smart_rules:
+            for rule in snap.smart_rules:
                 rules_by_suit[rule['predict']].append(rule)
                 
             for suit in ['♠️', '♦️', '♣️', '❤️']: # Ordre demandé
@@ -253,7 +292,7 @@ class TelegramHandlers:
                 if rules:
                     message += f"**Pour predire {suit}:**\n"
                     for r in rules[:4]: # Changé à 4
-                        message += f"  • {r['trigger']} ({r['count']}x)\n"
+                        message += f"  • {r['trigger']} ({format_count(r['count'])}x)\n"
                     message += "\n"
                 
             self.send_message(chat_id, message)
@@ -268,15 +307,14 @@ class TelegramHandlers:
         parts = text.lower().split()
         action = parts[1] if len(parts) > 1 else 'status'
         if action == 'activate':
-            self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+            self.actor.call(self.card_predictor.analyze_and_set_smart_rules, chat_id=chat_id, force_activate=True)
             self.send_message(chat_id, "✅ **MODE INTER ACTIVÉ**")
         elif action == 'default':
-            self.card_predictor.is_inter_mode_active = False
-            self.card_predictor._save_all_data()
+            self.actor.call(self.card_predictor.set_inter_mode, False)
             self.send_message(chat_id, "❌ **MODE INTER DÉSACTIVÉ**")
         elif action == 'status':
             try:
-                msg, kb = self.card_predictor.get_inter_status()
+                msg, kb = format_inter_status(self.state())
                 self.send_message(chat_id, msg, reply_markup=kb)
             except Exception as e:
                 logger.error(f"Error in /inter status: {e}")
@@ -284,143 +322,302 @@ class TelegramHandlers:
         else:
             self.send_message(chat_id, HELP_MESSAGE)
 
+    def _require_admin(self, chat_id: int) -> bool:
+        """Commandes de diagnostic (/trace, /profile) : réservées à ADMIN_ID, refusées à tous sans lui"""
+        admin_id = os.getenv('ADMIN_ID')
+        if not admin_id:
+            self.send_message(chat_id, "🔒 Commande réservée à l'admin : ADMIN_ID non configuré.")
+            return False
+        return str(chat_id) == admin_id
+
+    def _handle_command_trace(self, chat_id: int, text: str):
+        if not self._require_admin(chat_id): return
+        if not TRACER.sample_rate:
+            self.send_message(chat_id, "ℹ️ Traçage désactivé (TRACE_SAMPLE_RATE=0).")
+            return
+        parts = text.split()
+        limit = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 5
+        slowest = TRACER.slowest(min(limit, 20))
+        lines = [f"{len(TRACER.traces)} traces en mémoire (1 update sur {TRACER.sample_rate}), {len(slowest)} plus lentes :"]
+        lines += [t.summary() for t in slowest]
+        self.send_message(chat_id, f"<pre>{html.escape(chr(10).join(lines))[:3900]}</pre>", parse_mode='HTML')
+
+    def _handle_command_profile(self, chat_id: int, text: str):
+        if not self._require_admin(chat_id): return
+        parts = text.split()
+        mode = {'cpu': 'cpu', 'mem': 'memory', 'memory': 'memory'}.get(parts[1].lower() if len(parts) > 1 else 'cpu')
+        seconds = float(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 30
+        if not mode:
+            self.send_message(chat_id, "❌ Usage: `/profile [cpu|mem] [secondes]`")
+            return
+        # Rapport envoyé à la fin de la fenêtre, depuis le thread du minuteur
+        capture = TRACER.start_capture(mode, seconds, on_done=lambda report: self.send_message(
+            chat_id, f"<pre>{html.escape(report)[:3900]}</pre>", parse_mode='HTML'))
+        if capture is None:
+            self.send_message(chat_id, "⏳ Une capture est déjà en cours.")
+        else:
+            self.send_message(chat_id, f"🔬 Capture {capture.mode} pendant {capture.seconds:g} s...")
+
     def send_reaction(self, chat_id: int, message_id: int, emoji: str) -> bool:
         """Ajoute une réaction à un message"""
         try:
-            url = f"{self.base_url}/setMessageReaction"
             payload = {
                 'chat_id': chat_id,
                 'message_id': message_id,
                 'reaction': [{'type': 'emoji', 'emoji': emoji}],
                 'is_big': True
             }
-            r = requests.post(url, json=payload, timeout=5)
+            r = self.client.post('setMessageReaction', json=payload, timeout=5)
             return r.status_code == 200
         except Exception as e:
             logger.error(f"Erreur envoi réaction: {e}")
             return False
 
     def handle_update(self, update: Dict[str, Any]):
+        started = time.perf_counter()
+        # 1 update sur TRACE_SAMPLE_RATE tracé ; sous cProfile pendant une capture /profile
+        trace = TRACER.begin('update', update_id=update.get('update_id'))
+        try:
+            TRACER.call(self._handle_update, update)
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started)
+            TRACER.end(trace)
+
+    def _handle_update(self, update: Dict[str, Any]):
         try:
             if not self.card_predictor: return
-            
-            # Extraction du message
-            msg = update.get('message') or update.get('channel_post') or update.get('edited_message') or update.get('edited_channel_post')
-            
-            if not msg:
-                if 'callback_query' in update: 
-                    self._handle_callback_query(update['callback_query'])
-                return
-            
-            chat_id = msg.get('chat', {}).get('id')
-            text = msg.get('text') or msg.get('caption', '')
-            
-            if not chat_id: return
-
-            # Gestion des commandes
-            if text and text.startswith('/'):
-                if text.startswith('/start'): self.send_message(chat_id, WELCOME_MESSAGE)
-                elif text.startswith('/inter'): self._handle_command_inter(chat_id, text)
-                elif text.startswith('/ef'):
-                    parts = text.split()
-                    if len(parts) > 1 and parts[1].isdigit():
-                        interval = int(parts[1])
-                        self.card_predictor.ef_interval = interval
-                        self.card_predictor.last_ef_time = time.time()
-                        self.card_predictor._save_all_data()
-                        self.send_message(chat_id, f"✅ Commande `/ef` configurée : Tout sera effacé toutes les {interval} minutes.")
-                    else:
-                        self.send_message(chat_id, "❌ Usage: `/ef [minutes]` (ex: `/ef 30`)")
-                elif text.startswith('/config'):
-                    kb = {'inline_keyboard': [[{'text': 'Source', 'callback_data': 'config_source'}, {'text': 'Prediction', 'callback_data': 'config_prediction'}, {'text': 'Annuler', 'callback_data': 'config_cancel'}]]}
-                    self.send_message(chat_id, "⚙️ **CONFIGURATION**", reply_markup=kb)
-                elif text.startswith('/stat'):
-                    sid = self.card_predictor.target_channel_id or "Non défini"
-                    pid = self.card_predictor.prediction_channel_id or "Non défini"
-                    mode = "IA" if self.card_predictor.is_inter_mode_active else "Statique"
-                    self.send_message(chat_id, f"📊 **STATUS**\nSource: `{sid}`\nPrédiction: `{pid}`\nMode: {mode}")
-                elif text.startswith('/deploy'): self._handle_command_deploy(chat_id)
-                elif text.startswith('/collect'): self._handle_command_collect(chat_id)
-                elif text.startswith('/qua'): self._handle_command_qua(chat_id)
-                elif text.startswith('/reset'): self._handle_command_reset(chat_id)
-                elif text.startswith('/bilan'): self._handle_command_bilan(chat_id)
-                elif text.startswith('/auto'):
-                    current = self.card_predictor.auto_prediction_enabled
-                    keyboard = {'inline_keyboard': [[{'text': 'Désactiver' if current else 'Activer', 'callback_data': 'toggle_auto_pred'}]]}
-                    self.send_message(chat_id, f"🤖 **Auto: {'ON' if current else 'OFF'}**", reply_markup=keyboard)
-                return
+            update_id = update.get('update_id')
+            if self.dedup.is_duplicate_update(update_id): return
+            self._dispatch_update(update)
+            # Marquée traitée seulement après coup : une update en échec pourra être relivrée
+            self.dedup.mark_update(update_id)
+        except Exception as e:
+            logger.error(f"Update error: {e}")
 
-            if not text: return
+    def _dispatch_update(self, update: Dict[str, Any]):
+        # Extraction du message
+        msg = update.get('message') or update.get('channel_post') or update.get('edited_message') or update.get('edited_channel_post')
+        
+        if not msg:
+            if 'callback_query' in update: 
+                self._handle_callback_query(update['callback_query'])
+            return
+        
+        chat_id = msg.get('chat', {}).get('id')
+        text = msg.get('text') or msg.get('caption', '')
+        
+        if not chat_id: return
+
+        # Gestion des commandes
+        if text and text.startswith('/'):
+            if text.startswith('/start'): self.send_message(chat_id, WELCOME_MESSAGE)
+            elif text.startswith('/inter'): self._handle_command_inter(chat_id, text)
+            elif text.startswith('/ef'):
+                parts = text.split()
+                if len(parts) > 1 and parts[1].isdigit():
+                    interval = int(parts[1])
+                    self.actor.call(self.card_predictor.set_ef_interval, interval)
+                    self.send_message(chat_id, f"✅ Commande `/ef` configurée : Tout sera effacé toutes les {interval} minutes.")
+                else:
+                    self.send_message(chat_id, "❌ Usage: `/ef [minutes]` (ex: `/ef 30`)")
+            elif text.startswith('/config'):
+                kb = {'inline_keyboard': [[{'text': 'Source', 'callback_data': 'config_source'}, {'text': 'Prediction', 'callback_data': 'config_prediction'}, {'text': 'Annuler', 'callback_data': 'config_cancel'}]]}
+                self.send_message(chat_id, "⚙️ **CONFIGURATION**", reply_markup=kb)
+            elif text.startswith('/stat'):
+                snap = self.state()
+                sid = snap.target_channel_id or "Non défini"
+                pid = snap.prediction_channel_id or "Non défini"
+                mode = "IA" if snap.is_inter_mode_active else "Statique"
+                self.send_message(chat_id, f"📊 **STATUS**\nSource: `{sid}`\nPrédiction: `{pid}`\nMode: {mode}")
+            elif text.startswith('/deploy'): self._handle_command_deploy(chat_id)
+            elif text.startswith('/collect'): self._handle_command_collect(chat_id)
+            elif text.startswith('/qua'): self._handle_command_qua(chat_id)
+            elif text.startswith('/reset'): self._handle_command_reset(chat_id)
+            elif text.startswith('/bilan'): self._handle_command_bilan(chat_id)
+            elif text.startswith('/trace'): self._handle_command_trace(chat_id, text)
+            elif text.startswith('/profile'): self._handle_command_profile(chat_id, text)
+            elif text.startswith('/auto'):
+                current = self.state().auto_prediction_enabled
+                keyboard = {'inline_keyboard': [[{'text': 'Désactiver' if current else 'Activer', 'callback_data': 'toggle_auto_pred'}]]}
+                self.send_message(chat_id, f"🤖 **Auto: {'ON' if current else 'OFF'}**", reply_markup=keyboard)
+            return
 
-            is_edit = 'edited_message' in update or 'edited_channel_post' in update
-            
-            # Traitement Canal Source
-            source_id = str(self.card_predictor.target_channel_id)
-            current_chat_id = str(chat_id)
+        if not text: return
 
-            if current_chat_id == source_id:
-                # Vérifier le reset /ef
-                self.card_predictor.check_ef_reset()
-                
-                game_num = self.card_predictor.extract_game_number(text)
-                if game_num:
-                    # COLLECTE DES DONNÉES (appel systématique)
-                    self.card_predictor.collect_inter_data(game_num, text)
+        is_edit = 'edited_message' in update or 'edited_channel_post' in update
+        
+        # Traitement Canal Source
+        snap = self.state()
+        source_id = str(snap.target_channel_id)
+        current_chat_id = str(chat_id)
+
+        if current_chat_id == source_id:
+            game = self._parse_source_post(chat_id, msg.get('message_id'), text)
+            if game is None: return
+            # Reset /ef, collecte, vérification et décision sur l'écrivain unique
+            # (nouvelle prédiction seulement si ce n'est pas un edit)
+            res, decision = self.actor.call(self.card_predictor.ingest, game, not is_edit)
+            self.dedup.mark_post(chat_id, msg.get('message_id'), game)
+            
+            # Vérification des prédictions
+            if res and res.get('type') == 'edit_message':
+                msg_id = res['message_id_to_edit']
+                new_text = res['new_message']
+                # On utilise HTML pour permettre l'entité invisible qui cache le ki
+                sent = time.perf_counter()
+                self.send_message(snap.prediction_channel_id, new_text, message_id=msg_id, edit=True, parse_mode='HTML', priority=PRIORITY_VERIFY)
+                TRACER.span('send:verify', sent, time.perf_counter() - sent)
                 
-                # Vérification des prédictions
-                if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
-                    res = self.card_predictor._verify_prediction_common(text)
-                    if res and res.get('type') == 'edit_message':
-                        msg_id = res['message_id_to_edit']
-                        new_text = res['new_message']
-                        # On utilise HTML pour permettre l'entité invisible qui cache le ki
-                        self.send_message(self.card_predictor.prediction_channel_id, new_text, message_id=msg_id, edit=True, parse_mode='HTML')
-                        
-                        # Gestion des réactions (DESACTIVÉ)
-                        """
-                        offset = res.get('offset')
-                        ki_final = res.get('ki_final', 0)
-                        
-                        if offset is not None:
-                            if offset == 0:
-                                emoji = '🔥'
-                            elif offset == 1:
-                                emoji = '❤️'
-                            elif offset == 2:
-                                emoji = '👍'
-                            else:
-                                emoji = None
-
-                            if emoji:
-                                try:
-                                    # Le résultat numérique du ki est inclus dans la réaction (affichage simulé par Telegram)
-                                    self.send_reaction(self.card_predictor.prediction_channel_id, msg_id, emoji)
-                                    logger.info(f"✨ Réaction {emoji} envoyée (ki final: {ki_final})")
-                                except Exception as re_err:
-                                    logger.error(f"Erreur envoi réaction: {re_err}")
-                        """
+                # Gestion des réactions (DESACTIVÉ)
+                """
+                offset = res.get('offset')
+                ki_final = res.get('ki_final', 0)
                 
-                # Nouvelle prédiction si c'est pas un edit
-                if not is_edit:
-                    ok, num, val, is_inter = self.card_predictor.should_predict(text)
-                    if ok and num and val:
-                        now = datetime.now()
-                        ki = now.minute # ki initial
-                        txt = self.card_predictor.prepare_prediction_text(num, val, ki=ki)
-                        mid = self.send_message(chat_id=self.card_predictor.prediction_channel_id, text=txt, parse_mode='HTML')
-                        if mid:
-                            trigger = self.card_predictor._last_trigger_used or '?'
-                            self.card_predictor.predictions[str(num)] = {
-                                'game_num': num,
-                                'predicted_costume': val, 'predicted_from_trigger': trigger,
-                                'message_id': mid, 'timestamp': time.time(), 'status': 'pending', 'is_inter': is_inter,
-                                'ki_base': ki
-                            }
-                            self.card_predictor.last_predicted_game_number = num
-                            self.card_predictor.last_prediction_time = time.time()
-                            self.card_predictor._save_all_data()
-        except Exception as e:
-            logger.error(f"Update error: {e}")
+                if offset is not None:
+                    if offset == 0:
+                        emoji = '🔥'
+                    elif offset == 1:
+                        emoji = '❤️'
+                    elif offset == 2:
+                        emoji = '👍'
+                    else:
+                        emoji = None
+
+                    if emoji:
+                        try:
+                            # Le résultat numérique du ki est inclus dans la réaction (affichage simulé par Telegram)
+                            self.send_reaction(snap.prediction_channel_id, msg_id, emoji)
+                            logger.info(f"✨ Réaction {emoji} envoyée (ki final: {ki_final})")
+                        except Exception as re_err:
+                            logger.error(f"Erreur envoi réaction: {re_err}")
+                """
+            
+            # Nouvelle prédiction
+            if decision:
+                self._send_prediction(decision, snap.prediction_channel_id)
+
+    def _parse_source_post(self, chat_id: int, message_id: Optional[int], text: str):
+        """ParsedGame d'un post du canal source, ou None si le post (ou l'edit) n'apporte rien de nouveau"""
+        # Copie exacte d'un post déjà traité : rien à faire
+        if self.dedup.is_duplicate_post(chat_id, message_id, text): return None
+        # Analyse unique du post, partagée par toutes les étapes
+        parse_started = time.perf_counter()
+        game = self.card_predictor.parse(text, chat_id, message_id)
+        observe_stage('parse', parse_started)
+        trace = TRACER.current()
+        if trace:
+            trace.attrs['game'] = game.game_number
+        # Edit qui ne touche aucun champ lu par le prédicteur : rien à refaire
+        if self.dedup.is_unchanged_game(chat_id, message_id, game):
+            self.dedup.mark_post(chat_id, message_id, game)
+            return None
+        return game
+
+    def _send_prediction(self, decision, channel_id):
+        num, val, is_inter, trigger = decision
+        mid = None
+        ki = datetime.now().minute # ki initial
+        try:
+            txt = self.card_predictor.prepare_prediction_text(num, val, ki=ki)
+            sent = time.perf_counter()
+            mid = self.send_message(chat_id=channel_id, text=txt, parse_mode='HTML')
+            TRACER.span('send:prediction', sent, time.perf_counter() - sent)
+        finally:
+            # Toujours libérer la réservation, même si l'envoi a échoué
+            self.actor.call(self.card_predictor.record_prediction, num, val, is_inter, trigger, mid, ki)
+
+    def handle_batch(self, updates: List[Dict[str, Any]]):
+        """
+        Lot d'updates (mode polling) : les posts du canal source passent par l'écrivain en une
+        seule commande, dans l'ordre des jeux, avec une seule sauvegarde ; les envois partent
+        ensuite. Seul le dernier post nouveau du lot peut déclencher une prédiction : les jeux
+        antérieurs du lot sont déjà dépassés. Les autres updates suivent le chemin habituel.
+        Un jeu en échec n'arrête pas le lot ; une sauvegarde en échec (PersistError) est levée
+        après les envois, sans rien marquer traité : le poller n'avance pas l'offset.
+        """
+        if not self.card_predictor:
+            return
+        started = time.perf_counter()
+        snap = self.state()
+        source_id = str(snap.target_channel_id)
+        games, others = [], []
+        # Updates et posts du lot : marqués traités seulement après l'ingestion, d'où ce suivi local
+        batch_ids, batch_posts = set(), {}
+        for update in updates:
+            msg = update.get('channel_post') or update.get('edited_channel_post') or \
+                update.get('message') or update.get('edited_message')
+            text = (msg.get('text') or msg.get('caption', '')) if msg else ''
+            chat_id = msg.get('chat', {}).get('id') if msg else None
+            if not text or text.startswith('/') or str(chat_id) != source_id:
+                others.append(update)
+                continue
+            update_id = update.get('update_id')
+            if self.dedup.is_duplicate_update(update_id): continue
+            if update_id is not None and update_id in batch_ids:
+                self.dedup.count_batch_duplicate()
+                continue
+            batch_ids.add(update_id)
+            message_id = msg.get('message_id')
+            try:
+                game = self._parse_source_post(chat_id, message_id, text)
+            except Exception as e:
+                logger.error(f"Update error: {e}")
+                continue
+            if game is None:
+                # Copie ou edit sans effet : déjà traité
+                self.dedup.mark_update(update_id)
+                continue
+            if message_id is not None:
+                earlier = batch_posts.get(message_id)
+                if earlier is not None and game_fingerprint(earlier) == game_fingerprint(game):
+                    self.dedup.count_batch_duplicate(post=True)
+                    continue
+                batch_posts[message_id] = game
+            is_edit = 'edited_message' in update or 'edited_channel_post' in update
+            games.append((game, (is_edit, update_id, chat_id, message_id)))
+
+        persist_error = None
+        if games:
+            ordered = order_by_game(games)
+            last_new = max((i for i, (_, data) in enumerate(ordered) if not data[0]), default=None)
+            batch = [(game, i == last_new) for i, (game, _) in enumerate(ordered)]
+            try:
+                results = self.actor.call(self.card_predictor.ingest_batch, batch)
+            except PersistError as e:
+                logger.error(f"❌ Lot non sauvegardé, il sera relivré: {e}")
+                persist_error, results = e, e.results
+            if persist_error is None:
+                # Jeux ingérés et sauvegardés : updates et posts marqués traités (pas les jeux en échec)
+                for (game, (_, update_id, chat_id, message_id)), result in zip(ordered, results):
+                    if result is not None:
+                        self.dedup.mark_post(chat_id, message_id, game)
+                        self.dedup.mark_update(update_id)
+            done = [result for result in results if result is not None]
+            # Éditions de vérification en parallèle (file sortante), puis la prédiction éventuelle
+            futures = [
+                self.send_message_async(snap.prediction_channel_id, res['new_message'], message_id=res['message_id_to_edit'],
+                                        edit=True, parse_mode='HTML', priority=PRIORITY_VERIFY)
+                for res, _ in done if res and res.get('type') == 'edit_message'
+            ]
+            decision = next((d for _, d in done if d), None)
+            if decision:
+                self._send_prediction(decision, snap.prediction_channel_id)
+            for future in futures:
+                if future is None: continue
+                try:
+                    r = future.result(timeout=120)
+                    if r.status_code != 200:
+                        logger.error(f"Erreur Telegram {r.status_code}: {r.text}")
+                except EditSuperseded as e:
+                    logger.info(f"✏️ {e}")
+                except Exception as e:
+                    logger.error(f"Exception envoi message: {e}")
+        observe_stage('batch', started)
+
+        for update in others:
+            self.handle_update(update)
+        if persist_error is not None:
+            raise persist_error
 
     def _handle_callback_query(self, query: Dict[str, Any]):
         try:
@@ -430,30 +627,28 @@ class TelegramHandlers:
             callback_id = query['id']
             
             # Répondre au callback pour enlever le sablier sur Telegram
-            requests.post(f"{self.base_url}/answerCallbackQuery", json={'callback_query_id': callback_id})
+            self.client.post('answerCallbackQuery', json={'callback_query_id': callback_id})
             
-            if data == 'toggle_auto_pred' and self.card_predictor:
-                self.card_predictor.auto_prediction_enabled = not self.card_predictor.auto_prediction_enabled
-                self.card_predictor._save_all_data()
-                self.send_message(chat_id, f"✅ Prédictions auto: {'Activées' if self.card_predictor.auto_prediction_enabled else 'Désactivées'}")
-            elif data == 'inter_apply' and self.card_predictor:
-                self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+            cp = self.card_predictor
+            if data == 'toggle_auto_pred' and cp:
+                enabled = self.actor.call(cp.toggle_auto_prediction)
+                self.send_message(chat_id, f"✅ Prédictions auto: {'Activées' if enabled else 'Désactivées'}")
+            elif data == 'inter_apply' and cp:
+                self.actor.call(cp.analyze_and_set_smart_rules, chat_id=chat_id, force_activate=True)
                 self.send_message(chat_id, "✅ Analyse terminée et Mode INTER activé !")
-            elif data == 'inter_default' and self.card_predictor:
-                self.card_predictor.is_inter_mode_active = False
-                self.card_predictor._save_all_data()
+            elif data == 'inter_default' and cp:
+                self.actor.call(cp.set_inter_mode, False)
                 self.send_message(chat_id, "✅ Mode INTER désactivé")
-            elif data == 'config_source' and self.card_predictor:
-                self.card_predictor.target_channel_id = chat_id
-                self.card_predictor._save_all_data()
+            elif data == 'config_source' and cp:
+                self.actor.call(cp.set_channel, 'source', chat_id)
                 self.send_message(chat_id, f"✅ Canal SOURCE configuré: `{chat_id}`")
-            elif data == 'config_prediction' and self.card_predictor:
-                self.card_predictor.prediction_channel_id = chat_id
-                self.card_predictor._save_all_data()
+            elif data == 'config_prediction' and cp:
+                self.actor.call(cp.set_channel, 'prediction', chat_id)
                 self.send_message(chat_id, f"✅ Canal PRÉDICTION configuré: `{chat_id}`")
-            elif data == 'send_bilan_confirm' and self.card_predictor:
-                report = self.card_predictor.get_session_report_preview()
-                pred_channel = self.card_predictor.prediction_channel_id
+            elif data == 'send_bilan_confirm' and cp:
+                snap = self.state()
+                report = format_session_report(snap, cp.report_stats())
+                pred_channel = snap.prediction_channel_id
                 if pred_channel:
                     self.send_message(pred_channel, report)
                     self.send_message(chat_id, "✅ Bilan envoyé au canal de prédiction.")
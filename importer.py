@@ -0,0 +1,173 @@
+# importer.py
+
+"""
+Import en masse d'un historique du canal source dans l'état persisté du bot.
+
+Après un reset, le mode INTER repart de zéro : inter_data ne se remplit qu'au
+fil de collect_inter_data. Cet outil relit un export (JSON de Telegram Desktop
+ou JSONL de posts / updates, voir backtest.read_records) en flux, le collecte
+avec les mêmes règles que le live (analyse unique des posts, paires N-2 -> N,
+corrections d'un jeu édité, changement de cycle 1440 -> 1), puis charge la
+fenêtre INTER, l'historique séquentiel et les règles recalculées dans le
+stockage en une seule sauvegarde (une ligne de journal ou une transaction SQLite).
+
+La mémoire reste constante : un message décodé à la fois, fenêtre INTER bornée
+(INTER_WINDOW_SIZE), historique séquentiel limité aux 50 derniers jeux.
+
+À lancer bot arrêté (il réécrirait son propre état par-dessus), dans le dossier
+de l'état et avec les mêmes variables d'environnement (STORAGE_BACKEND,
+SQLITE_PATH, INTER_WINDOW_SIZE, TRIGGER_OFFSET...).
+
+Usage :
+    python importer.py export.json [--replace] [--no-rules] [--dry-run] [--json]
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+from typing import Any, Dict, Iterable
+
+from backtest import Record, read_records, new_cycle
+from card_predictor import CardPredictor
+from message_parser import parse_message, is_numbering_reset
+
+# Jeux gardés dans l'historique séquentiel par collect_inter_data : au-delà, une édition arrive trop tard
+HISTORY_GAMES = 50
+
+
+def collect_history(records: Iterable[Record], cp: CardPredictor) -> Dict[str, Any]:
+    """Collecte les posts dans cp (en mémoire) comme le ferait le live, sans prédiction ni envoi"""
+    started = time.perf_counter()
+    stats = Counter()
+    last_game = None
+    post_time = [time.time()]
+    # Les paires INTER sont datées de la publication du post (âge max, demi-vie)
+    cp.clock = lambda: post_time[0]
+    for _, text, is_edit, date in records:
+        stats['posts'] += 1
+        game = parse_message(text)
+        number = game.game_number
+        if not number:
+            continue
+        if is_numbering_reset(last_game, number):
+            stats['cycles'] += 1
+            new_cycle(cp)
+        if is_edit:
+            if last_game is not None and not last_game - HISTORY_GAMES <= number <= last_game:
+                # Édition d'un jeu sorti de l'historique ou du cycle précédent : plus rien à corriger
+                stats['stale_edits'] += 1
+                continue
+            stats['edits'] += 1
+        elif number in cp.collected_games:
+            stats['duplicates'] += 1 # post relivré ou recopié : collect_inter_data l'ignore s'il est identique
+        else:
+            last_game = number
+            stats['games'] += 1
+        if not game.first_card:
+            continue
+        if date:
+            post_time[0] = date
+        previous = cp.sequential_history.get(number)
+        cp.collect_inter_data(number, game)
+        if previous and previous.get('carte') != cp.sequential_history[number]['carte']:
+            stats['corrections'] += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'posts': stats['posts'],
+        'games': stats['games'],
+        'duplicates': stats['duplicates'],
+        'edits': stats['edits'],
+        'corrections': stats['corrections'],
+        'stale_edits': stats['stale_edits'],
+        'cycles': stats['cycles'],
+        'pairs': len(cp.inter_data),
+        'elapsed_s': round(elapsed, 3),
+        'posts_per_s': round(stats['posts'] / elapsed) if elapsed > 0 else 0,
+    }
+
+
+def load_into(target: CardPredictor, collected: CardPredictor, replace: bool = False,
+              rules: bool = True) -> Dict[str, Any]:
+    """
+    Fusionne l'historique collecté dans le prédicteur persisté puis sauvegarde une
+    seule fois. Les paires importées précèdent celles du live (plus récentes) et la
+    fenêtre garde les plus récentes ; l'historique séquentiel du live, s'il existe,
+    reste prioritaire (il décrit le cycle en cours).
+    """
+    live = 0 if replace else len(target.inter_data)
+    rows = collected.inter_data.rows()
+    if not replace:
+        rows += target.inter_data.rows()
+    target.inter_data.load(rows)
+    expired = len(target.inter_data.evict_expired())
+    history = replace or not target.sequential_history
+    if history:
+        target.sequential_history = dict(collected.sequential_history)
+        target.collected_games = set(collected.collected_games)
+    if rules and len(target.inter_data):
+        # L'index des relations du live est froid : celui de l'import sert à l'analyse
+        target.patterns = collected.patterns
+        target.analyze_and_set_smart_rules() # sauvegarde comprise
+    else:
+        target._save_all_data()
+    kept_live = min(live, len(target.inter_data)) # les plus anciennes (importées) sortent en premier
+    return {
+        'imported_pairs': len(target.inter_data) - kept_live,
+        'live_pairs': kept_live,
+        'window': len(target.inter_data),
+        'expired': expired,
+        'history': len(target.sequential_history) if history else 0,
+        'rules': len(target.smart_rules),
+    }
+
+
+def format_report(collect: Dict[str, Any], load: Dict[str, Any]) -> str:
+    lines = [
+        f"📥 IMPORT — {collect['posts']} posts, {collect['games']} jeux, {collect['cycles']} changements de cycle "
+        f"({collect['elapsed_s']} s, {collect['posts_per_s']} posts/s)",
+        f"✏️ Éditions : {collect['edits']} ({collect['corrections']} corrections, "
+        f"{collect['stale_edits']} trop anciennes ignorées), doublons : {collect['duplicates']}",
+        f"🧠 Paires INTER collectées : {collect['pairs']}",
+    ]
+    if load:
+        lines.append(f"💾 Fenêtre INTER : {load['window']} paires ({load['imported_pairs']} importées, "
+                     f"{load['live_pairs']} du live, {load['expired']} trop anciennes)")
+        lines.append(f"📜 Historique séquentiel : {load['history'] or 'celui du live conservé'}")
+        lines.append(f"📊 Règles INTER : {load['rules']}")
+    else:
+        lines.append("🧪 --dry-run : rien n'a été écrit")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Charge un historique du canal source dans l'état du bot")
+    parser.add_argument('path', help="export JSON de Telegram Desktop ou historique JSONL")
+    parser.add_argument('--replace', action='store_true',
+                        help="remplace la fenêtre INTER et l'historique du live au lieu de les compléter")
+    parser.add_argument('--no-rules', action='store_true', help="ne recalcule pas les règles INTER")
+    parser.add_argument('--dry-run', action='store_true', help="collecte et rapport sans rien écrire")
+    parser.add_argument('--json', action='store_true', help="sortie JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # Mêmes réglages que le live (variables d'environnement), état uniquement en mémoire
+    collected = CardPredictor(persist=False)
+    collect = collect_history(read_records(args.path), collected)
+    load = {}
+    if not args.dry_run:
+        target = CardPredictor()
+        if not target.state_loaded:
+            print("❌ État persisté illisible : import annulé", file=sys.stderr)
+            return 1
+        load = load_into(target, collected, args.replace, not args.no_rules)
+    if args.json:
+        print(json.dumps({'collect': collect, 'load': load}, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(collect, load))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# inter_window.py
+
+"""
+Fenêtre bornée des paires INTER (déclencheur N-2 -> enseigne du jeu N).
+
+Les paires sont stockées dans un tampon circulaire de capacité fixe, en
+tableaux `array` compacts (numéros de jeu entiers, carte/enseigne encodées par
+card_codec, date en secondes epoch) au lieu d'une liste de dictionnaires. La
+fenêtre est limitée en nombre et, en option, en âge : la mémoire reste stable
+quelle que soit la durée de fonctionnement. Les lignes évincées sont renvoyées
+à l'appelant pour qu'il mette à jour ses compteurs de règles.
+"""
+import time
+from array import array
+from datetime import datetime
+from typing import List, Tuple, Iterator, Dict, Any, Iterable, Optional
+
+from card_codec import encode_card, suit_code, decode_card, decode_suit
+
+# Ligne compacte : (numero_resultat, numero_declencheur, code carte, code enseigne, epoch)
+Row = Tuple[int, int, int, int, int]
+
+
+class InterWindow:
+    """Tampon circulaire de paires INTER, borné en nombre et (option) en âge"""
+
+    def __init__(self, capacity: int = 2000, max_age: float = 0):
+        self.capacity = max(1, capacity)
+        self.max_age = max_age # secondes, 0 = pas de limite d'âge
+        self._result_game = array('i', [0]) * self.capacity
+        self._trigger_game = array('i', [0]) * self.capacity
+        self._card = array('b', [0]) * self.capacity
+        self._suit = array('b', [0]) * self.capacity
+        self._ts = array('q', [0]) * self.capacity
+        self._head = 0 # index de la plus ancienne ligne
+        self._size = 0
+        self.appended = 0   # nombre total de lignes ajoutées (pour le journal)
+        self.generation = 0 # incrémenté à chaque modification autre qu'un ajout
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, i: int) -> int:
+        return (self._head + i) % self.capacity
+
+    def _row(self, slot: int) -> Row:
+        return (self._result_game[slot], self._trigger_game[slot], self._card[slot],
+                self._suit[slot], self._ts[slot])
+
+    def add(self, result_game: int, trigger_game: int, card: int, suit: int,
+            ts: Optional[float] = None) -> List[Row]:
+        """Ajoute une paire ; renvoie la ligne évincée si la fenêtre était pleine"""
+        evicted = []
+        if self._size == self.capacity:
+            evicted.append(self._row(self._head))
+            self._head = (self._head + 1) % self.capacity
+            self._size -= 1
+        slot = self._slot(self._size)
+        self._result_game[slot] = result_game
+        self._trigger_game[slot] = trigger_game
+        self._card[slot] = card
+        self._suit[slot] = suit
+        self._ts[slot] = int(ts if ts is not None else time.time())
+        self._size += 1
+        self.appended += 1
+        return evicted
+
+    def evict_expired(self, now: Optional[float] = None) -> List[Row]:
+        """Retire les paires plus anciennes que max_age"""
+        if not self.max_age or not self._size:
+            return []
+        limit = (now if now is not None else time.time()) - self.max_age
+        evicted = []
+        while self._size and self._ts[self._head] < limit:
+            evicted.append(self._row(self._head))
+            self._head = (self._head + 1) % self.capacity
+            self._size -= 1
+        return evicted
+
+    def remove_result(self, result_game: int) -> List[Row]:
+        """Retire les paires d'un jeu résultat (correction d'un jeu recollecté)"""
+        rows = self.rows()
+        removed = [r for r in rows if r[0] == result_game]
+        if removed:
+            self._reload([r for r in rows if r[0] != result_game])
+        return removed
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+        self.generation += 1
+
+    def _reload(self, rows: Iterable[Row]):
+        self.clear()
+        for r in rows:
+            self.add(*r)
+
+    def rows(self) -> List[Row]:
+        """Lignes compactes, de la plus ancienne à la plus récente"""
+        return [self._row(self._slot(i)) for i in range(self._size)]
+
+    def tail(self, count: int) -> List[Row]:
+        count = min(count, self._size)
+        return [self._row(self._slot(i)) for i in range(self._size - count, self._size)]
+
+    def load(self, items: Iterable[Any]):
+        """Recharge depuis des lignes compactes ou des entrées dict (ancien format inter_data)"""
+        rows = []
+        for item in items:
+            row = item if isinstance(item, (list, tuple)) else row_from_entry(item)
+            if row is not None:
+                rows.append(tuple(row))
+        self._reload(rows)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Vue compatible avec l'ancien format (dictionnaires) pour l'affichage"""
+        for row in self.rows():
+            yield entry_from_row(row)
+
+
+def row_from_entry(entry: Dict[str, Any]) -> Optional[Row]:
+    card, suit = encode_card(entry.get('declencheur', '')), suit_code(entry.get('result_suit', ''))
+    if card is None or suit is None:
+        return None
+    try:
+        ts = int(datetime.fromisoformat(entry['date']).timestamp())
+    except (KeyError, ValueError, TypeError):
+        ts = int(time.time())
+    return (int(entry['numero_resultat']), int(entry.get('numero_declencheur', entry['numero_resultat'] - 2)),
+            card, suit, ts)
+
+
+def entry_from_row(row: Row) -> Dict[str, Any]:
+    return {
+        'numero_resultat': row[0],
+        'declencheur': decode_card(row[2]),
+        'numero_declencheur': row[1],
+        'result_suit': decode_suit(row[3]),
+        'date': datetime.fromtimestamp(row[4]).isoformat(),
+    }
@@ -0,0 +1,120 @@
+# logging_setup.py
+
+"""
+Journalisation asynchrone : le chemin chaud ne fait que déposer l'enregistrement
+dans une file bornée, un thread dédié (QueueListener) le formate et l'écrit.
+
+- Le formatage (msg % args, traceback) est reporté au thread d'écriture : les
+  appels en style %s ne coûtent presque rien à l'appelant.
+- File pleine : l'enregistrement est abandonné et compté plutôt que de bloquer
+  un thread Flask ou l'écrivain du prédicteur.
+- Les lignes INFO/DEBUG répétées (même logger, même gabarit) sont limitées à
+  LOG_RATE_LIMIT par fenêtre de LOG_RATE_WINDOW secondes ; le nombre de lignes
+  supprimées est résumé à la fenêtre suivante. WARNING et au-delà passent toujours.
+- Niveau : DEBUG si Config.DEBUG, sinon INFO.
+"""
+import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+_handler: Optional['AsyncLogHandler'] = None
+
+
+class AsyncLogHandler(QueueHandler):
+    """QueueHandler sans formatage côté appelant, non bloquant et limité en répétitions"""
+
+    def __init__(self, log_queue: queue.Queue, rate_limit: int = 20, window: float = 60.0):
+        super().__init__(log_queue)
+        self.rate_limit = rate_limit
+        self.window = window
+        self.dropped = 0 # file pleine
+        self.suppressed = 0 # répétitions au-delà de la limite
+        # (logger, gabarit) -> [début de fenêtre, lignes émises, lignes supprimées]
+        self._windows: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Même processus : le listener formate l'enregistrement d'origine (args et exc_info compris)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord):
+        if self.rate_limit and record.levelno < logging.WARNING:
+            summary = self._throttle(record)
+            if summary is False:
+                return
+            if summary is not None:
+                self.enqueue(summary)
+        self.enqueue(record)
+
+    def _throttle(self, record: logging.LogRecord):
+        """False si la ligne est supprimée ; sinon le résumé éventuel de la fenêtre précédente"""
+        key = (record.name, str(record.msg))
+        now = record.created
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None:
+                if len(self._windows) >= 10000:
+                    self._windows.clear() # gabarits construits par f-string : pas de croissance sans fin
+                self._windows[key] = [now, 1, 0]
+                return None
+            if now - state[0] >= self.window:
+                suppressed = state[2]
+                state[:] = [now, 1, 0]
+                if not suppressed:
+                    return None
+                return logging.makeLogRecord({
+                    'name': record.name, 'levelno': record.levelno, 'levelname': record.levelname,
+                    'created': now, 'msecs': record.msecs,
+                    'msg': "🔇 %d lignes similaires supprimées en %g s : %s",
+                    'args': (suppressed, self.window, str(record.msg)[:120]),
+                })
+            if state[1] < self.rate_limit:
+                state[1] += 1
+                return None
+            state[2] += 1
+            self.suppressed += 1
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return {'queued': self.queue.qsize(), 'dropped': self.dropped, 'suppressed': self.suppressed}
+
+
+def setup_logging(debug: bool = False, stream=None) -> AsyncLogHandler:
+    """Installe (une seule fois) la file de journalisation sur le logger racine ; rappeler pour changer le niveau"""
+    global _listener, _handler
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if debug else logging.INFO)
+    if _handler is not None:
+        return _handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE') or 10000))
+    _handler = AsyncLogHandler(log_queue, rate_limit=int(os.getenv('LOG_RATE_LIMIT', '20')),
+                               window=float(os.getenv('LOG_RATE_WINDOW') or 60))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Vide la file à l'arrêt (fin du worker gunicorn, Ctrl+C)
+    atexit.register(_listener.stop)
+    return _handler
+
+
+def log_stats() -> Optional[Dict[str, int]]:
+    return _handler.stats() if _handler else None
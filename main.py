@@ -3,26 +3,60 @@
 import os
 import logging
 import time
+import threading
 from datetime import datetime
-import pytz
-from flask import Flask, request
-from apscheduler.schedulers.background import BackgroundScheduler
+from flask import Flask, request, Response
+
+# Journalisation asynchrone installée avant les modules locaux, qui journalisent dès l'import
+# (niveau INFO jusqu'à la lecture de Config.DEBUG)
+from logging_setup import setup_logging, log_stats
+setup_logging()
 
 # Import local modules
 import config
 from bot import telegram_bot
+from update_queue import UpdateQueue
+from cluster import SharedInbox, LeaderLease, ClusterCoordinator
+from poller import UpdatePoller
+from outbound import EditSuperseded, PRIORITY_KI, PRIORITY_VERIFY
+from card_predictor import format_session_report
+import metrics
+from tracing import TRACER
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
 # Load config instance
 bot_config = config.Config()
+setup_logging(bot_config.DEBUG)
+
+# Mode multi-workers : les updates passent par la boîte de réception partagée (voir cluster.py)
+inbox = None
+if bot_config.MULTI_WORKER and telegram_bot:
+    inbox = SharedInbox(bot_config.INBOX_PATH)
+
+# File de traitement en arrière-plan (mode ASYNC_WEBHOOK)
+update_queue = None
+if bot_config.ASYNC_WEBHOOK and telegram_bot and not inbox:
+    update_queue = UpdateQueue(telegram_bot.handle_update, maxsize=bot_config.UPDATE_QUEUE_SIZE)
+
+# Ingestion par getUpdates (INGEST_MODE=polling) au lieu du webhook
+poller = None
+if bot_config.INGEST_MODE == 'polling' and telegram_bot:
+    poller = UpdatePoller(telegram_bot.client, telegram_bot.handlers.handle_batch,
+                          limit=bot_config.POLL_LIMIT, timeout=bot_config.POLL_TIMEOUT)
+
+# Scheduler du processus (None tant qu'il n'est pas démarré, et chez les followers en multi-workers)
+scheduler = None
+
+# Posé quand warm_up() a enregistré le webhook (ou lancé le polling) et démarré le scheduler
+warmup_done = threading.Event()
+
+def benin_tz():
+    """Fuseau du Bénin ; pytz n'est importé qu'au premier usage, hors du démarrage"""
+    import pytz
+    return pytz.timezone('Africa/Porto-Novo')
 
 # --- ENDPOINTS ---
 
@@ -37,12 +71,125 @@ def webhook():
     if request.method == "POST":
         update = request.get_json()
         if update and telegram_bot:
-            telegram_bot.handle_update(update)
+            if inbox:
+                # Seul le leader traite les updates, dans l'ordre d'arrivée
+                inbox.put(update)
+            elif update_queue:
+                # File pleine : 503 pour que Telegram renvoie l'update plus tard
+                if not update_queue.enqueue(update):
+                    return "Busy", 503
+            else:
+                telegram_bot.handle_update(update)
         return "OK", 200
     return "Forbidden", 403
 
+@app.route('/stats')
+def stats():
+    """Compteurs de la file de traitement des updates et latence des appels Telegram"""
+    result = {'async_webhook': bool(update_queue)}
+    if update_queue:
+        result['update_queue'] = update_queue.stats()
+    if coordinator:
+        result['cluster'] = coordinator.stats()
+    if poller:
+        result['poller'] = poller.stats()
+    if telegram_bot:
+        result['telegram_api'] = telegram_bot.client.stats()
+        result['outbound'] = telegram_bot.dispatcher.stats()
+        if telegram_bot.handlers.card_predictor:
+            result['parse_cache'] = telegram_bot.handlers.card_predictor.parse_cache.stats()
+            result['predictor_actor'] = telegram_bot.handlers.actor.stats()
+        result['dedup'] = telegram_bot.handlers.dedup.stats()
+    result['logging'] = log_stats()
+    return result, 200
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Latences par étape, files, tâches planifiées et persistance (format texte Prometheus)"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _debug_allowed(require_token: bool = False) -> bool:
+    """DEBUG_TOKEN (paramètre token ou en-tête X-Debug-Token) ; sans jeton, seules les lectures sont ouvertes"""
+    token = os.getenv('DEBUG_TOKEN')
+    if not token:
+        return not require_token
+    return token in (request.args.get('token'), request.headers.get('X-Debug-Token'))
+
+@app.route('/debug/traces')
+def debug_traces():
+    """Traces échantillonnées les plus lentes (TRACE_SAMPLE_RATE)"""
+    if not _debug_allowed():
+        return "Forbidden", 403
+    return TRACER.dump(request.args.get('limit', 10, type=int)), 200
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """POST ?mode=cpu|memory&seconds=N démarre une capture ; GET renvoie la capture en cours ou la dernière"""
+    if not _debug_allowed(require_token=True):
+        return "Forbidden", 403
+    if request.method == 'POST':
+        try:
+            capture = TRACER.start_capture(request.args.get('mode', 'cpu'), request.args.get('seconds', 30, type=float))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if capture is None:
+            return {'error': 'capture déjà en cours'}, 409
+        return capture.to_dict(), 202
+    capture = TRACER.capture or TRACER.last_capture
+    return (capture.to_dict(), 200) if capture else ({'error': 'aucune capture'}, 404)
+
+# Dernier getMe : (horodatage monotone, joignable, erreur)
+_telegram_check = {'at': None, 'ok': False, 'error': None}
+_telegram_check_lock = threading.Lock()
+
+def _telegram_reachable():
+    """getMe au plus une fois par HEALTH_TELEGRAM_TTL secondes"""
+    with _telegram_check_lock:
+        now = time.monotonic()
+        if _telegram_check['at'] is None or now - _telegram_check['at'] >= bot_config.HEALTH_TELEGRAM_TTL:
+            try:
+                r = telegram_bot.client.get('getMe', timeout=5)
+                _telegram_check.update(ok=r.status_code == 200,
+                                       error=None if r.status_code == 200 else f"HTTP {r.status_code}")
+            except Exception as e:
+                _telegram_check.update(ok=False, error=str(e))
+            _telegram_check['at'] = now
+        return _telegram_check['ok'], _telegram_check['error']
+
+@app.route('/health')
+def health():
+    """Vivacité (le processus répond) et disponibilité : état chargé, scheduler vivant, Telegram joignable"""
+    checks = {}
+    handlers = telegram_bot.handlers if telegram_bot else None
+    cp = handlers.card_predictor if handlers else None
+    checks['state_loaded'] = {'ok': bool(cp and cp.state_loaded)}
+    checks['warmup'] = {'ok': warmup_done.is_set()}
+    # Seul le leader fait tourner le scheduler en mode multi-workers
+    if coordinator and not coordinator.lease.is_leader:
+        checks['scheduler'] = {'ok': True, 'skipped': 'follower'}
+    else:
+        thread = getattr(scheduler, '_thread', None)
+        checks['scheduler'] = {'ok': bool(scheduler and scheduler.running and (thread is None or thread.is_alive()))}
+    if poller and not (coordinator and not coordinator.lease.is_leader):
+        checks['poller'] = {'ok': poller.running}
+    if telegram_bot:
+        ok, error = _telegram_reachable()
+        checks['telegram'] = {'ok': ok, 'error': error} if error else {'ok': ok}
+    else:
+        checks['telegram'] = {'ok': False, 'error': 'bot non configuré'}
+    ready = all(c['ok'] for c in checks.values())
+    return {'status': 'ok' if ready else 'unavailable', 'live': True, 'ready': ready, 'checks': checks}, \
+        200 if ready else 503
+
 # --- SETUP FUNCTIONS ---
 
+def setup_ingestion():
+    """Webhook, ou boucle getUpdates en mode polling (qui supprime elle-même le webhook)"""
+    if poller:
+        poller.start()
+    else:
+        setup_webhook()
+
 def setup_webhook():
     """Set up webhook on startup"""
     try:
@@ -70,25 +217,8 @@ def reset_non_inter_predictions():
     """Reset all prediction data at 00h59 Benin time"""
     try:
         if hasattr(telegram_bot, 'handlers') and telegram_bot.handlers.card_predictor:
-            predictor = telegram_bot.handlers.card_predictor
-            # Files to remove
-            files_to_clear = [
-                'predictions.json', 'inter_data.json', 'smart_rules.json',
-                'collected_games.json', 'inter_mode_status.json'
-            ]
-            for file in files_to_clear:
-                if os.path.exists(file):
-                    os.remove(file)
-            
-            # Reset in-memory data
-            predictor.predictions = {}
-            predictor.inter_data = []
-            predictor.smart_rules = []
-            predictor.collected_games = set()
-            predictor.last_prediction_time = 0
-            predictor.last_predicted_game_number = 0
-            predictor.is_inter_mode_active = True
-            predictor._save_all_data()
+            # Reset du prédicteur vivant, en mémoire, sur l'écrivain unique
+            telegram_bot.handlers.reset_predictor('daily', activate_inter=True)
             logger.info("🔄 Daily reset performed successfully.")
     except Exception as e:
         logger.error(f"❌ Reset error: {e}")
@@ -98,11 +228,12 @@ def send_startup_message():
     try:
         if hasattr(telegram_bot, 'handlers') and telegram_bot.handlers.card_predictor:
             predictor = telegram_bot.handlers.card_predictor
-            if not predictor.telegram_message_sender or not predictor.prediction_channel_id:
+            snap = telegram_bot.handlers.state()
+            if not predictor.telegram_message_sender or not snap.prediction_channel_id:
                 return
             
-            now = datetime.now(pytz.timezone('Africa/Porto-Novo'))
-            inter_active = "✅ ACTIF" if predictor.is_inter_mode_active else "❌ INACTIF"
+            now = datetime.now(benin_tz())
+            inter_active = "✅ ACTIF" if snap.is_inter_mode_active else "❌ INACTIF"
             
             msg = (f"🎬 **LES PRÉDICTIONS REPRENNENT !**\n\n"
                    f"⏰ Heure de Bénin : {now.strftime('%H:%M:%S - %d/%m/%Y')}\n"
@@ -111,7 +242,7 @@ def send_startup_message():
                    f"👨‍💻 **Développeur** : Sossou Kouamé\n"
                    f"🎟️ **Code Promo** : Koua229")
             
-            predictor.telegram_message_sender(predictor.prediction_channel_id, msg)
+            predictor.telegram_message_sender(snap.prediction_channel_id, msg)
             logger.info("📢 Startup message sent.")
     except Exception as e:
         logger.error(f"❌ Startup message error: {e}")
@@ -121,9 +252,10 @@ def send_session_reports():
     try:
         if hasattr(telegram_bot, 'handlers') and telegram_bot.handlers.card_predictor:
             predictor = telegram_bot.handlers.card_predictor
-            report = predictor.get_session_report_preview()
-            if predictor.prediction_channel_id and predictor.telegram_message_sender:
-                predictor.telegram_message_sender(predictor.prediction_channel_id, report)
+            snap = telegram_bot.handlers.state()
+            report = format_session_report(snap, predictor.report_stats())
+            if snap.prediction_channel_id and predictor.telegram_message_sender:
+                predictor.telegram_message_sender(snap.prediction_channel_id, report)
     except Exception as e:
         logger.error(f"❌ Report error: {e}")
 
@@ -132,105 +264,130 @@ def update_pending_ki():
     try:
         from bot import telegram_bot
         if telegram_bot and hasattr(telegram_bot, 'handlers') and telegram_bot.handlers.card_predictor:
-            cp = telegram_bot.handlers.card_predictor
-            now = datetime.now(pytz.timezone('Africa/Porto-Novo'))
+            handlers = telegram_bot.handlers
+            cp = handlers.card_predictor
+            now_ts = time.time()
+            channel_id = handlers.state().prediction_channel_id
+            # Copie des prédictions en attente prise sur l'écrivain ; les éditions partent hors de lui
+            pending = handlers.actor.query(lambda: [(k, dict(p)) for k, p in cp.pending_predictions()])
             
-            # On utilise list(predictions.items()) pour pouvoir supprimer des éléments pendant l'itération
-            for game_num, pred in list(cp.predictions.items()):
-                if pred.get('status') == 'pending':
-                    msg_id = pred.get('message_id')
-                    if not msg_id:
-                        continue
-                        
-                    suit = pred['predicted_costume']
-                    ki_base = pred.get('ki_base', 0)
-                    start_time = pred.get('timestamp', time.time())
-                    elapsed_min = int((time.time() - start_time) / 60)
-                    current_ki = ki_base + elapsed_min
-                    
-                    if pred.get('last_updated_ki') == current_ki:
-                        continue
-                    
-                    new_text = cp.prepare_prediction_text(game_num, suit, ki=current_ki, show_ki=False)
+            # Seules les prédictions en attente sont parcourues (index), les éditions partent en parallèle
+            edits = []
+            for game_num, pred in pending:
+                msg_id = pred.get('message_id')
+                if not msg_id:
+                    continue
                     
-                    try:
-                        # Utilisation directe du bot_instance pour plus de contrôle
-                        success_mid = telegram_bot.handlers.send_message(
-                            cp.prediction_channel_id, 
-                            new_text, 
-                            message_id=msg_id, 
-                            edit=True, 
-                            parse_mode='HTML'
-                        )
-                        if success_mid:
-                            pred['last_updated_ki'] = current_ki
-                    except Exception as e:
-                        # Capture plus précise de l'erreur Telegram
-                        error_str = str(e).lower()
-                        if "message to edit not found" in error_str or "message can't be edited" in error_str:
-                            logger.warning(f"⚠️ Message {msg_id} (Jeu {game_num}) introuvable ou non éditable. Suppression.")
-                            if game_num in cp.predictions:
-                                del cp.predictions[game_num]
-                        else:
-                            logger.error(f"❌ Erreur API Telegram lors de l'édition: {e}")
-            cp._save_all_data()
+                elapsed_min = int((now_ts - pred.get('timestamp', now_ts)) / 60)
+                current_ki = pred.get('ki_base', 0) + elapsed_min
+                
+                if pred.get('last_updated_ki') == current_ki:
+                    continue
+                # Une édition de vérification déjà en file remplacera ce message : inutile de l'éditer
+                if bot_config.KI_SKIP_IF_VERIFYING and handlers.dispatcher.has_pending(channel_id, msg_id, PRIORITY_VERIFY):
+                    continue
+                
+                new_text = cp.prepare_prediction_text(game_num, pred['predicted_costume'], ki=current_ki, show_ki=False)
+                future = handlers.send_message_async(
+                    channel_id, 
+                    new_text, 
+                    message_id=msg_id, 
+                    edit=True, 
+                    parse_mode='HTML',
+                    priority=PRIORITY_KI,
+                    # Copie prise plus haut : la prédiction a pu être vérifiée depuis, son ✅ doit rester
+                    guard=lambda key=game_num: handlers.is_pending(key)
+                )
+                if future:
+                    edits.append((game_num, msg_id, current_ki, future))
+            
+            updated, removed = {}, []
+            for game_num, msg_id, current_ki, future in edits:
+                try:
+                    r = future.result(timeout=55)
+                except EditSuperseded:
+                    continue # une édition de vérification a remplacé ce rafraîchissement
+                except Exception as e:
+                    logger.error(f"❌ Erreur API Telegram lors de l'édition: {e}")
+                    continue
+                # Capture plus précise de l'erreur Telegram
+                error_str = r.text.lower() if r.status_code != 200 else ""
+                if r.status_code == 200 or "message is not modified" in error_str:
+                    updated[game_num] = current_ki
+                elif "message to edit not found" in error_str or "message can't be edited" in error_str:
+                    logger.warning(f"⚠️ Message {msg_id} (Jeu {game_num}) introuvable ou non éditable. Suppression.")
+                    removed.append(game_num)
+                else:
+                    logger.error(f"❌ Erreur API Telegram lors de l'édition: {r.status_code} {r.text}")
+            # Rien à persister si aucun ki n'a changé
+            if updated or removed:
+                handlers.actor.call(cp.apply_ki_updates, updated, removed)
     except Exception as e:
         logger.error(f"❌ Erreur générale mise à jour ki dynamique: {e}")
 
 def setup_scheduler():
     """Configure the background scheduler for tasks"""
+    global scheduler
     try:
+        # Import différé : APScheduler n'est chargé que par le démarrage en arrière-plan
+        from apscheduler.schedulers.background import BackgroundScheduler
         scheduler = BackgroundScheduler()
-        benin_tz = pytz.timezone('Africa/Porto-Novo')
+        tz = benin_tz()
         
         # Daily reset at 00:59
-        scheduler.add_job(reset_non_inter_predictions, 'cron', hour=0, minute=59, timezone=benin_tz)
+        scheduler.add_job(metrics.timed_job('daily_reset', reset_non_inter_predictions), 'cron', hour=0, minute=59, timezone=tz)
         
         # Global Reset every 150 minutes
         def global_reset_task():
             logger.info("🕒 Exécution du Reset Global (150 min)...")
-            from card_predictor import CardPredictor
-            predictor = CardPredictor()
-            predictor.reset_all_data()
+            try:
+                telegram_bot.handlers.reset_predictor('global', activate_inter=True)
+            except Exception as e:
+                logger.error(f"❌ Reset global impossible: {e}")
+                return
             if os.getenv('ADMIN_ID'):
                 try:
-                    from bot import telegram_bot
                     telegram_bot.handlers.send_message(int(os.getenv('ADMIN_ID')), "🔄 **Reset automatique effectué (150 min)**\nToutes les données ont été effacées.")
                 except: pass
 
-        scheduler.add_job(
-            global_reset_task, 
-            'interval', 
-            minutes=150, 
-            timezone=benin_tz,
-            id='global_reset_job',
-            replace_existing=True
-        )
+        # Avec RULE_HALF_LIFE, les anciens motifs s'effacent par décroissance : pas de reset global
+        cp = telegram_bot.handlers.card_predictor if telegram_bot and hasattr(telegram_bot, 'handlers') else None
+        if cp and cp.trigger_stats.half_life:
+            logger.info(f"⏳ Reset global désactivé : décroissance des règles (demi-vie {cp.trigger_stats.half_life / 60:g} min)")
+        else:
+            scheduler.add_job(
+                metrics.timed_job('global_reset', global_reset_task), 
+                'interval', 
+                minutes=150, 
+                timezone=tz,
+                id='global_reset_job',
+                replace_existing=True
+            )
 
         # Periodic inter analysis every 10 minutes
         scheduler.add_job(
-            run_inter_analysis, 
+            metrics.timed_job('inter_analysis', run_inter_analysis), 
             'interval', 
             minutes=10, 
-            timezone=benin_tz,
+            timezone=tz,
             id='inter_analysis_job',
             replace_existing=True,
-            next_run_time=datetime.now(benin_tz)
+            next_run_time=datetime.now(tz)
         )
         
         # Mise à jour dynamique du ki chaque minute
         scheduler.add_job(
-            update_pending_ki,
+            metrics.timed_job('dynamic_ki', update_pending_ki),
             'interval',
             minutes=1,
-            timezone=benin_tz,
+            timezone=tz,
             id='dynamic_ki_job',
             replace_existing=True
         )
         
         # Reports at specific hours
         for hour in [0, 6, 12, 18]:
-            scheduler.add_job(send_session_reports, 'cron', hour=hour, minute=0, timezone=benin_tz)
+            scheduler.add_job(metrics.timed_job('session_report', send_session_reports), 'cron', hour=hour, minute=0, timezone=tz)
             
         scheduler.start()
         logger.info("⏰ Scheduler started (Benin TZ) - Analysis every 10m + Dynamic Ki every 1m")
@@ -244,15 +401,15 @@ def run_inter_analysis():
         if telegram_bot and hasattr(telegram_bot, 'handlers') and telegram_bot.handlers.card_predictor:
             logger.info("🔄 Lancement de l'analyse automatique INTER...")
             predictor = telegram_bot.handlers.card_predictor
-            predictor.analyze_and_set_smart_rules()
+            telegram_bot.handlers.actor.call(predictor.analyze_and_set_smart_rules)
             
             # Envoyer notification de mise à jour réussie à l'admin (le compte de l'utilisateur)
             target_id = os.getenv('ADMIN_ID')
             if target_id and predictor.telegram_message_sender:
-                now = datetime.now(pytz.timezone('Africa/Porto-Novo'))
+                now = datetime.now(benin_tz())
                 msg = (f"🔄 **MISE À JOUR RÉUSSIE !**\n\n"
                        f"✅ Analyse INTER effectuée avec succès.\n"
-                       f"📊 {len(predictor.smart_rules)} règles actives.\n"
+                       f"📊 {len(telegram_bot.handlers.state().smart_rules)} règles actives.\n"
                        f"🕒 Dernière mise à jour : {now.strftime('%H:%M:%S')}\n"
                        f"🚀 Les 8 tops sont réellement à jour.")
                 telegram_bot.handlers.send_message(int(target_id), msg)
@@ -262,9 +419,65 @@ def run_inter_analysis():
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'analyse planifiée: {e}")
 
+def warm_up():
+    """Webhook (ou polling) et scheduler en arrière-plan : le serveur HTTP répond déjà pendant ce temps"""
+    started = time.perf_counter()
+    try:
+        setup_ingestion()
+        setup_scheduler()
+    finally:
+        warmup_done.set()
+        logger.info("🔥 Démarrage terminé en %.2f s (webhook/polling + scheduler)", time.perf_counter() - started)
+
+def on_leader_promoted():
+    """Nouveau leader : relit l'état écrit par l'ancien, puis prend le webhook (ou le polling) et le scheduler"""
+    handlers = telegram_bot.handlers
+    if handlers.card_predictor:
+        handlers.actor.call(handlers.card_predictor.reload_state)
+    setup_ingestion()
+    setup_scheduler()
+
+def register_metrics():
+    """Valeurs lues au scrape de /metrics : rien à tenir à jour sur le chemin chaud"""
+    def queue_depths():
+        depths = {}
+        if update_queue:
+            depths[('updates',)] = update_queue.stats()['depth']
+        if inbox:
+            depths[('inbox',)] = inbox.depth()
+        if telegram_bot:
+            depths[('outbound',)] = telegram_bot.dispatcher.depth()
+            if telegram_bot.handlers.actor:
+                depths[('predictor',)] = telegram_bot.handlers.actor.stats()['depth']
+        return depths
+    metrics.REGISTRY.callback('bot_queue_depth', "Éléments en attente par file", queue_depths, ('queue',))
+    metrics.REGISTRY.callback('bot_log_records_lost_total', "Lignes de log non écrites (file pleine, répétitions)",
+                              lambda: {(k,): v for k, v in (log_stats() or {}).items() if k != 'queued'},
+                              ('reason',), kind='counter')
+
+    handlers = telegram_bot.handlers if telegram_bot else None
+    if not handlers or not handlers.card_predictor:
+        return
+    cp = handlers.card_predictor
+
+    def predictions():
+        snap = handlers.state()
+        return {('won',): snap.won, ('lost',): snap.lost, ('pending',): snap.pending}
+    metrics.REGISTRY.callback('bot_predictions', "Prédictions de l'état courant par statut", predictions, ('status',))
+    metrics.REGISTRY.callback('bot_persist_bytes_total', "Octets écrits par la persistance depuis le démarrage",
+                              lambda: cp._store.bytes_written if cp._store else 0, kind='counter')
+
 # Global setup
-setup_webhook()
-setup_scheduler()
+register_metrics()
+coordinator = None
+if inbox:
+    coordinator = ClusterCoordinator(inbox, LeaderLease(bot_config.LEADER_LOCK_PATH),
+                                     telegram_bot.handle_update, on_promote=on_leader_promoted)
+    coordinator.start()
+    # La promotion (webhook, scheduler) se fait déjà sur le thread du coordinateur
+    warmup_done.set()
+else:
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
 
 if __name__ == "__main__":
     # Configure Port (10000 for Render, 5000 for Replit)
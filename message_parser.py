@@ -0,0 +1,158 @@
+# message_parser.py
+
+"""
+Analyse unique d'un message du canal source.
+
+Le texte d'un post est analysé une seule fois (expressions régulières
+compilées) en un ParsedGame immuable réutilisé par toutes les étapes du
+CardPredictor : collecte INTER, vérification et prédiction. Un petit cache LRU
+clé (chat_id, message_id, hash du texte) évite de ré-analyser un post renvoyé
+ou édité sans changement.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple, Any, Dict, List, Sequence
+
+from card_codec import encode_card
+
+GAME_NUMBER_RE = re.compile(r'(?:#|N|#N)(\d+)', re.IGNORECASE)
+GAME_NUMBER_ALT_RE = re.compile(r'🔵(\d+)🔵')
+FIRST_PAREN_RE = re.compile(r'\(([^)]*)\)')
+FIRST_GROUP_RE = re.compile(r'\d+\(([^)]+)\)')
+CARD_DETAIL_RE = re.compile(r'(\d+|[AKQJ])(♠️|❤️|♦️|♣️)', re.IGNORECASE)
+GROUP_CARD_RE = re.compile(r'([AJQK\d]+(?:♠️|♥️|♦️|♣️|♠|❤️|♦|♣))')
+
+# Recul du numéro de jeu au-delà duquel la numérotation est considérée repartie à 1 (nouvelle journée)
+NUMBERING_RESET_GAP = 500
+
+# Ordre de détection de l'enseigne d'une carte (identique à l'ancienne vérification)
+SUIT_SYMBOLS = ('♠️', '♥️', '♦️', '♣️', '♠', '❤️', '♦', '♣')
+
+
+class ParsedGame(NamedTuple):
+    """Résultat compact de l'analyse d'un post (enseignes cœur normalisées en ♥️)"""
+    text: str
+    game_number: Optional[int]
+    first_card: Optional[Tuple[str, str]]            # (carte, enseigne) de la 1re parenthèse
+    first_group_cards: Optional[Tuple[str, ...]]     # cartes du groupe "N(...)", None si absent
+    first_group_codes: Tuple[Optional[int], ...]     # mêmes cartes encodées (card_codec)
+    first_group_suits: Tuple[str, ...]               # enseignes utilisées pour la vérification
+    has_completion: bool                             # ✅ ou ❌ présent
+    has_shield: bool                                 # 🔰 présent
+
+
+def extract_game_number(text: str) -> Optional[int]:
+    m = GAME_NUMBER_RE.search(text)
+    if m: return int(m.group(1))
+    m = GAME_NUMBER_ALT_RE.search(text)
+    if m: return int(m.group(1))
+    return None
+
+
+def is_numbering_reset(last: Optional[int], number: int) -> bool:
+    """True si le numéro recule assez depuis last pour ouvrir un nouveau cycle (retour à 1)"""
+    return last is not None and last - number > NUMBERING_RESET_GAP
+
+
+def order_by_game(items: Sequence[Tuple[ParsedGame, Any]]) -> List[Tuple[ParsedGame, Any]]:
+    """
+    Tri stable de (jeu, données) par numéro de jeu, dans l'ordre de la numérotation : un recul
+    de plus de NUMBERING_RESET_GAP ouvre un nouveau cycle, un edit tardif de l'ancien cycle reste
+    avant lui. Un post sans numéro garde sa place derrière le précédent.
+    """
+    cycle, last = 0, None
+    key = (0, 0)
+    keyed = []
+    for index, item in enumerate(items):
+        number = item[0].game_number
+        if number:
+            item_cycle = cycle
+            if is_numbering_reset(last, number):
+                cycle += 1
+                item_cycle, last = cycle, number
+            elif last is not None and number - last > NUMBERING_RESET_GAP and cycle:
+                item_cycle = cycle - 1 # retardataire de la numérotation précédente
+            else:
+                last = number if last is None else max(last, number)
+            key = (item_cycle, number)
+        keyed.append((key, index, item))
+    keyed.sort(key=lambda entry: (entry[0], entry[1]))
+    return [item for _, _, item in keyed]
+
+
+def group_cards(text: str) -> Tuple[str, ...]:
+    text = text.replace("❤️", "♥️").replace("❤️️", "♥️").replace(" ", "")
+    return tuple(GROUP_CARD_RE.findall(text))
+
+
+def card_suit(card: str) -> str:
+    suit = ""
+    for s in SUIT_SYMBOLS:
+        if s in card:
+            suit = s
+            break
+    if not suit: suit = card[-1]
+    if suit in ("❤️", "❤️️"): suit = "♥️"
+    return suit
+
+
+def first_card_info(text: str) -> Optional[Tuple[str, str]]:
+    match = FIRST_PAREN_RE.search(text)
+    content = match.group(1) if match else text
+    m = CARD_DETAIL_RE.search(content.replace("♥️", "❤️"))
+    if not m: return None
+    v, c = m.groups()
+    return f"{v.upper()}{c}".replace("❤️", "♥️"), c.replace("❤️", "♥️")
+
+
+def parse_message(text: str) -> ParsedGame:
+    """Analyse complète d'un post en une seule passe par motif"""
+    game_number = extract_game_number(text)
+    group_match = FIRST_GROUP_RE.search(text)
+    if group_match:
+        cards = group_cards(group_match.group(1))
+        verify_cards = cards
+    else:
+        cards = None
+        verify_cards = group_cards(text)[:3]
+    return ParsedGame(
+        text=text,
+        game_number=game_number,
+        first_card=first_card_info(text),
+        first_group_cards=cards,
+        first_group_codes=tuple(encode_card(c) for c in cards) if cards else (),
+        first_group_suits=tuple(card_suit(c) for c in verify_cards),
+        has_completion='✅' in text or '❌' in text,
+        has_shield='🔰' in text,
+    )
+
+
+class ParseCache:
+    """Cache LRU des ParsedGame clé (chat_id, message_id, hash du texte)"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[Any, Any, int], ParsedGame]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str, chat_id: Any = None, message_id: Any = None) -> ParsedGame:
+        key = (chat_id, message_id, hash(text))
+        with self._lock:
+            parsed = self._items.get(key)
+            if parsed is not None and parsed.text == text:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return parsed
+            self.misses += 1
+        parsed = parse_message(text)
+        with self._lock:
+            self._items[key] = parsed
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return parsed
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._items), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,237 @@
+# metrics.py
+
+"""
+Métriques au format texte Prometheus (endpoint /metrics de main.py).
+
+Sans dépendance : compteurs et histogrammes à seaux fixes, enregistrés sur le
+chemin chaud pour quelques centaines de nanosecondes (bisect + incrément sous
+un verrou non contendu). Les valeurs déjà tenues ailleurs (profondeur des
+files, octets persistés, prédictions de l'instantané) sont lues au moment du
+scrape par des fonctions de rappel, sans rien coûter au traitement.
+"""
+import time
+import logging
+import functools
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+# Seaux des durées (secondes) : de 50 µs (étapes du prédicteur) à 30 s (appels Telegram lents)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+Sample = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Compteur monotone, éventuellement étiqueté (inc(1, 'won'))"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram:
+    """Histogramme à seaux fixes ; observe() ne fait qu'un bisect et deux additions"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Par série : [compte par seau (dernier = +Inf), somme]
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *label_values: str) -> '_Timer':
+        """with histogram.time('collect'): ..."""
+        return _Timer(self, label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        lines = []
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            suffix = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'started')
+
+    def __init__(self, histogram: Histogram, label_values: Labels):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+class Callback:
+    """Valeur lue au scrape : fn() renvoie un nombre, ou {valeurs d'étiquettes: nombre}"""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], Optional[Sample]],
+                 labels: Tuple[str, ...] = (), kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labels = labels
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        value = self.fn()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in sorted(value.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Enregistre (ou remplace, ex. nouveau leader) une métrique par son nom"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def callback(self, name: str, help_text: str, fn: Callable[[], Optional[Sample]],
+                 labels: Tuple[str, ...] = (), kind: str = 'gauge') -> Callback:
+        return self.register(Callback(name, help_text, fn, labels, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for metric in metrics:
+            try:
+                lines = metric.render()
+            except Exception as e:
+                # Une source indisponible (ex. base SQLite verrouillée) ne casse pas tout le scrape
+                logger.warning(f"⚠️ Métrique {metric.name} indisponible: {e}")
+                continue
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+
+REGISTRY = Registry()
+
+# --- Métriques du chemin chaud (enregistrées par les modules du bot) ---
+
+# Étapes d'un update : parse, collect, verify, predict (handlers / CardPredictor.ingest),
+# persist (_save_all_data, inclus dans l'étape qui sauvegarde) et telegram (chaque appel API)
+STAGE_SECONDS = REGISTRY.histogram('bot_stage_seconds', "Durée des étapes de traitement d'un update", ('stage',))
+UPDATE_SECONDS = REGISTRY.histogram('bot_update_seconds', "Durée totale du traitement d'un update")
+TELEGRAM_ERRORS = REGISTRY.counter('bot_telegram_errors_total', "Appels API Telegram en échec", ('method',))
+PREDICTIONS_SENT = REGISTRY.counter('bot_predictions_sent_total', "Prédictions envoyées au canal")
+PREDICTIONS_RESOLVED = REGISTRY.counter('bot_predictions_resolved_total', "Prédictions vérifiées par résultat",
+                                        ('status',))
+JOB_SECONDS = REGISTRY.histogram('bot_job_seconds', "Durée d'exécution des tâches planifiées", ('job',))
+JOB_LAST_RUN = {} # tâche -> horodatage de la dernière fin d'exécution
+REGISTRY.callback('bot_job_last_run_timestamp_seconds', "Fin de la dernière exécution de chaque tâche planifiée",
+                  lambda: {(job,): ts for job, ts in JOB_LAST_RUN.items()}, ('job',))
+
+
+def observe_stage(stage: str, started: float):
+    """Fin d'une étape commencée à started (perf_counter) : histogramme + span de la trace en cours"""
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed, stage)
+    TRACER.span(stage, started, elapsed)
+
+
+def timed_job(name: str, fn: Callable) -> Callable:
+    """Enveloppe une tâche du scheduler pour mesurer sa durée (et la tracer si le traçage est actif)"""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        started = time.perf_counter()
+        trace = TRACER.begin(f'job:{name}', force=True)
+        try:
+            return TRACER.call(fn, *args, **kwargs)
+        finally:
+            JOB_SECONDS.observe(time.perf_counter() - started, name)
+            JOB_LAST_RUN[name] = time.time()
+            TRACER.end(trace)
+    return run
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,325 @@
+# outbound.py
+
+"""
+Répartiteur des appels sortants vers Telegram.
+
+- Seaux à jetons (token buckets) global et par chat pour rester sous les
+  limites anti-flood de Telegram.
+- Les réponses 429 sont respectées : le chat est bloqué pendant `retry_after`
+  puis l'appel est rejoué. Les erreurs réseau / 5xx sont rejouées avec un
+  backoff exponentiel bruité (jitter).
+- Priorités : les éditions de vérification passent avant les messages
+  normaux, eux-mêmes avant les rafraîchissements cosmétiques du ki.
+- Éditions d'un même message : jamais deux en vol à la fois, et une édition
+  plus récente de priorité égale ou supérieure remplace celles encore en
+  file (leur Future reçoit EditSuperseded). Une édition moins prioritaire
+  qu'une autre déjà en file ou en vol est abandonnée : le texte vérifié reste.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional, List, Tuple
+
+from telegram_client import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_VERIFY = 0
+PRIORITY_NORMAL = 1
+PRIORITY_KI = 2
+
+PRIORITY_NAMES = {PRIORITY_VERIFY: 'verify', PRIORITY_NORMAL: 'normal', PRIORITY_KI: 'ki'}
+
+
+class EditSuperseded(Exception):
+    """Édition abandonnée : une édition plus récente ou plus prioritaire du même message la remplace"""
+
+
+class TokenBucket:
+    """Seau à jetons classique : `rate` jetons par seconde, au plus `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Temps à attendre avant qu'un jeton soit disponible (0 si disponible)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _OutboundCall:
+    __slots__ = ('method', 'payload', 'chat_id', 'priority', 'seq', 'attempts',
+                 'not_before', 'enqueued_at', 'future', 'message_id', 'key', 'guard')
+
+    def __init__(self, method, payload, chat_id, priority, seq, guard=None):
+        self.method = method
+        self.payload = payload
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = seq
+        self.attempts = 0
+        self.not_before = 0.0
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+        self.message_id = payload.get('message_id') if isinstance(payload, dict) else None
+        # Message visé par une édition : les éditions d'un même message sont ordonnées entre elles
+        self.key = (chat_id, self.message_id) if method == 'editMessageText' and self.message_id else None
+        self.guard = guard # relu juste avant l'envoi : False = appel devenu inutile
+
+
+class OutboundDispatcher:
+    """File de priorité + workers qui respectent les limites de débit Telegram"""
+
+    def __init__(self, client: TelegramClient, global_rate: Optional[float] = None,
+                 chat_rate: Optional[float] = None, chat_burst: Optional[float] = None,
+                 workers: int = 4, max_retries: int = 5, backoff_base: float = 0.5):
+        self.client = client
+        self.global_rate = global_rate or float(os.getenv('OUTBOUND_GLOBAL_RATE') or 25)
+        self.chat_rate = chat_rate or float(os.getenv('OUTBOUND_CHAT_RATE') or 1)
+        self.chat_burst = chat_burst or float(os.getenv('OUTBOUND_CHAT_BURST') or 5)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.workers = workers
+
+        self._global_bucket = TokenBucket(self.global_rate, self.global_rate)
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._blocked_until: Dict[Any, float] = {}
+        self._pending: List[_OutboundCall] = []
+        self._in_flight: Dict[Tuple[Any, Any], int] = {} # message en cours d'édition -> priorité
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._threads: List[threading.Thread] = []
+
+        # Compteurs
+        self.submitted = 0
+        self.sent = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.superseded = 0
+        self.total_wait = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.max_wait = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.done = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def start(self):
+        with self._cond:
+            if any(t.is_alive() for t in self._threads):
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f'outbound-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+        for t in self._threads:
+            t.start()
+
+    # --- API publique ---
+
+    def submit(self, method: str, payload: Dict[str, Any], priority: int = PRIORITY_NORMAL,
+               guard: Optional[Callable[[], bool]] = None) -> Future:
+        """
+        Met un appel en file ; le Future reçoit la réponse finale (ou l'exception).
+        guard : vérifié par le worker juste avant chaque envoi ; s'il renvoie False, l'appel est
+        abandonné (EditSuperseded), ex. rafraîchissement du ki d'une prédiction vérifiée entre-temps.
+        """
+        if not self._threads:
+            self.start()
+        chat_id = payload.get('chat_id') if isinstance(payload, dict) else None
+        dropped = []
+        with self._cond:
+            self._seq += 1
+            call = _OutboundCall(method, payload, chat_id, priority, self._seq, guard)
+            self.submitted += 1
+            if call.key is not None:
+                dropped = self._supersede(call)
+            if call not in dropped:
+                self._pending.append(call)
+                self._cond.notify()
+            self.superseded += len(dropped)
+        for old in dropped:
+            old.future.set_exception(EditSuperseded(f"édition du message {old.message_id} remplacée"))
+        return call.future
+
+    def _supersede(self, call: _OutboundCall) -> List[_OutboundCall]:
+        """
+        Éditions abandonnées par l'arrivée de call : call lui-même si une édition plus prioritaire
+        du message est en file ou en vol, sinon les éditions en file de priorité égale ou moindre
+        """
+        in_flight = self._in_flight.get(call.key)
+        if in_flight is not None and in_flight < call.priority:
+            return [call]
+        same = [c for c in self._pending if c.key == call.key]
+        if any(c.priority < call.priority for c in same):
+            return [call]
+        for old in same:
+            self._pending.remove(old)
+        return same
+
+    def call(self, method: str, payload: Dict[str, Any], priority: int = PRIORITY_NORMAL,
+             timeout: Optional[float] = 120):
+        """Version bloquante de submit()"""
+        return self.submit(method, payload, priority).result(timeout)
+
+    def has_pending(self, chat_id: Any, message_id: Any, priority: Optional[int] = None) -> bool:
+        """Indique si un appel visant ce message est déjà en attente (option: de cette priorité)"""
+        with self._cond:
+            return any(
+                c.chat_id == chat_id and c.message_id == message_id
+                and (priority is None or c.priority == priority)
+                for c in self._pending
+            )
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    # --- Boucle des workers ---
+
+    def _next_ready(self, now: float):
+        """Choisit l'appel prêt le plus prioritaire ; sinon renvoie le délai d'attente minimal"""
+        best, min_wait = None, None
+        global_wait = self._global_bucket.wait_time(now)
+        for call in self._pending:
+            if call.key is not None and call.key in self._in_flight:
+                continue # une édition du même message est en cours : elle part d'abord
+            wait = max(call.not_before - now, self._blocked_until.get(call.chat_id, 0) - now, global_wait)
+            bucket = self._chat_bucket(call.chat_id)
+            wait = max(wait, bucket.wait_time(now))
+            if wait <= 0:
+                if best is None or (call.priority, call.seq) < (best.priority, best.seq):
+                    best = call
+            elif min_wait is None or wait < min_wait:
+                min_wait = wait
+        return best, min_wait
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    call, wait = self._next_ready(now)
+                    if call:
+                        break
+                    self._cond.wait(wait)
+                self._pending.remove(call)
+                if call.key is not None:
+                    self._in_flight[call.key] = call.priority
+                self._global_bucket.consume(now)
+                self._chat_bucket(call.chat_id).consume(now)
+                if call.attempts == 0:
+                    self._record_wait(call, now)
+            try:
+                self._execute(call)
+            finally:
+                if call.key is not None:
+                    with self._cond:
+                        self._in_flight.pop(call.key, None)
+                        # Les éditions suivantes de ce message redeviennent éligibles
+                        self._cond.notify_all()
+
+    def _record_wait(self, call: _OutboundCall, now: float):
+        name = PRIORITY_NAMES.get(call.priority, 'normal')
+        waited = now - call.enqueued_at
+        self.total_wait[name] += waited
+        self.done[name] += 1
+        if waited > self.max_wait[name]:
+            self.max_wait[name] = waited
+
+    def _retry(self, call: _OutboundCall, delay: float):
+        with self._cond:
+            # Une édition du même message arrivée pendant l'essai est plus récente : elle seule repart
+            newer = call.key is not None and any(c.key == call.key and c.priority <= call.priority
+                                                 for c in self._pending)
+            if not newer:
+                call.attempts += 1
+                call.not_before = time.monotonic() + delay
+                self._pending.append(call)
+                self.retries += 1
+                self._cond.notify()
+            else:
+                self.superseded += 1
+        if newer:
+            call.future.set_exception(EditSuperseded(f"édition du message {call.message_id} remplacée"))
+
+    def _backoff(self, attempts: int) -> float:
+        return self.backoff_base * (2 ** attempts) * random.uniform(0.5, 1.5)
+
+    def _execute(self, call: _OutboundCall):
+        if call.guard is not None and not call.guard():
+            with self._cond:
+                self.superseded += 1
+            call.future.set_exception(EditSuperseded(f"{call.method} du message {call.message_id} plus à jour"))
+            return
+        try:
+            response = self.client.post(call.method, json=call.payload)
+        except Exception as e:
+            if call.attempts < self.max_retries:
+                logger.warning(f"⚠️ {call.method} échoué ({e}), nouvel essai #{call.attempts + 1}")
+                self._retry(call, self._backoff(call.attempts))
+            else:
+                self.failed += 1
+                call.future.set_exception(e)
+            return
+
+        if response.status_code == 429:
+            self.rate_limited += 1
+            try:
+                retry_after = float(response.json().get('parameters', {}).get('retry_after', 1))
+            except Exception:
+                retry_after = 1.0
+            with self._cond:
+                blocked = time.monotonic() + retry_after
+                if blocked > self._blocked_until.get(call.chat_id, 0):
+                    self._blocked_until[call.chat_id] = blocked
+            if call.attempts < self.max_retries:
+                logger.warning(f"⏳ 429 Telegram sur {call.method} (chat {call.chat_id}), reprise dans {retry_after}s")
+                self._retry(call, retry_after + random.uniform(0, self.backoff_base))
+                return
+        elif response.status_code >= 500 and call.attempts < self.max_retries:
+            self._retry(call, self._backoff(call.attempts))
+            return
+
+        if response.status_code == 200:
+            self.sent += 1
+        else:
+            self.failed += 1
+        call.future.set_result(response)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': self.depth(),
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+            'superseded': self.superseded,
+            'wait_ms': {
+                name: {
+                    'avg': round(self.total_wait[name] / self.done[name] * 1000, 2) if self.done[name] else 0.0,
+                    'max': round(self.max_wait[name] * 1000, 2),
+                }
+                for name in self.total_wait
+            },
+        }
@@ -0,0 +1,221 @@
+# pattern_index.py
+
+"""
+Index de comptage partagé pour plusieurs relations déclencheur -> enseigne.
+
+Une relation = (décalage k, nature du déclencheur) :
+- 'first' : première carte du premier groupe du jeu N-k (relation historique, k=2) ;
+- 'any'   : chacune des cartes du premier groupe du jeu N-k ;
+- 'pair'  : chaque paire de cartes distinctes du premier groupe du jeu N-k.
+Toutes les relations (k = 1..max_offset) sont mises à jour en une seule passe
+par collect_inter_data, dans un unique tableau `array` plat : index =
+(base de la relation + clé du déclencheur) * 4 + enseigne. La taille est fixe
+(52 clés par relation carte, 52 × 52 par relation paire) et les jeux sortis de
+la fenêtre sont décomptés : la mémoire reste bornée.
+
+Chaque relation est aussi évaluée en continu : avant de compter le jeu N, elle
+prédit l'enseigne du jeu N à partir du jeu N-k, et la prédiction est gagnée si
+l'enseigne apparaît dans le premier groupe de N, N+1 ou N+2 (même critère que
+la vérification). best_relation() choisit la relation au meilleur taux.
+"""
+import math
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any, Iterable
+
+from card_codec import NUM_CARDS, NUM_SUITS, decode_card, decode_suit, suit_code
+
+KINDS = ('first', 'any', 'pair')
+Relation = Tuple[int, str]
+
+# Libellés affichés pour chaque nature de déclencheur
+KIND_LABELS = {'first': '1re carte', 'any': 'toute carte', 'pair': 'paire de cartes'}
+
+
+def relation_label(relation: Relation) -> str:
+    return f"{KIND_LABELS[relation[1]]} N-{relation[0]}"
+
+
+def pair_key(a: int, b: int) -> int:
+    return a * NUM_CARDS + b if a < b else b * NUM_CARDS + a
+
+
+def pair_name(key: int) -> str:
+    return f"{decode_card(key // NUM_CARDS)}+{decode_card(key % NUM_CARDS)}"
+
+
+def trigger_keys(codes: Iterable[Optional[int]]) -> Dict[str, List[int]]:
+    """Clés de déclencheur d'un premier groupe pour chaque nature, dans l'ordre des cartes"""
+    cards = [c for c in codes if c is not None]
+    distinct = list(dict.fromkeys(cards))
+    return {
+        'first': cards[:1],
+        'any': distinct,
+        'pair': [pair_key(a, b) for i, a in enumerate(distinct) for b in distinct[i + 1:]],
+    }
+
+
+def wilson_lower_bound(won: int, total: int, z: float = 1.96) -> float:
+    if total == 0:
+        return 0.0
+    p = won / total
+    centre = p + z * z / (2 * total)
+    margin = z * math.sqrt((p * (1 - p) + z * z / (4 * total)) / total)
+    return (centre - margin) / (1 + z * z / total)
+
+
+class PatternIndex:
+    """Compteurs bornés de toutes les relations, évaluées en continu"""
+
+    def __init__(self, max_offset: int = 3, capacity: int = 2000):
+        self.max_offset = max(1, max_offset)
+        self.capacity = max(1, capacity)
+        self.relations: List[Relation] = [(k, kind) for k in range(1, self.max_offset + 1) for kind in KINDS]
+        self._base: Dict[Relation, int] = {}
+        size = 0
+        for relation in self.relations:
+            self._base[relation] = size
+            size += NUM_CARDS * NUM_CARDS if relation[1] == 'pair' else NUM_CARDS
+        self.counts = array('I', [0]) * (size * NUM_SUITS)
+        self.trials = [0] * len(self.relations)
+        self.hits = [0] * len(self.relations)
+        # Jeu résultat -> [clés comptées (array), issues des évaluations [(relation, gagné)]]
+        self._records: "OrderedDict[int, list]" = OrderedDict()
+        # Premiers groupes récents : jeu -> (codes, clés par nature), en ordre d'arrivée
+        self._groups: Dict[int, Tuple[Tuple[Optional[int], ...], Dict[str, List[int]]]] = {}
+        self._open: Dict[int, List[Tuple[int, int]]] = {} # jeu cible -> [(relation, enseigne prédite)]
+
+    def clear(self):
+        self.counts = array('I', [0]) * len(self.counts)
+        self.trials = [0] * len(self.relations)
+        self.hits = [0] * len(self.relations)
+        self._records.clear()
+        self._groups.clear()
+        self._open.clear()
+
+    def _best(self, relation: Relation, keys: List[int]) -> Optional[int]:
+        """Enseigne prédite : meilleure enseigne du déclencheur le plus fréquent (premier à égalité)"""
+        base = self._base[relation]
+        counts = self.counts
+        best_count, best_suit = 0, None
+        for key in keys:
+            offset = (base + key) * NUM_SUITS
+            row = counts[offset:offset + NUM_SUITS]
+            count = max(row)
+            if count > best_count:
+                best_count, best_suit = count, row.index(count)
+        return best_suit
+
+    def observe(self, game_number: int, codes: Tuple[Optional[int], ...], result_suit: Optional[int],
+                group_suits: Iterable[str] = ()):
+        """Compte le jeu N pour toutes les relations (une passe) ; corrige un jeu déjà vu"""
+        codes = tuple(codes)
+        previous = self._groups.get(game_number)
+        if previous is not None and previous[0] == codes:
+            return
+        if game_number in self._records:
+            self._forget(self._records.pop(game_number))
+        self._groups[game_number] = (codes, trigger_keys(codes))
+        suits = frozenset(c for c in map(suit_code, group_suits) if c is not None)
+        record = [array('I'), []]
+        self._records[game_number] = record
+        if result_suit is not None:
+            counts, cells, opened = self.counts, record[0], []
+            for index, relation in enumerate(self.relations):
+                trigger = self._groups.get(game_number - relation[0])
+                if trigger is None:
+                    continue
+                keys = trigger[1][relation[1]]
+                if not keys:
+                    continue
+                # Évaluation avant comptage : la relation prédit le jeu N depuis N-k
+                predicted = self._best(relation, keys)
+                if predicted is not None:
+                    opened.append((index, predicted))
+                base = self._base[relation]
+                for key in keys:
+                    cell = (base + key) * NUM_SUITS + result_suit
+                    counts[cell] += 1
+                    cells.append(cell)
+            if opened:
+                self._open[game_number] = opened
+        self._resolve(game_number, suits)
+        while len(self._records) > self.capacity:
+            self._forget(self._records.popitem(last=False)[1])
+        # Seuls les derniers jeux servent de déclencheurs ou de cibles ouvertes
+        keep = self.max_offset + 50
+        while len(self._groups) > keep:
+            del self._groups[next(iter(self._groups))]
+        while len(self._open) > keep:
+            del self._open[next(iter(self._open))]
+
+    def _resolve(self, game_number: int, suits: frozenset):
+        """Clôt les évaluations ciblant N, N-1, N-2 (gagné si l'enseigne sort, perdu après N+2)"""
+        for target in (game_number, game_number - 1, game_number - 2):
+            pending = self._open.get(target)
+            if not pending:
+                continue
+            still_open = []
+            for index, suit in pending:
+                if suit in suits:
+                    self._close(target, index, True)
+                elif game_number - target >= 2:
+                    self._close(target, index, False)
+                else:
+                    still_open.append((index, suit))
+            if still_open:
+                self._open[target] = still_open
+            else:
+                del self._open[target]
+
+    def _close(self, target: int, index: int, won: bool):
+        """Comptabilise une évaluation dans l'enregistrement du jeu cible (décomptée avec lui)"""
+        self.trials[index] += 1
+        self.hits[index] += won
+        record = self._records.get(target)
+        if record is not None:
+            record[1].append((index, won))
+
+    def _forget(self, record: list):
+        """Décompte un jeu sorti de la fenêtre (ou corrigé)"""
+        counts = self.counts
+        for cell in record[0]:
+            if counts[cell]:
+                counts[cell] -= 1
+        for index, won in record[1]:
+            self.trials[index] -= 1
+            self.hits[index] -= won
+
+    def performance(self) -> List[Dict[str, Any]]:
+        rows = []
+        for index, relation in enumerate(self.relations):
+            trials, hits = self.trials[index], self.hits[index]
+            rows.append({'relation': relation, 'trials': trials, 'hits': hits,
+                         'rate': hits / trials if trials else 0.0,
+                         'score': wilson_lower_bound(hits, trials)})
+        return rows
+
+    def best_relation(self, min_trials: int = 100) -> Optional[Relation]:
+        """Relation au meilleur taux (borne basse de Wilson), None si trop peu d'évaluations"""
+        candidates = [r for r in self.performance() if r['trials'] >= min_trials]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda r: r['score'])['relation']
+
+    def ranked_rules(self, relation: Relation) -> List[Dict[str, Any]]:
+        """Règles de la relation au format smart_rules, triées par nombre décroissant"""
+        base = self._base[relation]
+        size = NUM_CARDS * NUM_CARDS if relation[1] == 'pair' else NUM_CARDS
+        counts = self.counts
+        rules = []
+        for key in range(size):
+            offset = (base + key) * NUM_SUITS
+            row = counts[offset:offset + NUM_SUITS]
+            total = sum(row)
+            if not total:
+                continue
+            count = max(row)
+            trigger = pair_name(key) if relation[1] == 'pair' else decode_card(key)
+            rules.append({'trigger': trigger, 'predict': decode_suit(row.index(count)), 'count': count, 'total': total})
+        rules.sort(key=lambda x: x['count'], reverse=True)
+        return rules
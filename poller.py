@@ -0,0 +1,119 @@
+# poller.py
+
+"""
+Ingestion par long polling (getUpdates), alternative au webhook (INGEST_MODE=polling).
+
+Après une mise en veille, Telegram livre le retard par lots de POLL_LIMIT
+updates au lieu d'un appel webhook par update. Chaque lot passe par
+TelegramHandlers.handle_batch : posts du canal source dans l'ordre des jeux,
+une seule sauvegarde, envois ensuite. L'offset n'avance (et Telegram n'oublie
+les updates) qu'une fois le lot traité et persisté : après un crash ou une
+sauvegarde en échec, le lot est relivré (avec un délai croissant) et le
+dédoublonnage / les jeux déjà collectés le rendent sans effet.
+"""
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from telegram_client import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+# Types d'updates utiles au bot (posts du canal, commandes, boutons)
+ALLOWED_UPDATES = ['message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query']
+
+
+class UpdatePoller:
+    """Boucle getUpdates sur un thread dédié"""
+
+    def __init__(self, client: TelegramClient, handle_batch: Callable[[List[Dict[str, Any]]], Any],
+                 limit: int = 100, timeout: int = 30):
+        self.client = client
+        self.handle_batch = handle_batch
+        self.limit = limit # 1..100 (maximum de l'API)
+        self.timeout = timeout # attente côté Telegram quand il n'y a rien à livrer
+        self.offset: Optional[int] = None
+        self.batches = 0
+        self.updates = 0
+        self.errors = 0
+        self.max_batch = 0
+        self.last_batch_s = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='update-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def delete_webhook(self) -> bool:
+        """getUpdates est refusé (409) tant qu'un webhook est enregistré"""
+        try:
+            r = self.client.post('deleteWebhook', json={'drop_pending_updates': False}, timeout=10)
+            return r.status_code == 200
+        except Exception as e:
+            logger.error(f"❌ deleteWebhook impossible: {e}")
+            return False
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        payload = {'limit': self.limit, 'timeout': self.timeout, 'allowed_updates': ALLOWED_UPDATES}
+        if self.offset is not None:
+            payload['offset'] = self.offset
+        r = self.client.post('getUpdates', json=payload, timeout=self.timeout + 10)
+        if r.status_code != 200:
+            raise RuntimeError(f"getUpdates {r.status_code}: {r.text[:200]}")
+        return r.json().get('result', [])
+
+    def poll_once(self) -> int:
+        """Un lot : récupération, traitement (avec sauvegarde), puis avancée de l'offset"""
+        updates = self.fetch()
+        if not updates:
+            return 0
+        started = time.perf_counter()
+        last_id = max(u['update_id'] for u in updates)
+        # Un lot en échec remonte sans toucher à l'offset : Telegram le relivrera
+        self.handle_batch(updates)
+        # Confirmé auprès de Telegram au prochain getUpdates
+        self.offset = last_id + 1
+        self.batches += 1
+        self.updates += len(updates)
+        self.max_batch = max(self.max_batch, len(updates))
+        self.last_batch_s = time.perf_counter() - started
+        return len(updates)
+
+    def _run(self):
+        self.delete_webhook()
+        logger.info(f"📥 Polling getUpdates démarré (lots de {self.limit}, attente {self.timeout} s)")
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                delay = 1.0
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Lot getUpdates en échec: {e} (nouvel essai dans {delay:g} s)")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'offset': self.offset,
+            'batches': self.batches,
+            'updates': self.updates,
+            'max_batch': self.max_batch,
+            'last_batch_ms': round(self.last_batch_s * 1000, 2),
+            'errors': self.errors,
+        }
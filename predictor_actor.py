@@ -0,0 +1,123 @@
+# predictor_actor.py
+
+"""
+Écrivain unique pour l'état du CardPredictor.
+
+Toutes les mutations (ingestion du canal source, commandes admin, tâches
+planifiées) passent par une file de commandes exécutées une par une sur un
+thread dédié : plus de courses entre Flask et APScheduler, sans verrou global.
+Après chaque mutation, l'écrivain publie un PredictorSnapshot immuable ; les
+chemins de lecture (/stat, /qua, /inter status, rapports) lisent simplement la
+dernière référence publiée et ne bloquent jamais l'ingestion. Les lectures qui
+doivent voir l'état vivant (query) passent par la même file sans republier.
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+
+class PredictorActor:
+    """File de commandes mono-écrivain + instantanés en lecture libre"""
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.version = 0
+        self.commands = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Premier instantané construit avant tout démarrage du thread écrivain
+        self._snapshot = predictor.snapshot(self.version)
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='predictor-writer', daemon=True)
+            self._thread.start()
+
+    def _on_writer_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Met une mutation en file ; le Future reçoit sa valeur de retour"""
+        return self._enqueue(fn, args, kwargs, True)
+
+    def _enqueue(self, fn: Callable, args, kwargs, publish: bool) -> Future:
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+        future = Future()
+        # La trace de l'appelant suit la commande : ses étapes deviennent des spans de la même trace
+        self._queue.put((fn, args, kwargs, publish, future, TRACER.current()))
+        return future
+
+    def call(self, fn: Callable, *args, timeout: Optional[float] = 60, **kwargs) -> Any:
+        """Exécute une mutation sur l'écrivain et attend son résultat (directement si déjà sur l'écrivain)"""
+        if self._on_writer_thread():
+            return self._execute(fn, args, kwargs, True)
+        return self._enqueue(fn, args, kwargs, True).result(timeout)
+
+    def query(self, fn: Callable, *args, timeout: Optional[float] = 60, **kwargs) -> Any:
+        """Lecture de l'état vivant sur l'écrivain : aucun nouvel instantané n'est publié"""
+        if self._on_writer_thread():
+            return self._execute(fn, args, kwargs, False)
+        return self._enqueue(fn, args, kwargs, False).result(timeout)
+
+    def snapshot(self):
+        """Dernier instantané publié (jamais bloquant)"""
+        return self._snapshot
+
+    def _execute(self, fn: Callable, args, kwargs, publish: bool) -> Any:
+        started = time.perf_counter()
+        try:
+            return TRACER.call(fn, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.commands += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+            if publish:
+                self._publish()
+
+    def _publish(self):
+        self.version += 1
+        published = time.perf_counter()
+        self._snapshot = self.predictor.snapshot(self.version)
+        TRACER.span('snapshot', published, time.perf_counter() - published)
+
+    def _run(self):
+        while True:
+            fn, args, kwargs, publish, future, trace = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            TRACER.activate(trace)
+            try:
+                future.set_result(self._execute(fn, args, kwargs, publish))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Erreur commande prédicteur {getattr(fn, '__name__', fn)}: {e}")
+                future.set_exception(e)
+            finally:
+                TRACER.activate(None)
+
+    def stats(self) -> Dict[str, Any]:
+        commands = self.commands or 1
+        return {
+            'depth': self._queue.qsize(),
+            'commands': self.commands,
+            'errors': self.errors,
+            'version': self.version,
+            'avg_ms': round(self.total_time / commands * 1000, 3),
+            'max_ms': round(self.max_time * 1000, 3),
+        }
@@ -0,0 +1,157 @@
+# rule_stats.py
+
+"""
+Compteurs déclencheur -> enseigne résultat tenus à jour au fil de la collecte.
+
+Chaque paire (déclencheur N-2, enseigne du jeu N) incrémente les compteurs dès
+son arrivée dans collect_inter_data et les décrémente quand la fenêtre l'évince.
+Le classement des règles INTER n'a donc plus besoin de relire tout inter_data.
+
+Avec une demi-vie (half_life > 0), les compteurs décroissent exponentiellement :
+chaque cellule garde sa valeur et la date de son dernier ajustement, et n'est
+ramenée à la date courante qu'au moment où on la touche (décroissance
+paresseuse, O(1) par événement). Les anciens motifs s'effacent d'eux-mêmes,
+sans reset qui ferait tout réapprendre.
+
+Le classement départage les égalités comme le recalcul complet d'origine :
+enseigne puis déclencheur vus en premier dans la fenêtre. Chaque cellule garde
+pour cela le rang d'arrivée de ses paires ; les retraits se font dans l'ordre
+d'arrivée (éviction de la fenêtre), une correction passe par rebuild().
+"""
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional
+
+# En dessous de ce poids, une cellule décroissante est considérée vide
+EPSILON = 1e-6
+
+
+class TriggerStats:
+    """Compteurs vivants par déclencheur, classement des règles à la demande"""
+
+    def __init__(self, half_life: float = 0):
+        self.half_life = half_life # secondes, 0 = compteurs entiers sans décroissance
+        self.counts: Dict[str, Counter] = {}
+        self._stamps: Dict[str, Dict[str, float]] = {} # date de la valeur stockée de chaque cellule
+        self._arrivals: Dict[str, Dict[str, deque]] = {} # rangs d'arrivée des paires de chaque cellule
+        self._seq = 0
+        self.total = 0
+        self.version = 0
+        self._ranked_version = -1
+        self._ranked: List[Dict[str, Any]] = []
+
+    def _factor(self, elapsed: float) -> float:
+        return 0.5 ** (elapsed / self.half_life) if elapsed > 0 else 1.0
+
+    def _shift(self, trigger: str, suit: str, amount: float, ts: Optional[float]):
+        """Ajoute un poids daté de ts à une cellule, en la ramenant paresseusement à sa date"""
+        ts = ts if ts is not None else time.time()
+        results = self.counts.get(trigger)
+        if results is None:
+            results = self.counts[trigger] = Counter()
+            self._stamps[trigger] = {}
+        stamps = self._stamps[trigger]
+        stamp = stamps.get(suit, ts)
+        if ts >= stamp:
+            value = results[suit] * self._factor(ts - stamp) + amount
+            stamps[suit] = ts
+        else:
+            # Événement plus ancien que la cellule (retrait d'une paire évincée) : poids déjà décru
+            value = results[suit] + amount * self._factor(stamp - ts)
+        if value > EPSILON:
+            results[suit] = value
+        else:
+            self._drop(trigger, suit)
+
+    def _drop(self, trigger: str, suit: str):
+        results = self.counts[trigger]
+        del results[suit]
+        self._stamps.get(trigger, {}).pop(suit, None)
+        self._arrivals[trigger].pop(suit, None)
+        if not results:
+            del self.counts[trigger]
+            self._stamps.pop(trigger, None)
+            del self._arrivals[trigger]
+
+    def add(self, trigger: str, suit: str, ts: Optional[float] = None):
+        self._arrivals.setdefault(trigger, {}).setdefault(suit, deque()).append(self._seq)
+        self._seq += 1
+        if self.half_life:
+            self._shift(trigger, suit, 1.0, ts)
+        else:
+            results = self.counts.get(trigger)
+            if results is None:
+                results = self.counts[trigger] = Counter()
+            results[suit] += 1
+        self.total += 1
+        self.version += 1
+
+    def remove(self, trigger: str, suit: str, ts: Optional[float] = None):
+        """Retire la plus ancienne paire d'une cellule ; ts = sa date, pour retirer exactement son poids décru"""
+        results = self.counts.get(trigger)
+        if not results or results[suit] <= 0:
+            return
+        arrivals = self._arrivals[trigger][suit]
+        arrivals.popleft()
+        if not arrivals:
+            self._drop(trigger, suit) # dernière paire : plus de résidu d'arrondi décroissant
+        elif self.half_life:
+            self._shift(trigger, suit, -1.0, ts)
+        else:
+            results[suit] -= 1
+            if results[suit] == 0:
+                self._drop(trigger, suit)
+        self.total -= 1
+        self.version += 1
+
+    def clear(self):
+        self.counts = {}
+        self._stamps = {}
+        self._arrivals = {}
+        self._seq = 0
+        self.total = 0
+        self.version += 1
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]):
+        """Recalcule tout depuis des entrées inter_data (chargement, reset)"""
+        self.clear()
+        for entry in entries:
+            ts = datetime.fromisoformat(entry['date']).timestamp() if self.half_life else None
+            self.add(entry['declencheur'], entry['result_suit'], ts)
+
+    def current_counts(self, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """Compteurs à la date now (arrondis au centième s'ils décroissent)"""
+        if not self.half_life:
+            return self.counts
+        now = now if now is not None else time.time()
+        return {
+            trigger: {suit: round(value * self._factor(now - self._stamps[trigger][suit]), 2)
+                      for suit, value in results.items()}
+            for trigger, results in self.counts.items()
+        }
+
+    def ranked_rules(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Une règle par déclencheur (enseigne la plus fréquente), triées par nombre décroissant"""
+        if self._ranked_version == self.version and not self.half_life:
+            return self._ranked
+        ranked = []
+        for trigger, results in self.current_counts(now).items():
+            arrivals = self._arrivals[trigger]
+            # À égalité : l'enseigne, puis le déclencheur, vus en premier dans la fenêtre
+            suit, count = max(results.items(), key=lambda x: (x[1], -arrivals[x[0]][0]))
+            first = min(a[0] for a in arrivals.values())
+            ranked.append((-count, first, {'trigger': trigger, 'predict': suit, 'count': count,
+                                           'total': round(sum(results.values()), 2)}))
+        ranked.sort(key=lambda x: x[:2])
+        rules = [rule for _, _, rule in ranked]
+        self._ranked = rules
+        self._ranked_version = self.version
+        return rules
+
+
+def format_count(count: float) -> str:
+    """Nombre affiché d'une règle : entier tel quel, compteur décru arrondi au dixième"""
+    if isinstance(count, int) or float(count).is_integer():
+        return str(int(count))
+    return f"{count:.1f}"
@@ -0,0 +1,436 @@
+# storage.py
+
+"""
+Persistance de l'état du prédicteur : journal append-only + snapshot atomique
+(backend par défaut) ou base SQLite en WAL (STORAGE_BACKEND=sqlite).
+
+Chaque sauvegarde ajoute une seule ligne JSON (un lot d'opérations delta) au
+journal. Le journal est compacté dans un snapshot écrit de façon atomique
+(fichier temporaire + fsync + os.replace) dès qu'il dépasse une taille ou un âge
+donnés. Au démarrage on recharge le snapshot puis on rejoue le journal ; une
+dernière ligne tronquée (crash pendant l'écriture) est ignorée puis coupée.
+Chaque lot porte un numéro de séquence : les lots déjà inclus dans le snapshot
+ne sont jamais rejoués, même si le crash survient avant la remise à zéro du journal.
+
+Le snapshot est binaire (voir encode_snapshot) : les lignes inter_data, l'essentiel
+du volume, y sont des entiers bruts relus d'un bloc, le reste est du JSON compressé.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import struct
+import logging
+import sqlite3
+import threading
+from array import array
+from itertools import chain
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'state_snapshot.bin'
+LEGACY_SNAPSHOT_FILE = 'state_snapshot.json' # ancien snapshot JSON, relu une fois puis remplacé
+JOURNAL_FILE = 'state_journal.jsonl'
+SQLITE_FILE = 'state.db'
+ARCHIVE_DIR = 'archives'
+
+# Sections de l'état persistées et leur valeur vide
+STATE_SECTIONS = {
+    'predictions': dict,
+    'inter_data': list,
+    'smart_rules': list,
+    'sequential_history': dict,
+    'settings': dict,
+    'config_ids': dict,
+}
+
+
+def empty_state() -> Dict[str, Any]:
+    """Renvoie un état vide avec toutes les sections"""
+    return {name: factory() for name, factory in STATE_SECTIONS.items()}
+
+
+# En-tête du snapshot binaire : magie, version, seq, lignes inter_data, taille du JSON compressé
+SNAPSHOT_MAGIC = b'YKST'
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct('<4sBQII')
+INTER_ROW_FIELDS = 5 # voir inter_window.Row
+
+
+def encode_snapshot(seq: int, state: Dict[str, Any]) -> bytes:
+    """
+    En-tête, puis les lignes inter_data à plat en entiers 64 bits little-endian,
+    puis les autres sections en JSON compact compressé (zlib, niveau rapide).
+    """
+    rows = state.get('inter_data', [])
+    values = array('q', chain.from_iterable(rows))
+    if len(values) != len(rows) * INTER_ROW_FIELDS:
+        raise ValueError("inter_data : lignes compactes de 5 entiers attendues")
+    if sys.byteorder == 'big':
+        values.byteswap()
+    others = {name: value for name, value in state.items() if name != 'inter_data'}
+    payload = zlib.compress(json.dumps(others, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 1)
+    header = _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, seq, len(rows), len(payload))
+    return header + values.tobytes() + payload
+
+
+def decode_snapshot(data: bytes) -> Tuple[int, Dict[str, Any]]:
+    """(seq, état) d'un snapshot écrit par encode_snapshot"""
+    magic, version, seq, count, size = _SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot binaire inconnu ({magic!r} v{version})")
+    start = _SNAPSHOT_HEADER.size
+    end = start + count * INTER_ROW_FIELDS * 8
+    values = array('q')
+    values.frombytes(data[start:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    state = json.loads(zlib.decompress(data[end:end + size]))
+    state['inter_data'] = list(zip(*[iter(values)] * INTER_ROW_FIELDS))
+    return seq, state
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Écrit un fichier sans jamais laisser de version tronquée sur le disque"""
+    tmp_path = f"{path}.{os.getpid()}.tmp" # unique par processus (mode multi-workers)
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_archive(state: Dict[str, Any], reason: str = 'reset', directory: Optional[str] = None) -> str:
+    """Archive compressée (JSON gzip) d'un état remplacé par un reset, relisible par le backtest"""
+    directory = directory or os.getenv('ARCHIVE_DIR') or ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    path = os.path.join(directory, f"state-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{reason}.json.gz")
+    payload = dict(state, archived_at=now, reason=reason)
+    atomic_write(path, gzip.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8')))
+    return path
+
+
+def read_archive(path: str) -> Dict[str, Any]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def apply_ops(state: Dict[str, Any], ops: List[list]) -> None:
+    """Applique un lot d'opérations delta à un état (utilisé pour le rejeu)"""
+    for op in ops:
+        kind, section = op[0], op[1]
+        if kind == 'set':
+            state.setdefault(section, {})[op[2]] = op[3]
+        elif kind == 'del':
+            state.setdefault(section, {}).pop(op[2], None)
+        elif kind == 'append':
+            state.setdefault(section, []).extend(op[2])
+        elif kind == 'replace':
+            state[section] = op[2]
+        else:
+            logger.warning(f"⚠️ Opération de journal inconnue ignorée: {kind}")
+
+
+class PersistError(Exception):
+    """Sauvegarde de l'état impossible ; results : ce que le traitement a produit malgré tout"""
+
+    def __init__(self, message: str, results: Any = None):
+        super().__init__(message)
+        self.results = results
+
+
+class StateStore:
+    """Interface commune des backends de persistance (voir open_store)"""
+
+    bytes_written = 0 # octets écrits depuis le démarrage (métrique bot_persist_bytes_total)
+
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """État complet, ou None si rien n'a encore été persisté"""
+        raise NotImplementedError
+
+    def append(self, ops: List[list]) -> None:
+        """Persiste un lot d'opérations delta (voir apply_ops)"""
+        raise NotImplementedError
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def write_snapshot(self, state: Dict[str, Any]) -> None:
+        """Remplace tout l'état persisté"""
+        raise NotImplementedError
+
+    def prediction_stats(self, since: Optional[float] = None) -> Optional[Dict[str, int]]:
+        """Nombre de prédictions par statut (historique inclus) ; None si non supporté"""
+        return None
+
+
+class JournalStore(StateStore):
+    """Journal append-only de deltas + snapshot compacté"""
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_FILE, journal_path: str = JOURNAL_FILE,
+                 compact_bytes: int = 1024 * 1024, compact_interval: float = 300.0, read_only: bool = False):
+        self.snapshot_path = snapshot_path
+        self.read_only = read_only # follower multi-workers : lecture seule, le journal du leader n'est jamais coupé
+        self.journal_path = journal_path
+        self.compact_bytes = compact_bytes
+        self.compact_interval = compact_interval
+        self.journal_size = 0
+        self.last_snapshot_time = time.time()
+        self.bytes_written = 0
+        self.seq = 0
+
+    def exists(self) -> bool:
+        return any(os.path.exists(path) for path in (self.snapshot_path, self.legacy_snapshot_path, self.journal_path))
+
+    @property
+    def legacy_snapshot_path(self) -> str:
+        return os.path.join(os.path.dirname(self.snapshot_path), LEGACY_SNAPSHOT_FILE)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Recharge le snapshot puis rejoue le journal. None si aucun état n'existe."""
+        if not self.exists():
+            return None
+        state = empty_state()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                self.seq, snapshot = decode_snapshot(f.read())
+            state.update(snapshot)
+        elif os.path.exists(self.legacy_snapshot_path):
+            # Snapshot JSON d'avant le format binaire : remplacé à la prochaine compaction
+            with open(self.legacy_snapshot_path, 'rb') as f:
+                snapshot = json.loads(f.read())
+            state.update(snapshot.get('state', {}))
+            self.seq = snapshot.get('seq', 0)
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            good_offset = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"⚠️ Ligne de journal tronquée ignorée (offset {good_offset})")
+                        break
+                    good_offset += len(line)
+                    if batch.get('seq', 0) <= self.seq:
+                        continue
+                    apply_ops(state, batch.get('ops', []))
+                    self.seq = batch['seq']
+                    replayed += 1
+            if good_offset != os.path.getsize(self.journal_path) and not self.read_only:
+                # On coupe la fin tronquée pour que les prochains ajouts restent lisibles
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_offset)
+            self.journal_size = good_offset
+        logger.info(f"📂 État rechargé (snapshot + {replayed} lots de journal)")
+        return state
+
+    def append(self, ops: List[list]) -> None:
+        """Ajoute un lot d'opérations au journal sur une seule ligne"""
+        if not ops:
+            return
+        self.seq += 1
+        line = (json.dumps({'seq': self.seq, 't': time.time(), 'ops': ops}, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.journal_path, 'ab') as f:
+            f.write(line)
+            f.flush()
+        self.journal_size += len(line)
+        self.bytes_written += len(line)
+
+    def needs_compaction(self) -> bool:
+        if self.journal_size <= 0:
+            return False
+        if self.journal_size >= self.compact_bytes:
+            return True
+        return time.time() - self.last_snapshot_time >= self.compact_interval
+
+    def write_snapshot(self, state: Dict[str, Any]) -> None:
+        """Écrit un snapshot complet de façon atomique puis vide le journal"""
+        data = encode_snapshot(self.seq, state)
+        atomic_write(self.snapshot_path, data)
+        if os.path.exists(self.legacy_snapshot_path):
+            os.remove(self.legacy_snapshot_path)
+        # Le snapshot contient désormais tout : le journal peut repartir de zéro
+        with open(self.journal_path, 'wb') as f:
+            f.flush()
+        self.journal_size = 0
+        self.bytes_written += len(data)
+        self.last_snapshot_time = time.time()
+
+
+class SqliteStore(StateStore):
+    """
+    Backend SQLite en mode WAL. Les prédictions ont leur propre table indexée
+    (numéro de jeu, statut, date) : une prédiction supprimée de l'état courant
+    (reset, /ef, message introuvable) est seulement archivée (active = 0), ce qui
+    garde l'historique au-delà de la fenêtre de reset et permet des bilans en
+    agrégats SQL. Chaque lot d'opérations est appliqué dans une seule transaction.
+    """
+
+    # Sections dict (clé -> valeur) hors prédictions, et sections remplacées en bloc
+    DICT_SECTIONS = ('sequential_history',)
+
+    def __init__(self, path: str = SQLITE_FILE, inter_limit: int = 0):
+        self.path = path
+        self.inter_limit = inter_limit # lignes inter_data gardées en base (0 = illimité)
+        self.bytes_written = 0 # volume des valeurs envoyées à SQLite, en caractères (hors pages et WAL)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock, self._conn() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Une connexion par thread : les lectures (bilans) ne bloquent pas l'écrivain"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def exists(self) -> bool:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone()
+        return row is not None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not self.exists():
+            return None
+        conn = self._conn()
+        state = empty_state()
+        state['predictions'] = {
+            key: json.loads(data)
+            for key, data in conn.execute('SELECT game_key, data FROM predictions WHERE active = 1 ORDER BY id')
+        }
+        query = 'SELECT result_game, trigger_game, card, suit, ts FROM inter_data ORDER BY seq'
+        state['inter_data'] = [list(row) for row in conn.execute(query)]
+        for section, key, value in conn.execute('SELECT section, key, value FROM entries'):
+            state.setdefault(section, {})[key] = json.loads(value)
+        for name, value in conn.execute('SELECT name, value FROM sections'):
+            state[name] = json.loads(value)
+        logger.info(f"📂 État rechargé depuis SQLite ({len(state['predictions'])} prédictions actives)")
+        return state
+
+    def append(self, ops: List[list]) -> None:
+        if not ops:
+            return
+        with self._write_lock, self._conn() as conn:
+            for op in ops:
+                self._apply(conn, op)
+            if self.inter_limit and any(op[1] == 'inter_data' for op in ops):
+                conn.execute('DELETE FROM inter_data WHERE seq <= (SELECT MAX(seq) FROM inter_data) - ?',
+                             (self.inter_limit,))
+
+    def write_snapshot(self, state: Dict[str, Any]) -> None:
+        ops = [['replace', name, state.get(name, factory())] for name, factory in STATE_SECTIONS.items()]
+        with self._write_lock, self._conn() as conn:
+            for op in ops:
+                self._apply(conn, op)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('initialized', ?)", (str(time.time()),))
+
+    def _apply(self, conn: sqlite3.Connection, op: list):
+        kind, section = op[0], op[1]
+        if section == 'predictions':
+            if kind == 'set':
+                self._set_prediction(conn, op[2], op[3])
+            elif kind == 'del':
+                conn.execute('UPDATE predictions SET active = 0 WHERE game_key = ? AND active = 1', (op[2],))
+            elif kind == 'replace':
+                # Les prédictions toujours présentes sont mises à jour sur place : seules les absentes sont archivées
+                gone = [(key,) for (key,) in conn.execute('SELECT game_key FROM predictions WHERE active = 1')
+                        if key not in op[2]]
+                conn.executemany('UPDATE predictions SET active = 0 WHERE game_key = ? AND active = 1', gone)
+                for key, value in op[2].items():
+                    self._set_prediction(conn, key, value)
+        elif section == 'inter_data':
+            if kind == 'replace':
+                conn.execute('DELETE FROM inter_data')
+            rows = [tuple(row) for row in op[2]]
+            conn.executemany('INSERT INTO inter_data (result_game, trigger_game, card, suit, ts) VALUES (?, ?, ?, ?, ?)',
+                             rows)
+            # 5 entiers (numéros, codes carte / enseigne, date) de 8 octets au plus
+            self.bytes_written += 40 * len(rows)
+        elif section in self.DICT_SECTIONS:
+            if kind == 'set':
+                value = json.dumps(op[3], ensure_ascii=False)
+                conn.execute('INSERT OR REPLACE INTO entries (section, key, value) VALUES (?, ?, ?)',
+                             (section, op[2], value))
+                self.bytes_written += len(op[2]) + len(value)
+            elif kind == 'del':
+                conn.execute('DELETE FROM entries WHERE section = ? AND key = ?', (section, op[2]))
+            elif kind == 'replace':
+                conn.execute('DELETE FROM entries WHERE section = ?', (section,))
+                rows = [(section, k, json.dumps(v, ensure_ascii=False)) for k, v in op[2].items()]
+                conn.executemany('INSERT INTO entries (section, key, value) VALUES (?, ?, ?)', rows)
+                self.bytes_written += sum(len(k) + len(v) for _, k, v in rows)
+        elif kind == 'replace':
+            value = json.dumps(op[2], ensure_ascii=False)
+            conn.execute('INSERT OR REPLACE INTO sections (name, value) VALUES (?, ?)', (section, value))
+            self.bytes_written += len(value)
+        else:
+            logger.warning(f"⚠️ Opération SQLite inconnue ignorée: {kind} {section}")
+
+    def _set_prediction(self, conn: sqlite3.Connection, key: str, value: Dict[str, Any]):
+        params = (value.get('status'), value.get('timestamp') or 0, json.dumps(value, ensure_ascii=False), key)
+        self.bytes_written += len(params[2])
+        cur = conn.execute('UPDATE predictions SET status = ?, timestamp = ?, data = ? WHERE game_key = ? AND active = 1',
+                           params)
+        if cur.rowcount == 0:
+            try:
+                game_number = int(key)
+            except ValueError:
+                game_number = None
+            conn.execute('INSERT INTO predictions (status, timestamp, data, game_key, game_number, active) '
+                         'VALUES (?, ?, ?, ?, ?, 1)', params + (game_number,))
+
+    def prediction_stats(self, since: Optional[float] = None) -> Optional[Dict[str, int]]:
+        # Une prédiction = un (game_key, timestamp), dans sa dernière version : les copies archivées
+        # par les anciens snapshots (tout archivé puis réinséré) ne sont pas recomptées
+        latest = 'SELECT MAX(id) FROM predictions'
+        params = ()
+        if since is not None:
+            latest += ' WHERE timestamp >= ?'
+            params = (since,)
+        query = f'SELECT status, COUNT(*) FROM predictions WHERE id IN ({latest} GROUP BY game_key, timestamp)'
+        counts = dict(self._conn().execute(query + ' GROUP BY status', params).fetchall())
+        return {'won': counts.get('won', 0), 'lost': counts.get('lost', 0), 'pending': counts.get('pending', 0)}
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_key TEXT NOT NULL,
+    game_number INTEGER,
+    status TEXT,
+    timestamp REAL,
+    active INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_active_key ON predictions (game_key) WHERE active = 1;
+CREATE INDEX IF NOT EXISTS idx_predictions_game ON predictions (game_number);
+CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions (status, timestamp);
+CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp);
+CREATE TABLE IF NOT EXISTS inter_data (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    result_game INTEGER, trigger_game INTEGER, card INTEGER, suit INTEGER, ts INTEGER
+);
+CREATE TABLE IF NOT EXISTS entries (section TEXT, key TEXT, value TEXT, PRIMARY KEY (section, key));
+CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def open_store(backend: Optional[str] = None, inter_limit: int = 0, read_only: bool = False) -> StateStore:
+    """Backend choisi par STORAGE_BACKEND : 'json' (journal + snapshot, défaut) ou 'sqlite'"""
+    backend = (backend or os.getenv('STORAGE_BACKEND') or 'json').lower()
+    if backend == 'sqlite':
+        # Les lectures SQLite (WAL) ne modifient rien : pas de mode dédié
+        return SqliteStore(os.getenv('SQLITE_PATH') or SQLITE_FILE, inter_limit=inter_limit)
+    return JournalStore(read_only=read_only)
@@ -0,0 +1,272 @@
+# sweep.py
+
+"""
+Balayage vectorisé des réglages de règles sur un historique enregistré (NumPy).
+
+Pour chaque décalage N-k, les paires (carte déclencheur du jeu N-k, enseigne
+du jeu N) sont comptées dans une matrice 52 cartes × 4 enseignes par bloc de
+jeux, puis cumulées dans le temps : les compteurs d'une fenêtre glissante sont
+une simple différence de sommes cumulées. Le classement des règles (meilleure
+enseigne par carte, rang dans le Top par enseigne) est calculé une fois par
+(décalage, fenêtre) ; chaque combinaison (Top k, occurrences minimales) n'est
+ensuite qu'un masque sur des tableaux, sans boucle Python par jeu.
+
+Le balayage note le signal de chaque jeu (une prédiction possible par jeu,
+vérifiée sur les jeux N+k..N+k+2) : il ignore ce qui dépend du déroulé live
+(une seule prédiction en attente, règle anti-consécutif). --verify N rejoue
+exactement les N meilleures configurations avec backtest.py.
+
+Usage :
+    python sweep.py historique.jsonl [--offsets 1,2,3] [--tops 1-8] [--min-counts 1,2,3,5]
+                    [--windows 500,1000,2000,5000] [--limit 20] [--verify 3] [--json]
+
+NumPy est nécessaire pour cet outil uniquement (pip install numpy), pas pour le bot.
+"""
+import sys
+import json
+import math
+import time
+import argparse
+from typing import Any, Dict, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # outil hors ligne : le bot lui-même n'en dépend pas
+    np = None
+
+from card_codec import NUM_CARDS, NUM_SUITS, encode_card, suit_code
+from card_predictor import STATIC_RULE_TABLE
+from message_parser import parse_message
+from backtest import read_posts, make_predictor, run_backtest
+
+# Marque "pas de règle" dans les tableaux de rangs
+NO_RULE = 1 << 20
+
+
+def load_games(path: str) -> Dict[str, Any]:
+    """Dernière version de chaque post (les edits remplacent le post), en tableaux NumPy"""
+    latest = {}
+    for index, (message_id, text, _is_edit) in enumerate(read_posts(path)):
+        latest[message_id if message_id is not None else ('#', index)] = text
+    games = [g for g in map(parse_message, latest.values()) if g.game_number]
+    width = max((len(g.first_group_codes) for g in games), default=1) or 1
+    count = len(games)
+    numbers = np.fromiter((g.game_number for g in games), dtype=np.int64, count=count)
+    trigger = np.full(count, -1, dtype=np.int16)
+    result = np.full(count, -1, dtype=np.int8)
+    group = np.full((count, width), -1, dtype=np.int16)
+    present = np.zeros((count, NUM_SUITS), dtype=bool)
+    for t, g in enumerate(games):
+        if g.first_card:
+            card, suit = encode_card(g.first_card[0]), suit_code(g.first_card[1])
+            if card is not None and suit is not None:
+                trigger[t], result[t] = card, suit
+        for i, code in enumerate(g.first_group_codes):
+            if code is not None:
+                group[t, i] = code
+        for suit in g.first_group_suits:
+            code = suit_code(suit)
+            if code is not None:
+                present[t, code] = True
+    return {'numbers': numbers, 'trigger': trigger, 'result': result, 'group': group, 'present': present}
+
+
+def block_counts(games: Dict[str, Any], offset: int, block: int) -> "np.ndarray":
+    """Sommes cumulées par bloc des paires (carte N-k, enseigne N) : ligne b = jeux avant le bloc b"""
+    numbers, trigger, result = games['numbers'], games['trigger'], games['result']
+    count = len(numbers)
+    blocks = (count + block - 1) // block
+    t = np.arange(offset, count)
+    valid = (numbers[t] - numbers[t - offset] == offset) & (trigger[t - offset] >= 0) & (result[t] >= 0)
+    t = t[valid]
+    cell = trigger[t - offset].astype(np.int64) * NUM_SUITS + result[t]
+    flat = np.bincount((t // block) * (NUM_CARDS * NUM_SUITS) + cell, minlength=blocks * NUM_CARDS * NUM_SUITS)
+    per_block = flat.reshape(blocks, NUM_CARDS * NUM_SUITS).astype(np.int32)
+    cumulative = np.zeros((blocks + 1, NUM_CARDS * NUM_SUITS), dtype=np.int32)
+    np.cumsum(per_block, axis=0, out=cumulative[1:])
+    return cumulative
+
+
+def rank_rules(counts: "np.ndarray"):
+    """
+    Pour chaque bloc : enseigne prédite par carte, son nombre d'occurrences et
+    son rang parmi les cartes qui prédisent la même enseigne (0 = Top 1).
+    """
+    matrix = counts.reshape(len(counts), NUM_CARDS, NUM_SUITS)
+    best = matrix.argmax(axis=2).astype(np.int8)
+    best_count = matrix.max(axis=2)
+    # Tri par enseigne prédite puis nombre décroissant ; rang = position dans le groupe
+    key = best.astype(np.int64) * (int(best_count.max(initial=0)) + 1) - best_count
+    order = np.argsort(key, axis=1, kind='stable')
+    sorted_best = np.take_along_axis(best, order, axis=1)
+    positions = np.broadcast_to(np.arange(NUM_CARDS), order.shape)
+    starts = np.where(np.diff(sorted_best, axis=1, prepend=-1) != 0, positions, 0)
+    sorted_rank = positions - np.maximum.accumulate(starts, axis=1)
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, sorted_rank, axis=1)
+    rank[best_count == 0] = NO_RULE
+    return best, best_count, rank
+
+
+def evaluate(games: Dict[str, Any], predicted: "np.ndarray", has_signal: "np.ndarray", offset: int) -> Dict[str, int]:
+    """Vérifie chaque signal sur les jeux N+k, N+k+1, N+k+2 (comme _verify_prediction_common)"""
+    numbers, present = games['numbers'], games['present']
+    count = len(numbers)
+    t = np.arange(count)
+    last = t + offset + 2
+    usable = has_signal & (last < count)
+    last = np.minimum(last, count - 1)
+    usable &= numbers[last] == numbers + offset + 2
+    suit = np.where(usable, predicted, 0)
+    already = np.zeros(count, dtype=bool)
+    result = {}
+    for j in range(3):
+        idx = np.minimum(t + offset + j, count - 1)
+        hit = usable & present[idx, suit] & ~already
+        result[f'won_{j}'] = int(hit.sum())
+        already |= hit
+    result['lost'] = int((usable & ~already).sum())
+    result['signals'] = int(usable.sum())
+    return result
+
+
+def wilson_lower_bound(won: int, total: int, z: float = 1.96) -> float:
+    """Borne basse de Wilson : favorise un bon taux mesuré sur beaucoup de signaux"""
+    if total == 0:
+        return 0.0
+    p = won / total
+    centre = p + z * z / (2 * total)
+    margin = z * math.sqrt((p * (1 - p) + z * z / (4 * total)) / total)
+    return (centre - margin) / (1 + z * z / total)
+
+
+def _finish(config: Dict[str, Any], outcome: Dict[str, int], games_count: int) -> Dict[str, Any]:
+    won = outcome['won_0'] + outcome['won_1'] + outcome['won_2']
+    row = dict(config)
+    row.update(outcome)
+    row['won'] = won
+    row['coverage'] = round(outcome['signals'] / games_count * 100, 2) if games_count else 0.0
+    row['win_rate'] = round(won / outcome['signals'] * 100, 2) if outcome['signals'] else 0.0
+    row['score'] = round(wilson_lower_bound(won, outcome['signals']) * 100, 2)
+    return row
+
+
+def sweep(games: Dict[str, Any], offsets: Sequence[int], tops: Sequence[int], min_counts: Sequence[int],
+          windows: Sequence[int], block: int = 10, include_static: bool = True) -> List[Dict[str, Any]]:
+    group = games['group']
+    count = len(group)
+    valid = group >= 0
+    codes = np.where(valid, group, 0)
+    block_of = (np.arange(count) // block)[:, None]
+    rows = []
+    static_suit = np.array([e[1] if e else -1 for e in STATIC_RULE_TABLE], dtype=np.int8)
+    for offset in offsets:
+        if include_static:
+            suits = np.where(valid, static_suit[codes], -1)
+            hit = suits >= 0
+            slot = hit.argmax(axis=1) # première carte couverte par une règle statique
+            predicted = suits[np.arange(count), slot]
+            outcome = evaluate(games, predicted, hit.any(axis=1), offset)
+            rows.append(_finish({'mode': 'static', 'offset': offset, 'top': None, 'min_count': None,
+                                 'window': None}, outcome, count))
+        cumulative = block_counts(games, offset, block)
+        for window in windows:
+            span = max(1, window // block)
+            start = np.maximum(np.arange(len(cumulative)) - span, 0)
+            best, best_count, rank = rank_rules(cumulative - cumulative[start])
+            # Valeurs vues par chaque carte du premier groupe de chaque jeu
+            card_rank = np.where(valid, rank[block_of, codes], NO_RULE)
+            card_count = best_count[block_of, codes]
+            card_suit = best[block_of, codes]
+            for min_count in min_counts:
+                counted = card_count >= max(min_count, 1)
+                for top in tops:
+                    ranks = np.where(counted & (card_rank < top), card_rank, NO_RULE)
+                    slot = ranks.argmin(axis=1) # meilleur rang, première carte à égalité
+                    has_signal = ranks[np.arange(count), slot] < NO_RULE
+                    predicted = card_suit[np.arange(count), slot]
+                    outcome = evaluate(games, predicted, has_signal, offset)
+                    rows.append(_finish({'mode': 'inter', 'offset': offset, 'top': top, 'min_count': min_count,
+                                         'window': window}, outcome, count))
+    rows.sort(key=lambda r: (r['score'], r['signals']), reverse=True)
+    return rows
+
+
+def _int_list(value: str) -> List[int]:
+    """'1,2,3' ou '1-8'"""
+    items = []
+    for part in value.split(','):
+        if '-' in part:
+            low, high = part.split('-', 1)
+            items.extend(range(int(low), int(high) + 1))
+        elif part:
+            items.append(int(part))
+    return items
+
+
+def format_table(rows: List[Dict[str, Any]], limit: int) -> str:
+    header = f"{'#':>3} {'mode':<6} {'k':>2} {'top':>3} {'min':>3} {'fenêtre':>7} {'signaux':>8} " \
+             f"{'couv%':>6} {'gain%':>6} {'✅0':>6} {'✅1':>6} {'✅2':>6} {'❌':>6} {'score':>6}"
+    lines = [header]
+    for i, r in enumerate(rows[:limit], 1):
+        lines.append(f"{i:>3} {r['mode']:<6} {r['offset']:>2} {r['top'] or '-':>3} {r['min_count'] or '-':>3} "
+                     f"{r['window'] or '-':>7} {r['signals']:>8} {r['coverage']:>6.1f} {r['win_rate']:>6.1f} "
+                     f"{r['won_0']:>6} {r['won_1']:>6} {r['won_2']:>6} {r['lost']:>6} {r['score']:>6.1f}")
+    return '\n'.join(lines)
+
+
+def config_env(row: Dict[str, Any]) -> str:
+    """Variables d'environnement appliquant une configuration au prédicteur"""
+    env = [f"TRIGGER_OFFSET={row['offset']}"]
+    if row['mode'] == 'inter':
+        env += [f"TOP_RULES_PER_SUIT={row['top']}", f"MIN_RULE_COUNT={row['min_count']}",
+                f"INTER_WINDOW_SIZE={row['window']}"]
+    return ' '.join(env) + ('' if row['mode'] == 'inter' else '  (+ /inter default)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Balayage vectorisé des réglages de règles")
+    parser.add_argument('path', help="historique JSONL ou export JSON de Telegram Desktop")
+    parser.add_argument('--offsets', default='1,2,3')
+    parser.add_argument('--tops', default='1-8')
+    parser.add_argument('--min-counts', default='1,2,3,5')
+    parser.add_argument('--windows', default='500,1000,2000,5000')
+    parser.add_argument('--block', type=int, default=10, help="jeux entre deux recalculs des règles (analyse planifiée)")
+    parser.add_argument('--no-static', action='store_true', help="n'évalue pas les règles statiques")
+    parser.add_argument('--limit', type=int, default=20, help="lignes affichées")
+    parser.add_argument('--verify', type=int, default=0, help="rejoue exactement les N meilleures avec backtest.py")
+    parser.add_argument('--json', action='store_true', help="sortie JSON (toutes les configurations)")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("❌ NumPy est requis pour sweep.py : pip install numpy", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    games = load_games(args.path)
+    loaded = time.perf_counter()
+    rows = sweep(games, _int_list(args.offsets), _int_list(args.tops), _int_list(args.min_counts),
+                 _int_list(args.windows), args.block, not args.no_static)
+    elapsed = time.perf_counter() - loaded
+    for row in rows[:args.verify]:
+        cp = make_predictor(row['mode'], row['top'] or 8, row['offset'], window=row['window'] or 2000,
+                            min_count=row['min_count'] or 1)
+        row['backtest'] = run_backtest(read_posts(args.path), cp, args.block)
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return 0
+    print(f"🔎 {len(rows)} configurations sur {len(games['numbers'])} jeux "
+          f"(lecture {loaded - started:.2f} s, balayage {elapsed:.2f} s)")
+    print(format_table(rows, args.limit))
+    for i, row in enumerate(rows[:args.verify], 1):
+        bt = row['backtest']
+        print(f"🧪 #{i} rejoué : {bt['predictions']} prédictions, ✅ {bt['won']} ❌ {bt['lost']} "
+              f"({bt['win_rate']:.1f}%)")
+    if rows:
+        print(f"⚙️ Meilleure configuration : {config_env(rows[0])}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# telegram_client.py
+
+"""
+Client HTTP unique pour l'API Telegram : pool de connexions keep-alive,
+timeouts configurables et statistiques de latence par méthode.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import STAGE_SECONDS, TELEGRAM_ERRORS
+from tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.telegram.org"
+
+
+class TelegramClient:
+    """
+    Session requests partagée par bot.py, handlers.py et main.py.
+    TELEGRAM_API_URL permet de pointer vers un serveur local de substitution (tests).
+    """
+
+    def __init__(self, token: str, api_url: Optional[str] = None, pool_size: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.token = token
+        self.api_url = (api_url or os.getenv('TELEGRAM_API_URL') or DEFAULT_API_URL).rstrip('/')
+        self.base_url = f"{self.api_url}/bot{token}"
+        self.pool_size = pool_size or int(os.getenv('TELEGRAM_POOL_SIZE') or 10)
+        self.timeout = timeout or float(os.getenv('TELEGRAM_TIMEOUT') or 10)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def request(self, method: str, json: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
+                files: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                http_method: str = 'POST') -> requests.Response:
+        """Appelle une méthode de l'API Bot et renvoie la réponse brute (lève en cas d'erreur réseau)"""
+        url = f"{self.base_url}/{method}"
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(http_method, url, json=json, data=data, files=files,
+                                            timeout=timeout or self.timeout)
+            ok = response.status_code == 200
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            # Span seulement si l'appel part du thread d'une trace (pas des workers d'envoi)
+            TRACER.span(f'telegram:{method}', started, elapsed)
+            self._record(method, elapsed, ok)
+
+    def post(self, method: str, **kwargs) -> requests.Response:
+        return self.request(method, http_method='POST', **kwargs)
+
+    def get(self, method: str, **kwargs) -> requests.Response:
+        return self.request(method, http_method='GET', **kwargs)
+
+    def _record(self, method: str, elapsed: float, ok: bool):
+        if method != 'getUpdates': # attente du long polling, pas une latence
+            STAGE_SECONDS.observe(elapsed, 'telegram')
+        if not ok:
+            TELEGRAM_ERRORS.inc(1, method)
+        with self._stats_lock:
+            s = self._stats.get(method)
+            if s is None:
+                s = self._stats[method] = {'calls': 0, 'errors': 0, 'total_s': 0.0, 'max_s': 0.0}
+            s['calls'] += 1
+            s['total_s'] += elapsed
+            if elapsed > s['max_s']:
+                s['max_s'] = elapsed
+            if not ok:
+                s['errors'] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Latence par méthode de l'API (moyenne / max en ms)"""
+        with self._stats_lock:
+            return {
+                method: {
+                    'calls': int(s['calls']),
+                    'errors': int(s['errors']),
+                    'avg_ms': round(s['total_s'] / s['calls'] * 1000, 2) if s['calls'] else 0.0,
+                    'max_ms': round(s['max_s'] * 1000, 2),
+                }
+                for method, s in self._stats.items()
+            }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,40 @@
+# tests/conftest.py
+
+"""
+Fixtures communes : racine du dépôt et bench/ importables, état du bot écrit
+dans un dossier temporaire, journal de jeux généré (bench/generator.py).
+"""
+import os
+import sys
+import logging
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+# Réglages lus depuis l'environnement par config.Config : les valeurs par défaut servent de référence
+SETTINGS = ('STORAGE_BACKEND', 'SQLITE_PATH', 'INTER_WINDOW_SIZE', 'INTER_WINDOW_MAX_AGE', 'RULE_HALF_LIFE',
+            'LIVE_RULES', 'TRIGGER_OFFSET', 'TOP_RULES_PER_SUIT', 'MIN_RULE_COUNT', 'PATTERN_MAX_OFFSET',
+            'AUTO_RELATION', 'MIN_RELATION_TRIALS', 'DEDUP_SIZE', 'DEDUP_TTL')
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Les fichiers d'état (snapshot, journal, base SQLite) sont relatifs au dossier courant"""
+    for name in SETTINGS:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.chdir(tmp_path)
+    logging.disable(logging.CRITICAL)
+    yield tmp_path
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture(scope='session')
+def game_log():
+    """(message_id, texte, est un edit) de 800 jeux générés, avec éditions et un changement de cycle"""
+    from backtest import _record_from_object
+    from generator import generate_updates
+    updates = generate_updates(800, seed=3, edit_ratio=0.5, duplicate_ratio=0.0, wrap=700)
+    return [_record_from_object(u)[:3] for u in updates]
@@ -0,0 +1,63 @@
+# tests/test_backtest.py
+
+import pytest
+
+from backtest import run_backtest
+from card_predictor import CardPredictor
+from rule_stats import TriggerStats
+
+from test_rule_stats import rescan
+
+# Durées de la mesure : seules valeurs d'un rapport qui varient d'une exécution à l'autre
+TIMINGS = ('elapsed_s', 'posts_per_s')
+
+
+def report(game_log, cp):
+    return {k: v for k, v in run_backtest(game_log, cp).items() if k not in TIMINGS}
+
+
+@pytest.fixture
+def baseline(game_log):
+    return report(game_log, CardPredictor(persist=False))
+
+
+def test_replay_is_deterministic(game_log, baseline):
+    assert baseline['games'] == 800
+    assert baseline['cycles'] == 1 # numérotation repartie à 1 après le jeu 700
+    assert baseline['predictions'] > 0 and baseline['won'] > 0
+    assert report(game_log, CardPredictor(persist=False)) == baseline
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_persisted_predictor_matches_memory(game_log, baseline, monkeypatch, backend):
+    monkeypatch.setenv('STORAGE_BACKEND', backend)
+    assert report(game_log, CardPredictor()) == baseline
+
+
+def test_rules_match_rescan_at_every_analysis(game_log, baseline):
+    cp = CardPredictor(persist=False)
+    analyze = cp.analyze_and_set_smart_rules
+    analyses = []
+
+    def checked():
+        assert cp._sync_trigger_stats().ranked_rules() == rescan(cp.inter_data)
+        analyses.append(len(cp.inter_data))
+        return analyze()
+
+    cp.analyze_and_set_smart_rules = checked
+    assert report(game_log, cp) == baseline
+    assert len(analyses) == 80
+
+
+def test_rebuilt_counters_give_same_report(game_log, baseline):
+    """Compteurs recalculés depuis la fenêtre avant chaque analyse (chemin d'origine)"""
+    cp = CardPredictor(persist=False)
+    analyze = cp.analyze_and_set_smart_rules
+
+    def from_scratch():
+        cp.trigger_stats = TriggerStats()
+        cp.trigger_stats.rebuild(cp.inter_data)
+        return analyze()
+
+    cp.analyze_and_set_smart_rules = from_scratch
+    assert report(game_log, cp) == baseline
@@ -0,0 +1,54 @@
+# tests/test_card_codec.py
+
+from card_codec import (SUITS, VALUES, NUM_CARDS, encode_card, decode_card, suit_code, decode_suit,
+                        card_suit_code, build_rule_table)
+from message_parser import parse_message
+
+
+def normalize_card(card):
+    """Normalisation texte d'origine : cœur en ♥️, sélecteur de variante ajouté"""
+    card = card.replace('❤️', '♥️').replace('❤', '♥️')
+    return card if card.endswith('️') else card + '️'
+
+
+def test_every_card_round_trips():
+    codes = set()
+    for value in VALUES:
+        for suit in SUITS:
+            code = encode_card(value + suit)
+            assert decode_card(code) == value + suit
+            assert decode_suit(card_suit_code(code)) == suit
+            codes.add(code)
+    assert codes == set(range(NUM_CARDS))
+
+
+def test_emoji_variants_match_text_normalization():
+    for value in VALUES:
+        for suit in ('♠️', '♠', '♥️', '♥', '❤️', '❤', '♦️', '♦', '♣️', '♣'):
+            card = value + suit
+            assert decode_card(encode_card(card)) == normalize_card(card)
+            assert decode_suit(suit_code(suit)) == normalize_card(suit)
+    assert encode_card('10 ♥️') == encode_card('10♥️')
+    assert encode_card('k♣️') == encode_card('K♣️')
+
+
+def test_unreadable_cards():
+    assert encode_card('') is None
+    assert encode_card('11♠️') is None
+    assert encode_card('A') is None
+    assert suit_code('') is None
+    assert suit_code('X') is None
+
+
+def test_parser_codes_match_cards():
+    game = parse_message("#N12. ✅5(10♥️A❤️4♦️) - 3(K♠️3♣️) #T8")
+    assert game.first_group_cards == ('10♥️', 'A♥️', '4♦️')
+    assert game.first_group_codes == tuple(encode_card(c) for c in game.first_group_cards)
+    assert game.first_group_suits == ('♥️', '♥️', '♦️')
+
+
+def test_rule_table_keeps_best_rank():
+    table = build_rule_table([('A♠️', '♥️', 3), ('A♠', '♣️', 1), ('K❤️', '♦️', 0), ('??', '♠️', 0)])
+    assert table[encode_card('A♠️')] == (1, suit_code('♣️'))
+    assert table[encode_card('K♥️')] == (0, suit_code('♦️'))
+    assert sum(1 for entry in table if entry is not None) == 2
@@ -0,0 +1,95 @@
+# tests/test_cluster.py
+
+import os
+import time
+import hashlib
+
+import pytest
+
+from card_predictor import CardPredictor
+from cluster import ClusterCoordinator, LeaderLease, SharedInbox
+
+from test_ki_refresh import pending
+from test_storage import plain, replay
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_inbox_is_shared_and_fifo():
+    worker_a, worker_b = SharedInbox(), SharedInbox() # même fichier, comme deux workers
+    for update_id in range(5):
+        (worker_a if update_id % 2 else worker_b).put({'update_id': update_id})
+    batch = worker_a.peek()
+    assert [u['update_id'] for _, u in batch] == list(range(5))
+    worker_a.ack(batch[0][0])
+    assert worker_b.depth() == 4 and worker_b.peek(1)[0][1] == {'update_id': 1}
+
+
+def test_only_one_lease_holder():
+    first, second = LeaderLease(), LeaderLease()
+    assert first.try_acquire() and first.try_acquire()
+    assert not second.try_acquire() and not second.is_leader
+    assert open('leader.lock').read() == str(os.getpid())
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_follower_takes_over_and_resumes_the_inbox():
+    inbox = SharedInbox()
+    handled = {'leader': [], 'follower': []}
+    promoted = []
+
+    def coordinator(name):
+        def handler(update):
+            if update['update_id'] == 3:
+                raise ValueError('update illisible')
+            handled[name].append(update['update_id'])
+        return ClusterCoordinator(inbox, LeaderLease(), handler, on_promote=lambda: promoted.append(name),
+                                  poll_interval=0.01, election_interval=0.02)
+
+    leader = coordinator('leader')
+    leader.start()
+    wait_for(lambda: leader.lease.is_leader)
+    follower = coordinator('follower')
+    follower.start()
+    for update_id in range(5):
+        inbox.put({'update_id': update_id})
+    wait_for(lambda: inbox.depth() == 0)
+    assert handled['leader'] == [0, 1, 2, 4] and leader.errors == 1 # l'update en erreur est quand même acquittée
+    assert not follower.lease.is_leader and handled['follower'] == []
+    leader.stop()
+    wait_for(lambda: follower.lease.is_leader)
+    inbox.put({'update_id': 5})
+    wait_for(lambda: handled['follower'] == [5])
+    assert promoted == ['leader', 'follower'] and follower.stats()['processed'] == 1
+    follower.stop()
+
+
+def state_files():
+    """Contenu des fichiers d'état (hors index -shm, que SQLite met à jour même pour un lecteur)"""
+    return {name: hashlib.md5(open(name, 'rb').read()).hexdigest()
+            for name in sorted(os.listdir('.')) if os.path.isfile(name) and not name.endswith('-shm')}
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_read_only_follower_writes_nothing_until_reload(game_log, monkeypatch, backend):
+    monkeypatch.setenv('STORAGE_BACKEND', backend)
+    leader = replay(game_log, 200)
+    before = state_files()
+    follower = CardPredictor(read_only=True)
+    assert follower.state_loaded and plain(follower._export_state()) == plain(leader._export_state())
+    pending(follower, 9000, 77)
+    follower._save_all_data(force_snapshot=True)
+    assert state_files() == before
+    # Promotion : état relu, puis le nouveau leader écrit à la suite de l'ancien
+    follower.reload_state()
+    assert '9000' not in follower.predictions
+    pending(follower, 9001, 78)
+    follower._save_all_data()
+    assert '9001' in CardPredictor(read_only=True).predictions
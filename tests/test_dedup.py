@@ -0,0 +1,63 @@
+# tests/test_dedup.py
+
+from dedup import UpdateDeduplicator, game_fingerprint
+from message_parser import parse_message
+
+CHAT = -1002682552255
+
+
+def test_update_marked_only_after_processing():
+    dedup = UpdateDeduplicator(maxsize=10, ttl=60)
+    assert not dedup.is_duplicate_update(1)
+    # Pas encore marquée : une relivraison (traitement en échec) est retraitée
+    assert not dedup.is_duplicate_update(1)
+    dedup.mark_update(1)
+    assert dedup.is_duplicate_update(1)
+    assert not dedup.is_duplicate_update(None)
+    assert dedup.stats()['duplicate_updates'] == 1
+
+
+def test_same_text_is_duplicate_post():
+    dedup = UpdateDeduplicator()
+    text = "#N12. ✅5(10♥️A❤️4♦️) - 3(K♠️3♣️) #T8"
+    assert not dedup.is_duplicate_post(CHAT, 7, text)
+    dedup.mark_post(CHAT, 7, parse_message(text))
+    assert dedup.is_duplicate_post(CHAT, 7, text)
+    assert not dedup.is_duplicate_post(CHAT, 8, text)
+    assert not dedup.is_duplicate_post(CHAT, 7, text + ' ')
+
+
+def test_fingerprint_covers_every_field_the_predictor_reads():
+    dedup = UpdateDeduplicator()
+    posted = parse_message("#N12. ⏰5(10♥️A❤️) - 3(K♠️3♣️) #T8")
+    dedup.mark_post(CHAT, 7, posted)
+    # Même jeu, texte différent hors des champs analysés : edit sans effet
+    assert dedup.is_unchanged_game(CHAT, 7, parse_message("#N12. ⏰5(10♥️A♥️) - 4(K♠️4♣️) #T9"))
+    edits = [
+        "#N12. ⏰5(10♥️A❤️3♦️) - 3(K♠️3♣️) #T8",  # troisième carte du premier groupe
+        "#N12. ⏰5(J♥️A❤️) - 3(K♠️3♣️) #T8",      # première carte
+        "#N12. ⏰5(10♥️A♠️) - 3(K♠️3♣️) #T8",     # enseigne vérifiée
+        "#N12. ✅5(10♥️A❤️) - 3(K♠️3♣️) #T8",     # résultat final
+        "#N12. 🔰5(10♥️A❤️) - 3(K♠️3♣️) #T8",     # bouclier
+        "#N13. ⏰5(10♥️A❤️) - 3(K♠️3♣️) #T8",     # numéro corrigé
+    ]
+    for text in edits:
+        game = parse_message(text)
+        assert game_fingerprint(game) != game_fingerprint(posted), text
+        assert not dedup.is_unchanged_game(CHAT, 7, game), text
+    assert dedup.stats()['unchanged_edits'] == 1
+
+
+def test_expired_entries_are_forgotten(monkeypatch):
+    import dedup as module
+    now = [1000.0]
+    monkeypatch.setattr(module.time, 'time', lambda: now[0])
+    dedup = UpdateDeduplicator(maxsize=2, ttl=60)
+    dedup.mark_update(1)
+    now[0] += 61
+    assert not dedup.is_duplicate_update(1)
+    for update_id in (2, 3, 4):
+        dedup.mark_update(update_id)
+    # Taille bornée : la plus ancienne sort
+    assert not dedup.is_duplicate_update(2)
+    assert dedup.is_duplicate_update(4)
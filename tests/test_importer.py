@@ -0,0 +1,79 @@
+# tests/test_importer.py
+
+import os
+import json
+
+import pytest
+
+from backtest import read_posts, read_records, run_backtest
+from card_predictor import CardPredictor
+from generator import generate_updates
+from importer import collect_history, load_into, main
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """900 jeux avec éditions, updates relivrées et un changement de cycle après le jeu 700"""
+    path = tmp_path / 'export.jsonl'
+    with open(path, 'w', encoding='utf-8') as f:
+        for update in generate_updates(900, seed=3, edit_ratio=0.5, duplicate_ratio=0.05, wrap=700):
+            f.write(json.dumps(update, ensure_ascii=False) + '\n')
+    return str(path)
+
+
+def pairs(cp):
+    """Paires (jeu, jeu déclencheur, carte, enseigne) de la fenêtre, sans leur date"""
+    return [row[:4] for row in cp.inter_data.rows()]
+
+
+def collected_from(path):
+    collected = CardPredictor(persist=False)
+    return collected, collect_history(read_records(path), collected)
+
+
+def test_collects_like_the_live_bot(log_path):
+    collected, report = collected_from(log_path)
+    assert report['games'] == 900 and report['cycles'] == 1 and report['duplicates'] > 0
+    live = CardPredictor(persist=False)
+    run_backtest(read_posts(log_path), live)
+    assert pairs(collected) == pairs(live) and report['pairs'] == len(live.inter_data)
+    assert collected.sequential_history.keys() == live.sequential_history.keys()
+
+
+def test_imported_pairs_precede_live_ones(log_path, monkeypatch):
+    monkeypatch.setenv('INTER_WINDOW_SIZE', '500')
+    collected, _ = collected_from(log_path)
+    target = CardPredictor()
+    live_records = list(read_records(log_path))[-40:]
+    collect_history(live_records, target)
+    live_pairs, live_history = pairs(target), dict(target.sequential_history)
+    saves = []
+    save = target._save_all_data
+    monkeypatch.setattr(target, '_save_all_data', lambda *a, **kw: saves.append(1) or save(*a, **kw))
+    load = load_into(target, collected)
+    assert len(saves) == 1 # une seule sauvegarde pour tout l'import
+    assert load['window'] == 500 and load['live_pairs'] == len(live_pairs)
+    assert load['imported_pairs'] == 500 - len(live_pairs) and load['history'] == 0
+    assert pairs(target) == pairs(collected)[-load['imported_pairs']:] + live_pairs
+    assert target.sequential_history == live_history # historique du live conservé
+    assert load['rules'] == len(target.smart_rules) > 0
+    reloaded = CardPredictor()
+    assert pairs(reloaded) == pairs(target) and reloaded.smart_rules == target.smart_rules
+
+
+def test_replace_drops_live_state(log_path):
+    collected, _ = collected_from(log_path)
+    target = CardPredictor()
+    collect_history(list(read_records(log_path))[:30], target)
+    load = load_into(target, collected, replace=True, rules=False)
+    assert load['live_pairs'] == 0 and load['rules'] == 0
+    assert pairs(target) == pairs(collected)
+    assert target.sequential_history == collected.sequential_history
+    assert pairs(CardPredictor()) == pairs(collected)
+
+
+def test_dry_run_writes_nothing(log_path, capsys):
+    before = sorted(os.listdir('.'))
+    assert main([log_path, '--dry-run', '--json']) == 0
+    assert json.loads(capsys.readouterr().out)['load'] == {}
+    assert sorted(os.listdir('.')) == before
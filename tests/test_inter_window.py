@@ -0,0 +1,58 @@
+# tests/test_inter_window.py
+
+import random
+
+from card_codec import NUM_CARDS, NUM_SUITS
+from inter_window import InterWindow, row_from_entry, entry_from_row
+
+
+def random_rows(count, seed=1):
+    rng = random.Random(seed)
+    return [(n, n - 2, rng.randrange(NUM_CARDS), rng.randrange(NUM_SUITS), 1700000000 + n * 60)
+            for n in range(1, count + 1)]
+
+
+def test_matches_bounded_list():
+    """Référence : liste de paires tronquée aux `capacity` plus récentes"""
+    window, reference = InterWindow(capacity=50), []
+    for row in random_rows(180):
+        evicted = window.add(*row)
+        reference.append(row)
+        expected = reference[:-50]
+        reference = reference[-50:]
+        assert evicted == expected
+        assert window.rows() == reference
+    assert len(window) == 50
+    assert window.tail(5) == reference[-5:]
+    assert window.appended == 180
+
+
+def test_evict_expired():
+    rows = random_rows(20)
+    window = InterWindow(capacity=100, max_age=300)
+    window.load(rows)
+    now = rows[-1][4]
+    evicted = window.evict_expired(now)
+    assert evicted == [r for r in rows if r[4] < now - 300]
+    assert window.rows() == [r for r in rows if r[4] >= now - 300]
+
+
+def test_remove_result_keeps_order():
+    rows = random_rows(30)
+    window = InterWindow(capacity=20)
+    window.load(rows)
+    generation = window.generation
+    assert window.remove_result(25) == [rows[24]]
+    assert window.rows() == [r for r in rows[-20:] if r[0] != 25]
+    assert window.remove_result(999) == []
+    assert window.generation > generation
+
+
+def test_dict_entries_round_trip():
+    rows = random_rows(10)
+    entries = [entry_from_row(r) for r in rows]
+    assert [row_from_entry(e) for e in entries] == rows
+    window = InterWindow(capacity=10)
+    window.load(entries)
+    assert window.rows() == rows
+    assert list(window) == entries
@@ -0,0 +1,87 @@
+# tests/test_ki_refresh.py
+
+import time
+
+import pytest
+
+from card_predictor import CardPredictor
+from handlers import TelegramHandlers
+from message_parser import parse_message
+from outbound import EditSuperseded, PRIORITY_KI, PRIORITY_VERIFY
+
+from test_outbound import RecordingClient, dispatcher_for
+
+TOKEN = '123456:test'
+WON = "#N20. ✅5(A♠️2♣️) - 3(K♠️3♣️) #T8"
+
+
+def pending(cp, num, message_id):
+    cp.add_prediction(num, {'game_num': num, 'predicted_costume': '♠️', 'message_id': message_id,
+                            'timestamp': time.time(), 'status': 'pending', 'ki_base': 0})
+
+
+def test_ki_results_ignore_verified_predictions():
+    cp = CardPredictor(persist=False)
+    pending(cp, 20, 12)
+    pending(cp, 21, 13)
+    assert cp.ingest(parse_message(WON), False)[0]['type'] == 'edit_message'
+    assert cp.predictions['20']['status'] == 'won'
+    # Réponses du rafraîchissement lancé avant la vérification
+    assert not cp.apply_ki_updates({'20': 3}, ['20'])
+    assert cp.predictions['20']['status'] == 'won' and 'last_updated_ki' not in cp.predictions['20']
+    assert cp.snapshot().won == 1
+    assert cp.apply_ki_updates({}, ['21'])
+    assert '21' not in cp.predictions and not cp.pending_predictions()
+
+
+@pytest.fixture
+def handlers():
+    client = RecordingClient()
+    # Un envoi par seconde et par chat : les éditions du ki attendent leur jeton
+    return TelegramHandlers(TOKEN, client=client, dispatcher=dispatcher_for(client, chat_rate=1, chat_burst=1,
+                                                                             workers=4))
+
+
+def ki_edit(handlers, key, message_id):
+    """Édition telle que la soumet update_pending_ki, avec la garde 'toujours en attente'"""
+    channel = handlers.state().prediction_channel_id
+    return handlers.send_message_async(channel, '🌀Statut :⏳', message_id=message_id, edit=True,
+                                       parse_mode='HTML', priority=PRIORITY_KI,
+                                       guard=lambda: handlers.is_pending(key))
+
+
+def verified_last(texts):
+    """Seule l'édition de vérification a atteint le message"""
+    return len(texts) == 1 and '✅' in texts[0] and '⏳' not in texts[0]
+
+
+def verify(handlers):
+    res, _ = handlers.actor.call(handlers.card_predictor.ingest, parse_message(WON), False)
+    return handlers.send_message_async(handlers.state().prediction_channel_id, res['new_message'],
+                                       message_id=res['message_id_to_edit'], edit=True, parse_mode='HTML',
+                                       priority=PRIORITY_VERIFY)
+
+
+def test_verification_edit_is_the_last_one_sent(handlers):
+    cp, client = handlers.card_predictor, handlers.client
+    handlers.actor.call(pending, cp, 20, 12)
+    handlers.send_message(handlers.state().prediction_channel_id, 'prédiction')
+    # Ki en attente du seau du chat, puis la vérification du même message
+    ki = ki_edit(handlers, '20', 12)
+    assert verify(handlers).result(5).status_code == 200
+    with pytest.raises(EditSuperseded):
+        ki.result(5)
+    assert verified_last(client.texts(12))
+
+
+def test_stale_ki_refresh_after_verification_is_dropped(handlers):
+    cp, client = handlers.card_predictor, handlers.client
+    handlers.actor.call(pending, cp, 20, 12)
+    # Copie des prédictions en attente prise par la tâche du ki avant la vérification
+    stale = handlers.actor.query(lambda: [k for k, _ in cp.pending_predictions()])
+    verify(handlers).result(5)
+    futures = [ki_edit(handlers, key, 12) for key in stale]
+    with pytest.raises(EditSuperseded):
+        futures[0].result(5)
+    assert verified_last(client.texts(12))
+    assert handlers.dispatcher.stats()['superseded'] == 1
@@ -0,0 +1,171 @@
+# tests/test_outbound.py
+
+import time
+import threading
+
+import pytest
+
+from outbound import (OutboundDispatcher, TokenBucket, EditSuperseded,
+                      PRIORITY_VERIFY, PRIORITY_NORMAL, PRIORITY_KI)
+
+CHAT = -1003554569009
+
+
+class Response:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload if payload is not None else {'ok': True, 'result': {'message_id': 1}}
+        self.text = str(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+class RecordingClient:
+    """Client Telegram de substitution : note chaque appel, réponses scriptées, blocage optionnel"""
+
+    base_url = 'http://telegram.invalid/bottest'
+
+    def __init__(self, responses=None):
+        self.calls = []
+        self.responses = list(responses or [])
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def post(self, method, json=None, **kwargs):
+        self.gate.wait(5)
+        with self._lock:
+            self.calls.append((time.monotonic(), method, dict(json)))
+            return self.responses.pop(0) if self.responses else Response()
+
+    def texts(self, message_id):
+        return [payload['text'] for _, method, payload in self.calls
+                if method == 'editMessageText' and payload.get('message_id') == message_id]
+
+
+def edit(dispatcher, message_id, text, priority):
+    payload = {'chat_id': CHAT, 'message_id': message_id, 'text': text}
+    return dispatcher.submit('editMessageText', payload, priority)
+
+
+def dispatcher_for(client, **kwargs):
+    settings = dict(global_rate=1000, chat_rate=1000, chat_burst=1000, workers=1, backoff_base=0.01)
+    settings.update(kwargs)
+    return OutboundDispatcher(client, **settings)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0
+    bucket.consume(now)
+    bucket.consume(now)
+    assert bucket.wait_time(now) == pytest.approx(0.1)
+    assert bucket.wait_time(now + 0.1) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_priority_order():
+    client = RecordingClient()
+    dispatcher = dispatcher_for(client)
+    client.gate.clear()
+    first = dispatcher.submit('sendMessage', {'chat_id': CHAT, 'text': 'premier'})
+    time.sleep(0.05) # le worker unique est bloqué sur le premier envoi
+    futures = [dispatcher.submit('sendMessage', {'chat_id': CHAT, 'text': name}, priority)
+               for name, priority in (('ki', PRIORITY_KI), ('normal', PRIORITY_NORMAL), ('verify', PRIORITY_VERIFY))]
+    client.gate.set()
+    for future in [first] + futures:
+        future.result(5)
+    assert [payload['text'] for _, _, payload in client.calls] == ['premier', 'verify', 'normal', 'ki']
+
+
+def test_chat_rate_limit():
+    client = RecordingClient()
+    dispatcher = dispatcher_for(client, chat_rate=10, chat_burst=1)
+    futures = [dispatcher.submit('sendMessage', {'chat_id': CHAT, 'text': str(i)}) for i in range(4)]
+    for future in futures:
+        future.result(5)
+    times = [t for t, _, _ in client.calls]
+    assert times[-1] - times[0] >= 0.25 # 1 jeton puis 10 par seconde
+
+
+def test_retry_after_429():
+    throttled = Response(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 0.3}})
+    client = RecordingClient([throttled])
+    dispatcher = dispatcher_for(client)
+    response = dispatcher.submit('sendMessage', {'chat_id': CHAT, 'text': 'x'}).result(5)
+    assert response.status_code == 200
+    assert len(client.calls) == 2
+    assert client.calls[1][0] - client.calls[0][0] >= 0.3
+    assert dispatcher.rate_limited == 1 and dispatcher.retries == 1
+
+
+def test_verify_edit_supersedes_queued_ki_edits():
+    """Ki en file derrière le seau du chat, puis vérification du message 12 : le texte vérifié reste"""
+    client = RecordingClient()
+    dispatcher = dispatcher_for(client, chat_rate=2, chat_burst=1, workers=4)
+    dispatcher.submit('sendMessage', {'chat_id': CHAT, 'text': 'prédiction'}).result(5)
+    ki = [edit(dispatcher, message_id, '⏳ ki', PRIORITY_KI) for message_id in (10, 11, 12)]
+    verify = edit(dispatcher, 12, '✅ vérifié', PRIORITY_VERIFY)
+    assert verify.result(5).status_code == 200
+    with pytest.raises(EditSuperseded):
+        ki[2].result(5)
+    for future in ki[:2]:
+        future.result(5)
+    assert client.texts(12) == ['✅ vérifié']
+    assert dispatcher.stats()['superseded'] == 1
+
+
+def test_lower_priority_edit_dropped_while_verify_pending_or_in_flight():
+    client = RecordingClient()
+    dispatcher = dispatcher_for(client, workers=2)
+    client.gate.clear()
+    verify = edit(dispatcher, 12, '✅ vérifié', PRIORITY_VERIFY)
+    time.sleep(0.05) # vérification en vol
+    with pytest.raises(EditSuperseded):
+        edit(dispatcher, 12, '⏳ ki', PRIORITY_KI).result(1)
+    client.gate.set()
+    verify.result(5)
+    assert client.texts(12) == ['✅ vérifié']
+
+
+def test_edits_of_one_message_never_overlap():
+    client = RecordingClient()
+    dispatcher = dispatcher_for(client, workers=4)
+    client.gate.clear()
+    ki = edit(dispatcher, 12, '⏳ ki', PRIORITY_KI)
+    time.sleep(0.05) # ki en vol : la vérification attend sa fin au lieu de partir en parallèle
+    verify = edit(dispatcher, 12, '✅ vérifié', PRIORITY_VERIFY)
+    time.sleep(0.05)
+    assert len(client.calls) == 0 and dispatcher.depth() == 1
+    client.gate.set()
+    ki.result(5)
+    verify.result(5)
+    assert client.texts(12) == ['⏳ ki', '✅ vérifié']
+
+
+def test_newer_edit_replaces_older_one():
+    client = RecordingClient()
+    dispatcher = dispatcher_for(client, chat_rate=1, chat_burst=1)
+    dispatcher.submit('sendMessage', {'chat_id': CHAT, 'text': 'prédiction'}).result(5)
+    older = edit(dispatcher, 12, '✅0️⃣', PRIORITY_VERIFY)
+    newer = edit(dispatcher, 12, '✅1️⃣', PRIORITY_VERIFY)
+    with pytest.raises(EditSuperseded):
+        older.result(5)
+    newer.result(5)
+    assert client.texts(12) == ['✅1️⃣']
+
+
+def test_throttled_ki_edit_does_not_come_back_after_verify():
+    throttled = Response(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 0.2}})
+    client = RecordingClient([throttled])
+    dispatcher = dispatcher_for(client, workers=2)
+    client.gate.clear()
+    ki = edit(dispatcher, 12, '⏳ ki', PRIORITY_KI)
+    time.sleep(0.05) # ki en vol, il recevra un 429
+    verify = edit(dispatcher, 12, '✅ vérifié', PRIORITY_VERIFY)
+    client.gate.set()
+    verify.result(5)
+    with pytest.raises(EditSuperseded):
+        ki.result(5)
+    assert client.texts(12) == ['⏳ ki', '✅ vérifié']
@@ -0,0 +1,101 @@
+# tests/test_pattern_index.py
+
+import random
+from collections import Counter, defaultdict
+
+from backtest import run_backtest
+from card_codec import NUM_CARDS, NUM_SUITS, card_suit_code, decode_card, decode_suit
+from card_predictor import CardPredictor
+from pattern_index import PatternIndex, pair_key, pair_name, trigger_keys
+
+
+def random_games(count, seed=1):
+    rng = random.Random(seed)
+    return [(n, tuple(rng.randrange(NUM_CARDS) for _ in range(rng.randint(1, 3)))) for n in range(1, count + 1)]
+
+
+def reference_rules(games, window, relation):
+    """Référence : recomptage complet des `window` derniers résultats pour une relation"""
+    offset, kind = relation
+    codes_by_game = dict(games)
+    rows = defaultdict(Counter)
+    for n, codes in games[-window:]:
+        if n - offset in codes_by_game:
+            for key in trigger_keys(codes_by_game[n - offset])[kind]:
+                rows[key][card_suit_code(codes[0])] += 1
+    rules = []
+    for key in sorted(rows):
+        counts = [rows[key][suit] for suit in range(NUM_SUITS)]
+        count = max(counts)
+        trigger = pair_name(key) if kind == 'pair' else decode_card(key)
+        rules.append({'trigger': trigger, 'predict': decode_suit(counts.index(count)), 'count': count,
+                      'total': sum(counts)})
+    rules.sort(key=lambda x: x['count'], reverse=True)
+    return rules
+
+
+def test_trigger_keys():
+    keys = trigger_keys((7, None, 3, 7))
+    assert keys == {'first': [7], 'any': [7, 3], 'pair': [pair_key(3, 7)]}
+    assert pair_key(3, 7) == pair_key(7, 3) and pair_name(pair_key(7, 3)) == f'{decode_card(3)}+{decode_card(7)}'
+
+
+def test_counts_match_full_recount():
+    index = PatternIndex(max_offset=3, capacity=150)
+    games = random_games(400)
+    for n, codes in games:
+        index.observe(n, codes, card_suit_code(codes[0]))
+    for relation in index.relations:
+        assert index.ranked_rules(relation) == reference_rules(games, 150, relation)
+
+
+def test_corrected_game_is_counted_once():
+    index = PatternIndex(max_offset=1, capacity=100)
+    games = random_games(50)
+    for n, codes in games:
+        index.observe(n, codes, card_suit_code(codes[0]))
+    # Édition du dernier jeu : son ancien résultat est décompté avant le nouveau
+    corrected = tuple((c + 1) % NUM_CARDS for c in games[-1][1])
+    index.observe(50, corrected, card_suit_code(corrected[0]))
+    games[-1] = (50, corrected)
+    assert index.ranked_rules((1, 'first')) == reference_rules(games, 100, (1, 'first'))
+    index.observe(50, corrected, card_suit_code(corrected[0])) # inchangé : ignoré
+    assert index.ranked_rules((1, 'first')) == reference_rules(games, 100, (1, 'first'))
+
+
+def test_best_relation_finds_the_planted_offset():
+    """L'enseigne du jeu N dépend de la valeur de la 1re carte de N-2 ; le reste est aléatoire"""
+    rng = random.Random(5)
+    index = PatternIndex(max_offset=3, capacity=300)
+    codes = {}
+    for n in range(1, 901):
+        first = rng.randrange(NUM_CARDS)
+        if n > 2:
+            first = first - card_suit_code(first) + (codes[n - 2][0] // NUM_SUITS) % NUM_SUITS
+        codes[n] = (first, rng.randrange(NUM_CARDS))
+        suits = [decode_suit(card_suit_code(c)) for c in codes[n]]
+        index.observe(n, codes[n], card_suit_code(first), suits)
+    assert index.best_relation(min_trials=100) == (2, 'first')
+    rows = {row['relation']: row for row in index.performance()}
+    assert rows[(2, 'first')]['rate'] > 0.95
+    # Évaluations décomptées avec les jeux sortis de la fenêtre
+    assert all(row['trials'] <= 300 for row in rows.values())
+    assert index.best_relation(min_trials=1000) is None
+    index.clear()
+    assert index.best_relation(min_trials=0) == (1, 'first') and not index.ranked_rules((2, 'first'))
+
+
+def test_auto_relation_drives_smart_rules(game_log, monkeypatch):
+    monkeypatch.setenv('AUTO_RELATION', 'true')
+    monkeypatch.setenv('MIN_RELATION_TRIALS', '50')
+    cp = CardPredictor()
+    run_backtest(game_log[:400], cp)
+    cp.analyze_and_set_smart_rules()
+    relation = cp.patterns.best_relation(50)
+    assert relation is not None and cp.active_relation == relation
+    assert cp.smart_rules == cp.patterns.ranked_rules(relation)
+    # Redémarrage : index vide, la relation et les règles persistées sont gardées
+    reloaded = CardPredictor()
+    reloaded.analyze_and_set_smart_rules()
+    assert reloaded.active_relation == relation
+    assert [r['trigger'] for r in reloaded.smart_rules] == [r['trigger'] for r in cp.smart_rules]
@@ -0,0 +1,136 @@
+# tests/test_polling.py
+
+import pytest
+
+from backtest import _record_from_object
+from card_predictor import CardPredictor
+from fake_telegram import FakeTelegram
+from generator import generate_updates
+from handlers import TelegramHandlers
+from message_parser import parse_message
+from outbound import OutboundDispatcher
+from poller import UpdatePoller
+from storage import PersistError
+from telegram_client import TelegramClient
+
+TOKEN = '123456:test'
+
+
+@pytest.fixture
+def telegram():
+    fake = FakeTelegram()
+    url = fake.start()
+    yield fake, TelegramClient(TOKEN, api_url=url)
+    fake.stop()
+
+
+@pytest.fixture
+def handlers(telegram):
+    _, client = telegram
+    dispatcher = OutboundDispatcher(client, global_rate=1000, chat_rate=1000, chat_burst=1000)
+    return TelegramHandlers(TOKEN, client=client, dispatcher=dispatcher)
+
+
+def make_poller(telegram, handlers):
+    return UpdatePoller(telegram[1], handlers.handle_batch, limit=40, timeout=0)
+
+
+def drain(poller):
+    while poller.poll_once():
+        pass
+
+
+def pairs(cp):
+    """Paires INTER sans leur date (horloge réelle d'un côté, simulée de l'autre)"""
+    return [row[:4] for row in cp.inter_data.rows()]
+
+
+def sequential(updates):
+    """Référence : chaque post distinct ingéré un par un, sans lot ni dédoublonnage"""
+    cp = CardPredictor(persist=False)
+    seen = set()
+    for update in updates:
+        if update['update_id'] in seen:
+            continue
+        seen.add(update['update_id'])
+        cp.ingest(parse_message(_record_from_object(update)[1]), False)
+    return cp
+
+
+def test_offset_confirms_processed_batches(telegram, handlers):
+    fake, _ = telegram
+    updates = list(generate_updates(150, seed=5, duplicate_ratio=0.1))
+    fake.push_updates(updates)
+    poller = make_poller(telegram, handlers)
+    drain(poller)
+    assert poller.offset == updates[-1]['update_id'] + 1
+    assert fake.pending_updates() == 0 and fake.confirmed_offset == poller.offset
+    assert poller.updates == len(updates)
+    stats = handlers.dedup.stats()
+    assert stats['duplicate_updates'] == len(updates) - len({u['update_id'] for u in updates})
+    assert pairs(handlers.card_predictor) == pairs(sequential(updates))
+
+
+def test_failed_save_keeps_offset_and_batch_is_redelivered(telegram, handlers):
+    fake, _ = telegram
+    updates = list(generate_updates(20, seed=6, duplicate_ratio=0.0))
+    fake.push_updates(updates)
+    store = handlers.card_predictor._store
+    append = store.append
+    failing = [True]
+
+    def flaky(ops):
+        if failing[0]:
+            raise OSError('disque plein')
+        append(ops)
+
+    store.append = flaky
+    poller = make_poller(telegram, handlers)
+    with pytest.raises(PersistError):
+        poller.poll_once()
+    assert poller.offset is None and poller.updates == 0
+    # Rien marqué traité : la relivraison refait tout le lot
+    assert handlers.dedup.stats()['tracked_updates'] == 0
+    failing[0] = False
+    drain(poller)
+    assert poller.offset == updates[-1]['update_id'] + 1
+    assert handlers.dedup.stats()['tracked_updates'] == len(updates)
+    # Le snapshot de resynchronisation rattrape le delta perdu
+    assert pairs(CardPredictor()) == pairs(handlers.card_predictor) == pairs(sequential(updates))
+
+
+def test_failed_game_does_not_stop_the_batch(telegram, handlers, monkeypatch):
+    fake, _ = telegram
+    updates = list(generate_updates(10, seed=7, edit_ratio=0.0, duplicate_ratio=0.0))
+    cp = handlers.card_predictor
+    ingest = cp.ingest
+
+    def failing_on_five(game, allow_prediction):
+        if game.game_number == 5:
+            raise ValueError('jeu illisible')
+        return ingest(game, allow_prediction)
+
+    monkeypatch.setattr(cp, 'ingest', failing_on_five)
+    fake.push_updates(updates)
+    drain(make_poller(telegram, handlers))
+    assert 5 not in cp.collected_games
+    assert cp.collected_games == set(range(1, 11)) - {5}
+    failed_update = updates[4]['update_id']
+    # Le jeu en échec n'est pas marqué traité : une relivraison le retraitera
+    assert not handlers.dedup.is_duplicate_update(failed_update)
+    assert handlers.dedup.is_duplicate_update(updates[5]['update_id'])
+
+
+def test_redelivery_after_crash_is_skipped(telegram, handlers):
+    fake, _ = telegram
+    updates = list(generate_updates(30, seed=8, duplicate_ratio=0.0))
+    fake.push_updates(updates)
+    drain(make_poller(telegram, handlers))
+    before = pairs(handlers.card_predictor)
+    # Offset perdu (crash avant confirmation) : Telegram relivre tout
+    fake.push_updates(updates)
+    poller = make_poller(telegram, handlers)
+    drain(poller)
+    assert poller.updates == len(updates)
+    assert handlers.dedup.stats()['duplicate_updates'] == len(updates)
+    assert pairs(handlers.card_predictor) == before
@@ -0,0 +1,69 @@
+# tests/test_predictor_actor.py
+
+import threading
+
+import pytest
+
+from card_predictor import CardPredictor
+from predictor_actor import PredictorActor
+
+from test_ki_refresh import pending
+
+
+@pytest.fixture
+def actor():
+    return PredictorActor(CardPredictor(persist=False))
+
+
+def test_mutations_publish_a_new_snapshot(actor):
+    cp = actor.predictor
+    first = actor.snapshot()
+    assert first.version == 0 and first.pending == 0
+    actor.call(pending, cp, 20, 12)
+    snap = actor.snapshot()
+    assert snap.version == 1 and snap.pending == 1 and snap.pending_keys == {'20'}
+    # L'ancien instantané reste tel quel et les nouveaux sont en lecture seule
+    assert first.pending == 0 and not first.pending_keys
+    with pytest.raises(TypeError):
+        snap.recent_predictions[0][1]['status'] = 'won'
+    assert actor.submit(cp.set_inter_mode, True).result(5) is None
+    assert actor.snapshot().version == 2 and actor.snapshot().is_inter_mode_active
+
+
+def test_query_reads_live_state_without_publishing(actor):
+    cp = actor.predictor
+    actor.call(pending, cp, 20, 12)
+    assert actor.query(lambda: sorted(cp._pending_keys)) == ['20']
+    assert actor.snapshot().version == 1 and actor.stats()['version'] == 1
+
+
+def test_commands_run_one_at_a_time_in_order(actor):
+    seen, running = [], []
+
+    def command(i):
+        running.append(threading.current_thread().name)
+        seen.append(i)
+
+    futures = [actor.submit(command, i) for i in range(200)]
+    for future in futures:
+        future.result(5)
+    assert seen == list(range(200)) and set(running) == {'predictor-writer'}
+    assert actor.stats()['commands'] == 200 and actor.snapshot().version == 200
+
+
+def test_nested_call_runs_on_the_writer(actor):
+    def outer():
+        return actor.call(lambda: threading.current_thread().name)
+
+    assert actor.call(outer, timeout=5) == 'predictor-writer'
+    assert actor.snapshot().version == 2
+
+
+def test_failing_command_reaches_the_caller(actor):
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        actor.call(fail, timeout=5)
+    assert actor.stats()['errors'] == 1
+    assert actor.call(lambda: 'ok') == 'ok'
@@ -0,0 +1,89 @@
+# tests/test_rule_stats.py
+
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import pytest
+
+from card_predictor import CardPredictor
+from config import Config
+from message_parser import parse_message
+from rule_stats import TriggerStats, format_count
+
+
+def rescan(entries):
+    """Classement d'origine : relecture complète de inter_data à chaque analyse"""
+    by_trigger = defaultdict(Counter)
+    for entry in entries:
+        by_trigger[entry['declencheur']][entry['result_suit']] += 1
+    rules = []
+    for trigger, results in by_trigger.items():
+        suit, count = results.most_common(1)[0]
+        rules.append({'trigger': trigger, 'predict': suit, 'count': count, 'total': sum(results.values())})
+    rules.sort(key=lambda rule: rule['count'], reverse=True)
+    return rules
+
+
+def small_window_predictor(monkeypatch, size=60):
+    monkeypatch.setenv('INTER_WINDOW_SIZE', str(size))
+    return CardPredictor(persist=False, config=Config.predictor())
+
+
+def test_live_counters_match_rescan(game_log, monkeypatch):
+    cp = small_window_predictor(monkeypatch)
+    checked = 0
+    for _, text, _ in game_log:
+        game = parse_message(text)
+        if not game.game_number:
+            continue
+        cp.collect_inter_data(game.game_number, game)
+        assert cp._sync_trigger_stats().ranked_rules() == rescan(cp.inter_data)
+        checked += 1
+    assert checked == len(game_log)
+    assert len(cp.inter_data) == 60 # la fenêtre a évincé des paires
+
+
+def test_corrections_match_rescan(monkeypatch):
+    cp = small_window_predictor(monkeypatch)
+    cards = ['A♠️', '7♥️', 'K♦️', '3♣️', 'A♠️', '7♦️', 'K♦️', '3♠️']
+    for number in range(1, 40):
+        card = cards[number % len(cards)]
+        cp.collect_inter_data(number, parse_message(f"#N{number}. ✅5({card}2♣️) - 3(K♠️3♣️) #T8"))
+    for number in (10, 20, 30):
+        # Édition du jeu avec une autre première carte : l'ancienne paire est retirée
+        cp.collect_inter_data(number, parse_message(f"#N{number}. ✅5(Q❤️2♣️) - 3(K♠️3♣️) #T8"))
+        assert cp._sync_trigger_stats().ranked_rules() == rescan(cp.inter_data)
+
+
+def test_decayed_counts():
+    half_life = 600
+    stats = TriggerStats(half_life=half_life)
+    events = [('A♠️', '♥️', 0), ('A♠️', '♥️', 300), ('A♠️', '♣️', 600), ('K♦️', '♥️', 900)]
+    for trigger, suit, ts in events:
+        stats.add(trigger, suit, ts)
+    now = 1200
+    counts = stats.current_counts(now)
+    expected = defaultdict(float)
+    for trigger, suit, ts in events:
+        expected[trigger, suit] += 0.5 ** ((now - ts) / half_life)
+    for (trigger, suit), value in expected.items():
+        assert counts[trigger][suit] == pytest.approx(value, abs=0.01)
+    # Retrait de la plus ancienne paire (éviction) : son poids décru exactement
+    stats.remove('A♠️', '♥️', 0)
+    assert stats.current_counts(now)['A♠️']['♥️'] == pytest.approx(expected['A♠️', '♥️'] - 0.25, abs=0.01)
+    stats.remove('A♠️', '♥️', 300)
+    assert '♥️' not in stats.current_counts(now)['A♠️']
+
+
+def test_rebuild_matches_incremental():
+    entries = [{'declencheur': t, 'result_suit': s, 'date': datetime.fromtimestamp(1700000000 + i).isoformat()}
+               for i, (t, s) in enumerate([('A♠️', '♥️'), ('K♦️', '♣️'), ('A♠️', '♣️'), ('K♦️', '♣️')])]
+    stats = TriggerStats()
+    stats.rebuild(entries)
+    assert stats.ranked_rules() == rescan(entries)
+
+
+def test_format_count():
+    assert format_count(3) == '3'
+    assert format_count(3.0) == '3'
+    assert format_count(2.46) == '2.5'
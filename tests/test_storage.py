@@ -0,0 +1,88 @@
+# tests/test_storage.py
+
+import json
+
+import pytest
+
+from backtest import run_backtest
+from card_predictor import CardPredictor
+from storage import JournalStore, SqliteStore, PersistError
+
+
+def plain(state):
+    """Forme JSON (tuples en listes) pour comparer un état exporté et un état relu"""
+    return json.loads(json.dumps(state, ensure_ascii=False))
+
+
+def replay(game_log, count=300):
+    cp = CardPredictor()
+    report = run_backtest(game_log[:count], cp)
+    assert report['predictions'] > 0
+    return cp
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_state_round_trip(game_log, monkeypatch, backend):
+    monkeypatch.setenv('STORAGE_BACKEND', backend)
+    cp = replay(game_log)
+    reloaded = CardPredictor()
+    assert reloaded.state_loaded
+    assert plain(reloaded._export_state()) == plain(cp._export_state())
+    assert len(reloaded.inter_data) == len(cp.inter_data) > 0
+    assert [k for k, _ in reloaded.pending_predictions()] == [k for k, _ in cp.pending_predictions()]
+
+
+def test_sqlite_snapshot_keeps_one_row_per_prediction(game_log, monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    cp = replay(game_log)
+    statuses = [p['status'] for p in cp.predictions.values()]
+    expected = {status: statuses.count(status) for status in ('won', 'lost', 'pending')}
+    assert cp._store.prediction_stats() == expected
+    for _ in range(3):
+        cp._save_all_data(force_snapshot=True)
+    assert cp._store.prediction_stats() == expected
+    rows = cp._store._conn().execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+    assert rows == len(cp.predictions)
+    # Prédictions retirées de l'état : archivées, toujours comptées dans les bilans
+    cp.reset_state()
+    assert cp._store.load()['predictions'] == {}
+    assert cp._store.prediction_stats() == expected
+
+
+def test_memory_only_predictor_has_no_stats():
+    cp = CardPredictor(persist=False)
+    assert cp.report_stats() is None
+
+
+def test_sqlite_counts_written_bytes(game_log, monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    cp = replay(game_log, 50)
+    assert isinstance(cp._store, SqliteStore)
+    written = cp._store.bytes_written
+    assert isinstance(written, int) and written > 0
+    cp._save_all_data(force_snapshot=True)
+    assert cp._store.bytes_written > written
+
+
+def test_failed_save_resyncs_with_snapshot(game_log):
+    cp = replay(game_log, 100)
+    assert isinstance(cp._store, JournalStore)
+    append = cp._store.append
+    failing = [True]
+
+    def flaky(ops):
+        if failing[0]:
+            raise OSError('disque plein')
+        append(ops)
+
+    cp._store.append = flaky
+    # Sauvegarde en échec : le delta est perdu, la suivante doit réécrire tout l'état
+    cp.collect_inter_data(390, '#N390. ✅5(A♠️2♣️) - 3(K♠️3♣️) #T8')
+    assert cp._resync
+    with pytest.raises(PersistError) as failure:
+        cp.ingest_batch([(cp.parse('#N391. ✅5(K♠️2♣️) - 3(K♠️3♣️) #T8'), False)])
+    assert len(failure.value.results) == 1
+    failing[0] = False
+    cp._save_all_data()
+    assert not cp._resync
+    assert plain(CardPredictor()._export_state()) == plain(cp._export_state())
@@ -0,0 +1,50 @@
+# tests/test_telegram_client.py
+
+import pytest
+
+from fake_telegram import FakeTelegram
+from telegram_client import TelegramClient
+
+TOKEN = '123456:test'
+
+
+@pytest.fixture
+def fake():
+    fake = FakeTelegram()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+def test_api_url_from_environment(monkeypatch):
+    monkeypatch.setenv('TELEGRAM_API_URL', 'http://127.0.0.1:9/')
+    monkeypatch.setenv('TELEGRAM_POOL_SIZE', '3')
+    client = TelegramClient(TOKEN)
+    assert client.base_url == f'http://127.0.0.1:9/bot{TOKEN}'
+    assert client.pool_size == 3 and client.timeout == 10
+
+
+def test_calls_reuse_one_keep_alive_connection(fake):
+    client = TelegramClient(TOKEN, api_url=fake.url)
+    for i in range(5):
+        response = client.post('sendMessage', json={'chat_id': 1, 'text': str(i)})
+        assert response.json()['result']['message_id'] == i + 1
+    pools = client.session.get_adapter(fake.url).poolmanager.pools
+    assert len(pools) == 1
+    assert pools[next(iter(pools.keys()))].num_connections == 1
+    client.close()
+
+
+def test_latency_and_errors_per_method(fake):
+    client = TelegramClient(TOKEN, api_url=fake.url)
+    client.post('sendMessage', json={'chat_id': 1, 'text': 'x'})
+    fake.rate_429 = 1.0
+    assert client.post('editMessageText', json={'chat_id': 1, 'message_id': 1, 'text': 'y'}).status_code == 429
+    client.get('getMe')
+    stats = client.stats()
+    assert stats['sendMessage']['calls'] == 1 and stats['sendMessage']['errors'] == 0
+    assert stats['editMessageText']['errors'] == 1
+    assert stats['getMe']['calls'] == 1
+    assert stats['sendMessage']['max_ms'] >= stats['sendMessage']['avg_ms'] > 0
+    assert fake.stats()['calls'] == {'sendMessage': 1, 'editMessageText': 1, 'getMe': 1}
+    client.close()
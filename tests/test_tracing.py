@@ -0,0 +1,95 @@
+# tests/test_tracing.py
+
+import pytest
+
+from handlers import TelegramHandlers
+from tracing import TRACER, Tracer
+
+from test_outbound import RecordingClient, dispatcher_for
+
+TOKEN = '123456:test'
+
+
+@pytest.fixture
+def handlers():
+    client = RecordingClient()
+    return TelegramHandlers(TOKEN, client=client, dispatcher=dispatcher_for(client))
+
+
+def sent_texts(handlers):
+    return [payload['text'] for _, method, payload in handlers.client.calls if method == 'sendMessage']
+
+
+@pytest.mark.parametrize('command', ['/profile cpu 5', '/trace 5'])
+def test_diagnostics_refused_without_admin_id(handlers, monkeypatch, command):
+    monkeypatch.delenv('ADMIN_ID', raising=False)
+    monkeypatch.setattr(TRACER, 'sample_rate', 1)
+    handle = handlers._handle_command_profile if command.startswith('/profile') else handlers._handle_command_trace
+    handle(42, command)
+    assert TRACER.capture is None
+    assert len(sent_texts(handlers)) == 1 and sent_texts(handlers)[0].startswith('🔒')
+
+
+def test_diagnostics_limited_to_admin(handlers, monkeypatch):
+    monkeypatch.setenv('ADMIN_ID', '7')
+    monkeypatch.setattr(TRACER, 'sample_rate', 1)
+    handlers._handle_command_trace(42, '/trace')
+    assert sent_texts(handlers) == []
+    handlers._handle_command_trace(7, '/trace')
+    assert 'traces en mémoire' in sent_texts(handlers)[0]
+
+
+def traced(tracer, durations):
+    for duration in durations:
+        trace = tracer.begin('update')
+        if trace is not None:
+            tracer.span('parse', trace.started, duration / 2)
+            tracer.end(trace)
+            trace.duration = duration # durée simulée, indépendante de la machine
+
+
+def test_one_update_in_n_is_sampled():
+    tracer = Tracer(sample_rate=3, buffer_size=100)
+    traced(tracer, [0.001] * 30)
+    assert tracer.sampled == 10 and len(tracer.traces) == 10
+
+
+def test_ring_keeps_the_latest_traces():
+    tracer = Tracer(sample_rate=1, buffer_size=5)
+    durations = [0.001 * i for i in range(1, 13)]
+    traced(tracer, durations)
+    assert [t.duration for t in tracer.traces] == durations[-5:]
+    assert [t.duration for t in tracer.slowest(2)] == [durations[-1], durations[-2]]
+    dump = tracer.dump(3)
+    assert dump['buffered'] == 5 and dump['sampled'] == 12
+    assert [t['spans'][0]['name'] for t in dump['slowest']] == ['parse'] * 3
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(sample_rate=0)
+    assert tracer.begin('update', force=True) is None
+    assert tracer.current() is None
+    tracer.span('parse', 0.0, 1.0)
+    assert len(tracer.traces) == 0
+
+
+def test_nested_traces_share_the_outer_one():
+    tracer = Tracer(sample_rate=1)
+    outer = tracer.begin('update')
+    assert tracer.begin('job', force=True) is None
+    assert tracer.current() is outer
+    tracer.end(outer)
+    assert tracer.current() is None
+
+
+def test_cpu_capture_merges_profiled_calls():
+    tracer = Tracer(sample_rate=0)
+    capture = tracer.start_capture('cpu', 60)
+    assert tracer.start_capture('cpu', 60) is None # une seule capture à la fois
+    for _ in range(3):
+        assert tracer.call(sorted, [3, 1, 2]) == [1, 2, 3]
+    tracer._finish_capture(capture)
+    assert tracer.capture is None and tracer.last_capture is capture
+    assert capture.calls == 3 and '3 appels profilés' in capture.report
+    with pytest.raises(ValueError):
+        tracer.start_capture('disk', 1)
@@ -0,0 +1,242 @@
+# tracing.py
+
+"""
+Traces échantillonnées du chemin chaud et captures de profil à la demande.
+
+TRACE_SAMPLE_RATE=N trace un update sur N (0 = désactivé) : chaque étape
+(parse, collect, verify, predict, persist, envoi Telegram...) devient un span
+de la trace courante du thread, et la trace rejoint un tampon circulaire
+(TRACE_BUFFER) dont on extrait les plus lentes (/debug/traces, /trace). Les
+tâches planifiées sont tracées à chaque exécution dès que le traçage est actif.
+
+Désactivé, le coût se limite à un test d'attribut par étape. Une capture
+(cProfile ou tracemalloc) ne s'active que pendant la fenêtre demandée
+(/debug/profile, /profile).
+"""
+import io
+import os
+import time
+import heapq
+import pstats
+import logging
+import cProfile
+import threading
+import itertools
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MODES = ('cpu', 'memory')
+MAX_CAPTURE_SECONDS = 300
+
+
+class Trace:
+    """Un update (ou une tâche) tracé : spans (nom, début relatif, durée) en secondes"""
+
+    __slots__ = ('name', 'attrs', 'wall', 'started', 'spans', 'duration')
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.duration = 0.0
+
+    def ordered_spans(self) -> List[tuple]:
+        """Par début : un span englobant (collect) précède ceux qu'il contient (persist), enregistrés avant lui"""
+        return sorted(self.spans, key=lambda span: span[1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'at': round(self.wall, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attrs': self.attrs,
+            'spans': [{'name': name, 'start_ms': round(start * 1000, 3), 'duration_ms': round(elapsed * 1000, 3)}
+                      for name, start, elapsed in self.ordered_spans()],
+        }
+
+    def summary(self) -> str:
+        """Une ligne : durée totale puis chaque span en ms"""
+        attrs = ' '.join(f"{k}={v}" for k, v in self.attrs.items() if v is not None)
+        spans = ' · '.join(f"{name} {elapsed * 1000:.2f}" for name, _, elapsed in self.ordered_spans())
+        return f"{self.name} {self.duration * 1000:.2f} ms {attrs}\n  {spans or '(aucun span)'}"
+
+
+class Capture:
+    """Fenêtre de profilage : cProfile par appel (fusionné) ou différence tracemalloc"""
+
+    def __init__(self, mode: str, seconds: float, on_done: Optional[Callable[[str], Any]] = None):
+        self.mode = mode
+        self.seconds = seconds
+        self.on_done = on_done
+        self.started = time.time()
+        self.calls = 0
+        self.report: Optional[str] = None
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._own_tracemalloc = False
+
+    @property
+    def running(self) -> bool:
+        return self.report is None
+
+    def start(self):
+        if self.mode == 'memory':
+            self._own_tracemalloc = not tracemalloc.is_tracing()
+            if self._own_tracemalloc:
+                tracemalloc.start(10)
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def add(self, profile: cProfile.Profile):
+        with self._lock:
+            if self.report is not None:
+                return # appel terminé après la fin de la fenêtre
+            self.calls += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def finish(self, limit: int = 30) -> str:
+        out = io.StringIO()
+        if self.mode == 'memory':
+            snapshot = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            stats = snapshot.compare_to(self._snapshot, 'lineno')
+            out.write(f"tracemalloc {self.seconds:g} s : {limit} plus fortes croissances\n")
+            for stat in stats[:limit]:
+                out.write(f"{stat}\n")
+            report = out.getvalue()
+        else:
+            with self._lock:
+                if self._stats is None:
+                    out.write(f"cProfile {self.seconds:g} s : aucun appel profilé\n")
+                else:
+                    out.write(f"cProfile {self.seconds:g} s : {self.calls} appels profilés\n")
+                    self._stats.stream = out
+                    self._stats.sort_stats('cumulative').print_stats(limit)
+                self.report = out.getvalue()
+            report = self.report
+        self.report = report
+        return report
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'mode': self.mode, 'seconds': self.seconds, 'started': round(self.started, 3),
+                'running': self.running, 'calls': self.calls, 'report': self.report}
+
+
+class Tracer:
+    def __init__(self, sample_rate: Optional[int] = None, buffer_size: Optional[int] = None):
+        self.sample_rate = int(os.getenv('TRACE_SAMPLE_RATE') or 0) if sample_rate is None else sample_rate
+        size = buffer_size or int(os.getenv('TRACE_BUFFER') or 200)
+        self.traces: deque = deque(maxlen=size)
+        self.sampled = 0
+        self.capture: Optional[Capture] = None
+        self.last_capture: Optional[Capture] = None
+        self._counter = itertools.count()
+        self._local = threading.local()
+        self._capture_lock = threading.Lock()
+
+    # --- Traces ---
+
+    def begin(self, name: str, force: bool = False, **attrs) -> Optional[Trace]:
+        """Ouvre une trace sur ce thread (1 update sur N, toujours si force) ; None si non échantillonné"""
+        if not self.sample_rate:
+            return None
+        if not force and next(self._counter) % self.sample_rate:
+            return None
+        if getattr(self._local, 'trace', None) is not None:
+            return None # déjà dans une trace : ses spans y vont
+        trace = Trace(name, attrs)
+        self._local.trace = trace
+        self.sampled += 1
+        return trace
+
+    def end(self, trace: Optional[Trace]):
+        if trace is None:
+            return
+        trace.duration = time.perf_counter() - trace.started
+        self._local.trace = None
+        self.traces.append(trace)
+
+    def current(self) -> Optional[Trace]:
+        return getattr(self._local, 'trace', None) if self.sample_rate else None
+
+    def activate(self, trace: Optional[Trace]):
+        """Rattache ce thread à la trace d'un autre (ex. l'écrivain unique exécutant une commande)"""
+        self._local.trace = trace
+
+    def span(self, name: str, started: float, elapsed: float):
+        """Ajoute un span (perf_counter de début, durée) à la trace du thread, s'il y en a une"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.spans.append((name, started - trace.started, elapsed))
+
+    def slowest(self, limit: int = 10) -> List[Trace]:
+        return heapq.nlargest(limit, list(self.traces), key=lambda t: t.duration)
+
+    def dump(self, limit: int = 10) -> Dict[str, Any]:
+        return {
+            'sample_rate': self.sample_rate,
+            'sampled': self.sampled,
+            'buffered': len(self.traces),
+            'slowest': [t.to_dict() for t in self.slowest(limit)],
+        }
+
+    # --- Captures de profil ---
+
+    def start_capture(self, mode: str, seconds: float,
+                      on_done: Optional[Callable[[str], Any]] = None) -> Optional[Capture]:
+        """Démarre une fenêtre de profilage ; None si une capture est déjà en cours"""
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"mode inconnu: {mode} ({', '.join(CAPTURE_MODES)})")
+        seconds = max(1.0, min(float(seconds), MAX_CAPTURE_SECONDS))
+        with self._capture_lock:
+            if self.capture is not None:
+                return None
+            capture = Capture(mode, seconds, on_done)
+            capture.start()
+            self.capture = capture
+        timer = threading.Timer(seconds, self._finish_capture, args=(capture,))
+        timer.daemon = True
+        timer.start()
+        logger.info(f"🔬 Capture {mode} démarrée pour {seconds:g} s")
+        return capture
+
+    def _finish_capture(self, capture: Capture):
+        with self._capture_lock:
+            self.capture = None
+            self.last_capture = capture
+        try:
+            report = capture.finish()
+        except Exception as e:
+            capture.report = report = f"capture impossible: {e}"
+            logger.error(f"❌ Capture {capture.mode} impossible: {e}")
+        logger.info(f"🔬 Capture {capture.mode} terminée ({capture.calls} appels)")
+        if capture.on_done:
+            try:
+                capture.on_done(report)
+            except Exception as e:
+                logger.error(f"❌ Envoi du rapport de capture impossible: {e}")
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Exécute fn, sous cProfile si une capture cpu est ouverte (un profil par appel, fusionnés)"""
+        capture = self.capture
+        if capture is None or capture.mode != 'cpu' or getattr(self._local, 'profiling', False):
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile()
+        self._local.profiling = True
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            self._local.profiling = False
+            capture.add(profile)
+
+
+TRACER = Tracer()
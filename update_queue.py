@@ -0,0 +1,111 @@
+# update_queue.py
+
+"""
+File d'attente bornée pour traiter les updates Telegram en arrière-plan.
+
+Le webhook se contente d'ajouter l'update brute dans la file et répond 200
+immédiatement. Un unique worker dédié consomme la file dans l'ordre d'arrivée
+(FIFO), ce qui conserve l'ordre par chat dont dépend collect_inter_data.
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """File bornée + worker unique, avec compteurs de profondeur, latence et pertes"""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], maxsize: int = 1000):
+        self.handler = handler
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        # Compteurs
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+    def start(self):
+        """Démarre le worker (idempotent, démarrage paresseux au premier update)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='update-worker', daemon=True)
+            self._thread.start()
+            logger.info(f"🧵 Worker de mises à jour démarré (file max {self.maxsize})")
+
+    def enqueue(self, update: Dict[str, Any]) -> bool:
+        """Ajoute une update sans bloquer. False si la file est pleine (update perdue)."""
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+        try:
+            self._queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"⚠️ File de mises à jour pleine, update {update.get('update_id')} rejetée")
+            return False
+        self.enqueued += 1
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            enqueued_at, update = item
+            started = time.time()
+            try:
+                self.handler(update)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Erreur worker sur update {update.get('update_id')}: {e}")
+            finally:
+                done = time.time()
+                latency = done - started
+                self.processed += 1
+                self.total_wait += started - enqueued_at
+                self.total_latency += latency
+                self.last_latency = latency
+                if latency > self.max_latency:
+                    self.max_latency = latency
+                self._queue.task_done()
+
+    def stop(self, timeout: float = 5.0):
+        """Arrête le worker après avoir vidé la file"""
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def join(self):
+        """Attend que toutes les updates en file soient traitées"""
+        self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        processed = self.processed or 1
+        return {
+            'depth': self._queue.qsize(),
+            'maxsize': self.maxsize,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'avg_wait_ms': round(self.total_wait / processed * 1000, 2),
+            'avg_latency_ms': round(self.total_latency / processed * 1000, 2),
+            'max_latency_ms': round(self.max_latency * 1000, 2),
+            'last_latency_ms': round(self.last_latency * 1000, 2),
+            'worker_alive': bool(self._thread and self._thread.is_alive()),
+        }